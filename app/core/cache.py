@@ -0,0 +1,171 @@
+"""
+进程内缓存工具
+
+每个 uvicorn worker 各自持有一份缓存，不跨进程共享；
+写操作只能使当前进程内的条目失效，其他 worker 依赖 TTL 过期。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """线程安全的 TTL + LRU 缓存
+
+    - 条目写入超过 ttl 秒后视为过期，读取时丢弃
+    - 条目数超过 maxsize 时淘汰最久未被访问的条目
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60, timer: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= self._timer():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._timer() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class _Loading:
+    """正在加载的条目，其他线程等待同一次加载结果"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class ByteBudgetCache:
+    """按字节预算淘汰的线程安全 LRU 缓存（用于缓存小文件内容）
+
+    - 条目总字节数超过 max_bytes 时淘汰最久未被访问的条目
+    - 超过 max_item_size 的值不缓存
+    - 未命中时同一个 key 只加载一次，并发请求等待该次加载结果（single-flight）
+    - 键中应包含内容版本，内容变化后旧条目不再被访问，随 LRU 淘汰
+    """
+
+    def __init__(self, max_bytes: int, max_item_size: int):
+        self.max_bytes = max_bytes
+        self.max_item_size = max_item_size
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._loading: dict = {}
+        self._lock = threading.Lock()
+
+    def accepts(self, size: int) -> bool:
+        return 0 < size <= self.max_item_size and self.max_bytes > 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], bytes]) -> bytes:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = _Loading()
+                leader = True
+                self.misses += 1
+            else:
+                leader = False
+                # 等待其他请求的加载结果，不重复读取，按命中计
+                self.hits += 1
+
+        if not leader:
+            loading.event.wait()
+            if loading.error is not None:
+                raise loading.error
+            return loading.value
+
+        try:
+            value = loader()
+        except BaseException as exc:
+            loading.error = exc
+            raise
+        else:
+            loading.value = value
+            self._store(key, value)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.event.set()
+        return value
+
+    def _store(self, key: Hashable, value: bytes):
+        size = len(value)
+        if size > self.max_item_size or size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            self._data[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "items": len(self._data),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_MISSING = object()
@@ -2,10 +2,29 @@ from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
+from contextlib import asynccontextmanager
 import os
 
+from app.core.config import settings
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 每个 worker 启动定期存储清理线程，文件锁保证同时只有一个在执行
+    if settings.STORAGE_REAP_INTERVAL > 0:
+        from app.routers.projects import UPLOAD_DIR
+        from app.services.trash import start_reaper
+        start_reaper(UPLOAD_DIR, settings.STORAGE_REAP_INTERVAL)
+    # 异步上传任务心跳；其他进程退出后遗留的未完成任务标记为失败并清理
+    if settings.UPLOAD_JOB_HEARTBEAT_INTERVAL > 0:
+        from app.routers.projects import cleanup_interrupted_job
+        from app.services.jobs import start_job_monitor
+        start_job_monitor(cleanup_interrupted_job, settings.UPLOAD_JOB_HEARTBEAT_INTERVAL)
+    yield
+
+
 # 创建应用
-app = FastAPI(title="AxHost", description="Axure 原型托管系统")
+app = FastAPI(title="AxHost", description="Axure 原型托管系统", lifespan=lifespan)
 
 # 获取当前文件所在目录
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
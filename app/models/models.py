@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, UniqueConstraint
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, ForeignKey, Index, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
@@ -22,6 +22,10 @@ class User(Base):
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        # 列表按更新时间排序，游标分页按 (updated_at, id) 定位
+        Index("idx_projects_updated_id", "updated_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     object_id = Column(String(36), unique=True, nullable=False, index=True)
@@ -32,6 +36,9 @@ class Project(Base):
     remark = Column(Text, nullable=True)  # 备注字段
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # 当前版本的文件数和占用空间（字节），发布新版本时由清单计算，NULL 表示尚未统计
+    file_count = Column(Integer, nullable=True)
+    storage_bytes = Column(BigInteger, nullable=True)
     
     # 关系
     author = relationship("User", back_populates="projects", foreign_keys=[author_id])
@@ -40,6 +47,10 @@ class Project(Base):
 
 class ProjectAccess(Base):
     __tablename__ = "project_access"
+    __table_args__ = (
+        # 用户维度在前：列表的权限过滤按 (user_id, project_id) 逐条探测
+        UniqueConstraint("user_id", "project_id", name="uq_project_access_user_project"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"))
@@ -93,3 +104,18 @@ class UserCommonTag(Base):
 
     user = relationship("User", back_populates="common_tags", foreign_keys=[user_id])
     tag = relationship("Tag", back_populates="common_by_users", foreign_keys=[tag_id])
+
+
+class UploadJob(Base):
+    """后台处理上传文件的任务（异步上传、更新原型文件）"""
+    __tablename__ = "upload_jobs"
+
+    id = Column(String(36), primary_key=True)
+    kind = Column(String(20), nullable=False)  # upload, update
+    object_id = Column(String(36), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, succeeded, failed
+    progress = Column(Integer, nullable=False, default=0)  # 0-100
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
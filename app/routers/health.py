@@ -9,6 +9,7 @@ from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
+from app.services.delivery import asset_memory_cache
 
 router = APIRouter(tags=["健康检查"])
 
@@ -58,3 +59,9 @@ async def health_check(db: Session = Depends(get_db)):
         "version": API_VERSION,
         "services": services
     }
+
+
+@router.get("/api/health/cache")
+async def cache_stats():
+    """当前 worker 进程的热点静态资源缓存统计（命中、未命中、淘汰次数和占用字节）"""
+    return {"asset_cache": asset_memory_cache.stats()}
@@ -1,21 +1,58 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, Request, Response
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from app.routers.auth import get_current_user
-from app.models.models import User, Project, ProjectAccess, Tag
+from app.models.models import User, Project, Tag, UploadJob
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import BinaryIO, Optional, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timezone
 import os
+import asyncio
 import shutil
 import zipfile
 import urllib.parse
 import json
+import calendar
 from app.core.database import get_db
+from app.core.config import settings
+from app.core.cache import TTLCache
 
 from app.schemas.schemas import (
     ProjectCreate, ProjectUpdate, ProjectResponse, 
-    ProjectListResponse, ProjectVerifyRequest, ChangeAuthorRequest
+    ProjectListResponse, ProjectVerifyRequest, ChangeAuthorRequest,
+    UploadSessionCreate, UploadSessionFinalize, SyncCreate,
 )
 from app.services.services import ProjectService, UserService, TagService, generate_password
+from app.services.manifest import Manifest, load_manifest, normalize_path, rebuild_manifest
+from app.services.delivery import asset_response, backend_asset_response
+from app.services.archive import (
+    UnsupportedArchive, archive_summary, extract_archive, extract_workers, store_archive,
+)
+from app.services.uploads import (
+    ChunkWriter, OffsetMismatch, SessionBusy, UploadSessionError, committed_offset, create_session,
+    data_path, load_session, reap_stale_sessions, remove_session, verify_upload,
+)
+from app.services.jobs import JOBS_DIRNAME, TERMINAL_STATUSES, JobService, job_state, serialize_job, submit
+from app.services.blobs import intern_tree, store_stats
+from app.services.trash import last_report, schedule_reaper
+from app.services.quotas import (
+    QuotaExceeded, backfill_running, check_quota, manifest_usage, quota_allowance, schedule_backfill, uncounted_projects,
+)
+from app.services.pagination import InvalidCursor, keyset_page
+from app.services.counts import COUNT_STRATEGIES, count_rows
+from app.services.search import search_filter, search_ordering
+from app.services.storage import (
+    MANIFEST_KEY, download_entry, get_backend, remote_current, remote_versions, schedule_remote_delete, schedule_remote_reap,
+    set_remote_current, upload_version, version_prefix,
+)
+from app.services.sync import (
+    BlobWriter, SyncError, build_version, create_sync, load_sync, missing_paths, normalize_files,
+)
+from app.services.versions import (
+    create_version, current_version, discard_version, list_versions, publish, remove_project,
+    resolve_project_dir, schedule_reap, version_path,
+)
 
 router = APIRouter(prefix="/api/projects", tags=["原型管理"])
 
@@ -26,6 +63,9 @@ page_router = APIRouter(prefix="/projects", tags=["原型页面"])
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads"))
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# SSE 推送任务状态时的轮询间隔（秒）
+JOB_EVENTS_INTERVAL = 0.5
+
 def can_upload(user: User):
     """检查用户是否有上传权限"""
     # return user.role in ["admin", "product_manager"]
@@ -39,36 +79,6 @@ def is_admin(user: User):
     """检查用户是否为管理员"""
     return user.role == "admin"
 
-def decode_zip_filename(info: zipfile.ZipInfo) -> str:
-    """
-    更稳健的 ZIP 文件名解码逻辑
-
-    Python 3.11+ 的 zipfile 会根据 flag_bits 判断编码：
-    - flag_bits & 0x800: UTF-8 编码，已正确解码
-    - 否则: 默认 cp437 编码（Windows 中文压缩包通常是 GBK/GB18030）
-    """
-    filename = info.filename
-
-    # 如果设置了 UTF-8 flag，zipfile 已经用 UTF-8 正确解码，直接使用
-    if info.flag_bits & 0x800:
-        return filename
-
-    # zipfile 默认用 cp437 解码了文件名，尝试还原为原始字节再重新解码
-    try:
-        raw_bytes = filename.encode('cp437')
-    except UnicodeEncodeError:
-        return filename
-
-    # 依次尝试常见中文编码
-    for encoding in ('gbk', 'gb18030', 'utf-8'):
-        try:
-            return raw_bytes.decode(encoding)
-        except UnicodeDecodeError:
-            continue
-
-    return filename
-
-
 def format_to_cst(dt):
     """将 UTC 时间转换为东八区时间字符串"""
     if dt is None:
@@ -103,6 +113,8 @@ def serialize_project(project: Project):
         "created_at": format_to_cst(project.created_at),
         "updated_at": format_to_cst(project.updated_at),
         "can_access": True,
+        "file_count": project.file_count,
+        "storage_bytes": project.storage_bytes,
     }
 
 
@@ -114,24 +126,34 @@ def list_projects(
     tag_id: Optional[int] = Query(None),
     author_id: Optional[int] = Query(None),
     project_type: Optional[str] = Query(None, description="my:我的项目, collaborate:协作项目"),
+    cursor: Optional[str] = Query(None, description="游标分页：首页传空字符串，之后传上一页返回的 next_cursor"),
+    count: Optional[str] = Query(None, description="总数计数方式：exact、cached、estimated，默认取 LIST_COUNT_STRATEGY"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     获取项目列表
-    - search: 搜索项目名称
+    - search: 搜索项目名称和备注，支持模糊匹配，分页模式下按相关度排序（游标模式仍按更新时间）
     - author_id: 筛选指定作者的项目
     - project_type: my=我的项目(我是作者), collaborate=协作项目(他人创建)
+    - cursor: 传入时改用游标分页（忽略 page），返回 next_cursor，没有下一页时为 null
+    - count: 总数计数方式，响应中的 count_strategy 为实际使用的方式（estimated 时 total 为估算值）
     """
+    strategy = count or settings.LIST_COUNT_STRATEGY
+    if strategy not in COUNT_STRATEGIES:
+        raise HTTPException(status_code=400, detail="不支持的计数方式")
     skip = (page - 1) * per_page
     
     # 构建查询
     from sqlalchemy import or_
     query = db.query(Project)
     
-    # 搜索项目名称
+    # 搜索项目名称和备注（分页模式按相关度排序）
+    search_columns = [Project.name, Project.remark]
+    ordering = []
     if search:
-        query = query.filter(Project.name.ilike(f"%{search}%"))
+        query = query.filter(search_filter(db, search_columns, search))
+        ordering = search_ordering(db, search_columns, search)
     if tag_id is not None:
         query = query.filter(Project.project_tags.any(tag_id=tag_id))
     
@@ -149,19 +171,41 @@ def list_projects(
     
     # 权限过滤（管理员看所有，其他人只能看公开+自己的+被授权的）
     if current_user.role != "admin":
-        access_project_ids = db.query(ProjectAccess.project_id).filter(ProjectAccess.user_id == current_user.id).all()
-        access_ids = [p[0] for p in access_project_ids]
         query = query.filter(
             or_(
                 Project.is_public == True,
                 Project.author_id == current_user.id,
-                Project.id.in_(access_ids) if access_ids else False
+                ProjectService.granted_to(current_user.id),
             )
         )
     
     # 排序和分页
-    total = query.count()
-    projects = query.order_by(Project.updated_at.desc()).offset(skip).limit(per_page).all()
+    total, count_strategy = count_rows(
+        db, query, strategy,
+        (current_user.id, current_user.role, search, tag_id, author_id, project_type),
+    )
+    if cursor is not None:
+        try:
+            projects, next_cursor = keyset_page(
+                ProjectService.with_details(query), [Project.updated_at, Project.id], cursor, per_page
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {
+            "items": [serialize_project(project) for project in projects],
+            "total": total,
+            "count_strategy": count_strategy,
+            "per_page": per_page,
+            "next_cursor": next_cursor,
+        }
+    
+    projects = (
+        ProjectService.with_details(query)
+        .order_by(*ordering, Project.updated_at.desc(), Project.id.desc())
+        .offset(skip)
+        .limit(per_page)
+        .all()
+    )
     
     # 标记可访问状态
     result = [serialize_project(project) for project in projects]
@@ -169,6 +213,7 @@ def list_projects(
     return {
         "items": result,
         "total": total,
+        "count_strategy": count_strategy,
         "page": page,
         "per_page": per_page
     }
@@ -190,6 +235,8 @@ def create_project(
 
 @router.post("/upload")
 def upload_project(
+    request: Request,
+    response: Response,
     file: UploadFile = File(...),
     name: str = Form(...),
     view_password: Optional[str] = Form(None),
@@ -202,7 +249,6 @@ def upload_project(
     if not can_upload(current_user):
         raise HTTPException(status_code=403, detail="只有管理员和产品经理可以上传原型")
     
-    # 创建项目记录
     tag_names = []
     if tags:
         try:
@@ -219,112 +265,813 @@ def upload_project(
         remark=remark,
         tag_names=tag_names,
     )
+    return import_new_project(request, response, db, current_user, project_data, file.filename, file.file)
+
+
+def import_new_project(
+    request: Request,
+    response: Response,
+    db: Session,
+    current_user: User,
+    project_data: ProjectCreate,
+    filename: str,
+    source: BinaryIO,
+    source_path: Optional[str] = None,
+):
+    """创建原型记录并保存上传文件（表单上传和分片上传共用）；source_path 为可直接移动的暂存文件"""
+    try:
+        allowance = quota_allowance(db, current_user.id)
+        check_quota(validate_upload(filename, source), allowance)
+    except ValueError as e:
+        raise upload_error(e)
+    
+    # 创建项目记录
     try:
         project = ProjectService.create(db, project_data, current_user.id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
+    # 异步处理：文件落盘后立即返回任务 ID
+    if prefers_async(request):
+        job = JobService.create(db, "upload", project.object_id, current_user.id)
+        staged_path = stage_upload(source, job.id, source_path)
+        submit(job.id, run_upload_job(project.object_id, filename, staged_path))
+        return accept_job(response, job, object_id=project.object_id)
+    
     # 保存文件
-    project_dir = os.path.join(UPLOAD_DIR, project.object_id)
-    os.makedirs(project_dir, exist_ok=True)
+    try:
+        usage = save_project_version(project.object_id, filename, source, allowance=allowance)
+    except BaseException as e:
+        # 新建的原型没有可用版本，任何失败都删除目录和记录
+        remove_project(UPLOAD_DIR, project.object_id)
+        ProjectService.delete(db, project)
+        if isinstance(e, ValueError):
+            raise upload_error(e)
+        raise
+    ProjectService.record_usage(db, project, *usage)
     
-    file_path = os.path.join(project_dir, file.filename)
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    return {"message": "上传成功", "object_id": project.object_id}
+
+
+def import_project_file(
+    request: Request,
+    response: Response,
+    db: Session,
+    current_user: User,
+    project: Project,
+    filename: str,
+    source: BinaryIO,
+    source_path: Optional[str] = None,
+):
+    """用上传文件覆盖原型文件（表单上传和分片上传共用）"""
+    object_id = project.object_id
+    
+    # 无效的压缩包或超出配额时不清空原有文件
+    try:
+        allowance = quota_allowance(db, project.author_id, project.id)
+        check_quota(validate_upload(filename, source), allowance)
+    except ValueError as e:
+        raise upload_error(e)
+    
+    # 异步处理：文件落盘后立即返回任务 ID
+    if prefers_async(request):
+        job = JobService.create(db, "update", object_id, current_user.id)
+        staged_path = stage_upload(source, job.id, source_path)
+        submit(job.id, run_update_job(object_id, filename, staged_path))
+        return accept_job(response, job, object_id=object_id)
+    
+    # 解压到新版本目录，完成后才切换，期间访问者看到的仍是旧版本
+    try:
+        usage = save_project_version(object_id, filename, source, allowance=allowance)
+    except ValueError as e:
+        raise upload_error(e)
+    
+    # 更新存储用量和项目更新时间
+    ProjectService.record_usage(db, project, *usage)
+    ProjectService.touch(db, project)
+    invalidate_project_meta(object_id)
+    
+    return {"message": "更新成功"}
+
+
+def is_zip_upload(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith('.zip')
+
+
+def validate_upload(filename: str, source: BinaryIO) -> int:
+    """
+    写入任何文件之前校验上传的压缩包：只读取中央目录，不解压
+    压缩包损坏或未找到入口文件时抛出 ValueError（错误提示）
+    返回保存后占用空间的估计（字节），用于解压前检查配额
+    """
+    size = source.seek(0, os.SEEK_END)
+    source.seek(0)
+    if not is_zip_upload(filename):
+        return size
+    try:
+        prefix, unpacked = archive_summary(source)
+    except zipfile.BadZipFile:
+        raise ValueError("无效的压缩文件")
+    finally:
+        source.seek(0)
+    if prefix is None:
+        raise ValueError("上传的压缩包中未找到入口文件")
+    return size if settings.STORAGE_MODE == "zip" else unpacked
+
+
+def upload_error(e: ValueError) -> HTTPException:
+    """保存上传文件失败时的错误响应，超出存储配额返回 413"""
+    return HTTPException(status_code=413 if isinstance(e, QuotaExceeded) else 400, detail=str(e))
+
+
+def save_project_file(filename: str, source: BinaryIO, project_dir: str, progress=None):
+    """
+    保存上传的原型文件并生成文件清单，失败时抛出 ValueError（错误提示）
+    - zip 文件：ZIP 存储模式下保留压缩包，否则直接从上传的临时文件解压到项目目录
+    - 其他文件：原样保存
+    progress(已完成数, 总数) 用于异步上传任务汇报解压进度
+    """
+    is_zip = is_zip_upload(filename)
     
-    # 如果是 zip 文件，自动解压
-    if file.filename and file.filename.lower().endswith('.zip'):
+    if not is_zip or settings.STORAGE_MODE == "zip":
+        file_path = os.path.join(project_dir, filename)
+        with open(file_path, "wb") as f:
+            shutil.copyfileobj(source, f)
+        if not is_zip:
+            rebuild_manifest(project_dir)
+            return
+        
+        # ZIP 存储模式：保留压缩包并建立索引，不解压
         try:
-            temp_extract_dir = os.path.join(project_dir, '_temp_extract')
-            os.makedirs(temp_extract_dir, exist_ok=True)
-            
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                for info in zip_ref.infolist():
-                    # 关键修改：直接对 info.filename 进行解码
-                    # zipfile 的 info.filename 已经是被它用 cp437 解码后的字符串了
-                    decoded_name = decode_zip_filename(info)
-                    
-                    # 过滤 macOS 自动生成的缓存文件夹
-                    if "__MACOSX" in decoded_name or ".DS_Store" in decoded_name:
-                        continue
-
-                    target_path = os.path.join(temp_extract_dir, decoded_name)
-                    
-                    # 安全检查
-                    if not os.path.realpath(target_path).startswith(os.path.realpath(temp_extract_dir)):
-                        continue
-                    
-                    if info.is_dir():
-                        os.makedirs(target_path, exist_ok=True)
-                    else:
-                        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                        with zip_ref.open(info.filename) as source, open(target_path, 'wb') as target:
-                            shutil.copyfileobj(source, target)
-            
-            # 删除 zip 文件
+            manifest = store_archive(project_dir, file_path)
+        except UnsupportedArchive:
+            # 加密或非 deflate 压缩的压缩包改为解压存储
             os.remove(file_path)
-            
-            # 查找包含入口文件的目录
-            entry_dir = find_entry_directory(temp_extract_dir)
-            
-            if entry_dir is None:
-                # 没有找到入口文件，删除临时目录和项目
-                shutil.rmtree(temp_extract_dir)
-                if os.path.exists(project_dir):
-                    shutil.rmtree(project_dir)
-                ProjectService.delete(db, project)
-                raise HTTPException(status_code=400, detail="上传的压缩包中未找到入口文件")
-            
-            # 将入口目录下的所有文件复制到 project_dir
-            for item in os.listdir(entry_dir):
-                src = os.path.join(entry_dir, item)
-                dst = os.path.join(project_dir, item)
-                if os.path.exists(dst):
-                    if os.path.isdir(dst):
-                        shutil.rmtree(dst)
-                    else:
-                        os.remove(dst)
-                shutil.move(src, dst)
-            
-            # 删除临时目录
-            shutil.rmtree(temp_extract_dir)
-            
         except zipfile.BadZipFile:
-            if os.path.exists(file_path):
+            os.remove(file_path)
+            raise ValueError("无效的压缩文件")
+        else:
+            if manifest is None:
                 os.remove(file_path)
-            if os.path.exists(project_dir):
-                shutil.rmtree(project_dir)
-            ProjectService.delete(db, project)
-            raise HTTPException(status_code=400, detail="无效的压缩文件")
+                raise ValueError("上传的压缩包中未找到入口文件")
+            return
     
-    return {"message": "上传成功", "object_id": project.object_id}
+    # 解压存储：上传内容已由 multipart 解析到临时文件，直接从中解压，不再另存一份压缩包
+    source.seek(0)
+    try:
+        manifest = extract_archive(
+            source, project_dir, workers=extract_workers(settings.EXTRACT_WORKERS), progress=progress
+        )
+    except zipfile.BadZipFile:
+        raise ValueError("无效的压缩文件")
+    if manifest is None:
+        raise ValueError("上传的压缩包中未找到入口文件")
+    
+    # 生成文件清单，供页面路由解析请求路径
+    rebuild_manifest(project_dir, manifest)
 
 
-def find_entry_directory(extract_dir: str) -> Optional[str]:
+def save_project_version(
+    object_id: str, filename: str, source: BinaryIO, progress=None, allowance: Optional[int] = None
+) -> Tuple[int, int]:
     """
-    查找包含入口文件的目录
-    1. 检查 extract_dir 下是否同时存在 index.html 和 start.html 文件，若存在，返回 extract_dir
-    2. 若没有找到，则递归遍历其下所有目录，找到同时包含 index.html 和 start.html 的目录，返回该目录
-    3. 若第 2 步没有找到符合条件的目录，返回 None
+    把上传文件保存为新版本并发布，失败时删除该版本目录、当前版本保持不变
+    发布前按实际占用空间检查配额（allowance 为可用字节数），返回新版本的 (文件数, 占用字节数)
     """
-    def has_entry_files(directory: str) -> bool:
-        """检查目录是否同时包含 index.html 和 start.html"""
-        has_index = os.path.isfile(os.path.join(directory, 'index.html'))
-        has_start = os.path.isfile(os.path.join(directory, 'start.html'))
-        return has_index and has_start
+    version_dir = create_version(UPLOAD_DIR, object_id)
+    try:
+        save_project_file(filename, source, version_dir, progress)
+        manifest = load_manifest(version_dir)
+        usage = manifest_usage(manifest)
+        check_quota(usage[1], allowance)
+        dedupe_version(version_dir, manifest)
+    except BaseException:
+        discard_version(version_dir)
+        raise
+    publish_version(object_id, version_dir)
+    return usage
+
+
+def dedupe_version(version_dir: str, manifest: Optional[Manifest]):
+    """开启去重存储时，发布前把新版本的文件收录到内容寻址存储（版本保存在本机时才有意义）"""
+    if settings.BLOB_STORE_ENABLED and manifest is not None and get_backend() is None:
+        intern_tree(UPLOAD_DIR, version_dir, manifest)
+
+
+def publish_version(object_id: str, version_dir: str) -> int:
+    """发布本机组装好的版本并在后台清理超出保留数量的旧版本，返回版本号
+
+    配置了存储后端时整体上传到后端后切换当前版本指针，本机不保留版本目录。
+    退役版本在元数据缓存过期前仍可能被其他 worker 使用，留出两倍 TTL 的宽限期。
+    """
+    grace = settings.PROJECT_META_CACHE_TTL * 2
+    backend = get_backend()
+    if backend is not None:
+        version = upload_version(backend, object_id, version_dir, load_manifest(version_dir))
+        set_remote_current(backend, object_id, version)
+        discard_version(version_dir)
+        invalidate_project_meta(object_id)
+        schedule_remote_reap(backend, object_id, settings.PROJECT_VERSIONS_KEEP, grace)
+        return version
+
+    publish(UPLOAD_DIR, object_id, version_dir)
+    invalidate_project_meta(object_id)
+    schedule_reap(UPLOAD_DIR, object_id, settings.PROJECT_VERSIONS_KEEP, grace)
+    return int(os.path.basename(version_dir))
+
+
+def version_history(object_id: str):
+    """(当前版本号, [(版本号, 创建时间戳)])，新版本在前"""
+    backend = get_backend()
+    if backend is not None:
+        current = remote_current(backend, object_id)
+        history = []
+        for version in reversed(remote_versions(backend, object_id)):
+            try:
+                info = backend.stat(f"{version_prefix(object_id, version)}/{MANIFEST_KEY}")
+            except FileNotFoundError:
+                # 尚未上传完成的版本
+                continue
+            history.append((version, info.mtime))
+        return current, history
+
+    current = current_version(UPLOAD_DIR, object_id)
+    history = []
+    for version in reversed(list_versions(UPLOAD_DIR, object_id)):
+        try:
+            history.append((version, os.stat(version_path(UPLOAD_DIR, object_id, version)).st_mtime))
+        except FileNotFoundError:
+            continue
+    return current, history
+
+
+def activate_version(object_id: str, version: int) -> bool:
+    """切换到保留的历史版本，版本不存在时返回 False"""
+    backend = get_backend()
+    if backend is not None:
+        # 已认领但尚未上传完成（没有清单）的版本不能切换
+        if backend.read_manifest(version_prefix(object_id, version)) is None:
+            return False
+        set_remote_current(backend, object_id, version)
+        invalidate_project_meta(object_id)
+        return True
+    if version not in list_versions(UPLOAD_DIR, object_id):
+        return False
+    publish_version(object_id, version_path(UPLOAD_DIR, object_id, version))
+    return True
+
+
+def prefers_async(request: Request) -> bool:
+    """客户端通过 Prefer: respond-async（RFC 7240）请求异步处理"""
+    return "respond-async" in request.headers.get("prefer", "").lower()
+
+
+def stage_upload(source: BinaryIO, job_id: str, source_path: Optional[str] = None) -> str:
+    """
+    把上传内容暂存到上传目录下，供后台任务读取（请求结束后 multipart 临时文件会被删除）
+    分片上传的数据文件已在上传目录中，直接移动
+    """
+    staging_dir = os.path.join(UPLOAD_DIR, JOBS_DIRNAME)
+    os.makedirs(staging_dir, exist_ok=True)
+    staged_path = os.path.join(staging_dir, job_id)
+    if source_path:
+        os.replace(source_path, staged_path)
+    else:
+        with open(staged_path, "wb") as f:
+            shutil.copyfileobj(source, f)
+    return staged_path
+
+
+def accept_job(response: Response, job: UploadJob, **extra) -> dict:
+    status_url = f"/api/projects/jobs/{job.id}"
+    response.status_code = 202
+    response.headers["Location"] = status_url
+    return {"message": "文件已接收，正在后台处理", "job_id": job.id, "status_url": status_url, **extra}
+
+
+def run_upload_job(object_id: str, filename: str, staged_path: str):
+    """异步上传的后台任务：解压失败或超出配额时删除项目目录和项目记录"""
+    def work(db: Session, progress):
+        project = ProjectService.get_by_object_id(db, object_id)
+        try:
+            allowance = quota_allowance(db, project.author_id, project.id) if project else None
+            with open(staged_path, "rb") as source:
+                usage = save_project_version(object_id, filename, source, progress, allowance)
+        except BaseException:
+            remove_project(UPLOAD_DIR, object_id)
+            if project:
+                ProjectService.delete(db, project)
+            raise
+        finally:
+            os.remove(staged_path)
+        if project:
+            ProjectService.record_usage(db, project, *usage)
+        invalidate_project_meta(object_id)
+    return work
+
+
+def run_update_job(object_id: str, filename: str, staged_path: str):
+    """异步更新原型文件的后台任务"""
+    def work(db: Session, progress):
+        project = ProjectService.get_by_object_id(db, object_id)
+        try:
+            allowance = quota_allowance(db, project.author_id, project.id) if project else None
+            with open(staged_path, "rb") as source:
+                usage = save_project_version(object_id, filename, source, progress, allowance)
+        finally:
+            os.remove(staged_path)
+        if project:
+            ProjectService.record_usage(db, project, *usage)
+            ProjectService.touch(db, project)
+        invalidate_project_meta(object_id)
+    return work
+
+
+def cleanup_interrupted_job(db: Session, job: UploadJob):
+    """
+    所在进程已退出的任务：删除暂存文件；新建原型尚未发布任何版本时与失败的上传一样删除原型目录和记录，
+    已发布（进程在更新任务状态前退出）时改为成功
+    """
+    staged_path = os.path.join(UPLOAD_DIR, JOBS_DIRNAME, job.id)
+    if os.path.exists(staged_path):
+        os.remove(staged_path)
+    if job.kind != "upload":
+        return
+    project = ProjectService.get_by_object_id(db, job.object_id)
+    backend = get_backend()
+    published = remote_current(backend, job.object_id) if backend else current_version(UPLOAD_DIR, job.object_id)
+    if published is not None:
+        _, manifest, _ = current_manifest(job.object_id)
+        if project and manifest is not None:
+            ProjectService.record_usage(db, project, *manifest_usage(manifest))
+        job.status, job.progress, job.error = "succeeded", 100, None
+        db.commit()
+        return
+    remove_project(UPLOAD_DIR, job.object_id)
+    if project:
+        ProjectService.delete(db, project)
+    invalidate_project_meta(job.object_id)
+
+
+def get_job_for_user(db: Session, job_id: str, user: User) -> UploadJob:
+    job = JobService.get(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if job.user_id != user.id and not is_admin(user):
+        raise HTTPException(status_code=403, detail="无权查看该任务")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+def get_upload_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """查询异步上传任务状态和进度"""
+    return serialize_job(get_job_for_user(db, job_id, current_user))
+
+
+@router.get("/jobs/{job_id}/events")
+async def upload_job_events(
+    job_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """以 SSE 推送异步上传任务的状态变化，任务结束后关闭连接"""
+    await run_in_threadpool(get_job_for_user, db, job_id, current_user)
+
+    async def events():
+        last_state = None
+        while not await request.is_disconnected():
+            state = await run_in_threadpool(job_state, job_id)
+            if state is None:
+                break
+            if state != last_state:
+                yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+                last_state = state
+            if state["status"] in TERMINAL_STATUSES:
+                break
+            await asyncio.sleep(JOB_EVENTS_INTERVAL)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def get_session_for_user(session_id: str, user: User) -> dict:
+    session = load_session(UPLOAD_DIR, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="上传会话不存在")
+    if session["user_id"] != user.id:
+        raise HTTPException(status_code=403, detail="无权访问该上传会话")
+    return session
+
+
+def serialize_upload_session(session: dict) -> dict:
+    return {
+        "session_id": session["id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "offset": committed_offset(UPLOAD_DIR, session["id"]),
+        "object_id": session["object_id"],
+        "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+    }
+
+
+@router.post("/uploads")
+def create_upload_session(
+    data: UploadSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """创建分片上传会话：object_id 为空时上传新原型，否则更新该原型的文件"""
+    project = None
+    if data.object_id:
+        project = ProjectService.get_by_object_id(db, data.object_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="原型不存在")
+        if not can_manage(project, current_user):
+            raise HTTPException(status_code=403, detail="只有作者或管理员可以更新原型")
+    elif not can_upload(current_user):
+        raise HTTPException(status_code=403, detail="只有管理员和产品经理可以上传原型")
+    if not os.path.basename(data.filename):
+        raise HTTPException(status_code=400, detail="文件名不能为空")
+    
+    # 声明的文件大小已超出配额时，在上传第一个分片之前拒绝
+    try:
+        if project:
+            check_quota(data.size, quota_allowance(db, project.author_id, project.id))
+        else:
+            check_quota(data.size, quota_allowance(db, current_user.id))
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
-    # 第 1 步：检查根目录
-    if has_entry_files(extract_dir):
-        return extract_dir
+    # 顺带清理过期的上传会话
+    reap_stale_sessions(UPLOAD_DIR, settings.UPLOAD_SESSION_TTL_HOURS * 3600)
     
-    # 第 2 步：递归遍历所有子目录
-    for root, dirs, files in os.walk(extract_dir):
-        dirs[:] = [d for d in dirs if not d.startswith('.') and d != '__MACOSX']
-        if has_entry_files(root):
-            return root
+    session = create_session(
+        UPLOAD_DIR, current_user.id, data.filename, data.size, object_id=data.object_id, sha256=data.sha256
+    )
+    return serialize_upload_session(session)
+
+
+@router.get("/uploads/{session_id}")
+def get_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """查询已提交的偏移量（断线后从该位置继续上传）"""
+    return serialize_upload_session(get_session_for_user(session_id, current_user))
+
+
+@router.put("/uploads/{session_id}")
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    上传一个分片：请求体为分片内容，offset 必须等于已提交的偏移量
+    可选请求头 X-Chunk-SHA256 为分片内容的 SHA-256（十六进制），不一致时分片作废
+    """
+    session = get_session_for_user(session_id, current_user)
+    try:
+        writer = await run_in_threadpool(ChunkWriter, UPLOAD_DIR, session, offset)
+    except OffsetMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.offset)})
+    except SessionBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
-    # 第 3 步：没有找到符合条件的目录
-    return None
+    try:
+        # 请求体边接收边写入磁盘
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(writer.write, chunk)
+        new_offset = await run_in_threadpool(writer.commit, request.headers.get("x-chunk-sha256"))
+    except BaseException as e:
+        writer.abort()
+        if isinstance(e, UploadSessionError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+    finally:
+        writer.close()
+    
+    return {"offset": new_offset, "size": session["size"]}
+
+
+@router.post("/uploads/{session_id}/finalize")
+def finalize_upload_session(
+    session_id: str,
+    request: Request,
+    response: Response,
+    data: Optional[UploadSessionFinalize] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """完成分片上传：校验文件后按普通上传流程创建原型或更新原型文件（支持 Prefer: respond-async）"""
+    session = get_session_for_user(session_id, current_user)
+    data = data or UploadSessionFinalize()
+    try:
+        verify_upload(UPLOAD_DIR, session)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    path = data_path(UPLOAD_DIR, session_id)
+    with open(path, "rb") as source:
+        if session["object_id"]:
+            project = ProjectService.get_by_object_id(db, session["object_id"])
+            if not project:
+                raise HTTPException(status_code=404, detail="原型不存在")
+            if not can_manage(project, current_user):
+                raise HTTPException(status_code=403, detail="只有作者或管理员可以更新原型")
+            result = import_project_file(
+                request, response, db, current_user, project, session["filename"], source, source_path=path
+            )
+        else:
+            if not can_upload(current_user):
+                raise HTTPException(status_code=403, detail="只有管理员和产品经理可以上传原型")
+            if not data.name:
+                raise HTTPException(status_code=400, detail="原型名称不能为空")
+            project_data = ProjectCreate(
+                name=data.name,
+                view_password=data.view_password,
+                is_public=data.is_public,
+                remark=data.remark,
+                tag_names=data.tag_names,
+            )
+            result = import_new_project(
+                request, response, db, current_user, project_data, session["filename"], source, source_path=path
+            )
+    
+    remove_session(UPLOAD_DIR, session_id)
+    return result
+
+
+@router.delete("/uploads/{session_id}")
+def cancel_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """取消分片上传并删除已上传的内容"""
+    get_session_for_user(session_id, current_user)
+    remove_session(UPLOAD_DIR, session_id)
+    return {"message": "已取消上传"}
+
+
+@router.get("/storage/blobs")
+def get_blob_store_stats(current_user: User = Depends(get_current_user)):
+    """去重存储统计（仅管理员）：存储文件数、实际占用、引用数和节省的空间"""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="只有管理员可以查看存储统计")
+    return store_stats(UPLOAD_DIR)
+
+
+@router.get("/storage/reaper")
+def get_reaper_report(current_user: User = Depends(get_current_user)):
+    """最近一次存储清理的结果（仅管理员）"""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="只有管理员可以查看存储清理结果")
+    return {"report": last_report(UPLOAD_DIR)}
+
+
+@router.post("/storage/reaper", status_code=202)
+def trigger_reaper(
+    orphans: bool = Query(False),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    立即在后台执行一次存储清理（仅管理员），结果通过 GET 查询
+    orphans=true 时把报告中的孤儿目录移入回收区（确认报告后使用），否则按 STORAGE_REAP_ORPHANS 配置
+    """
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="只有管理员可以执行存储清理")
+    schedule_reaper(UPLOAD_DIR, reap_orphans=True if orphans else None)
+    return {"message": "已开始清理"}
+
+
+@router.get("/storage/usage")
+def get_storage_usage(
+    limit: int = Query(50, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    各原型和各用户的存储用量（仅管理员），按占用空间从大到小排列
+    只读取已记录的用量；uncounted 为尚未统计的旧原型数，通过 POST /storage/usage/backfill 在后台补齐
+    """
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="只有管理员可以查看存储用量")
+    from sqlalchemy import func
+    
+    total_files, total_bytes = db.query(
+        func.coalesce(func.sum(Project.file_count), 0), func.coalesce(func.sum(Project.storage_bytes), 0)
+    ).one()
+    projects = (
+        db.query(Project, User.name)
+        .outerjoin(User, User.id == Project.author_id)
+        .order_by(Project.storage_bytes.desc().nulls_last(), Project.id)
+        .limit(limit)
+        .all()
+    )
+    user_bytes = func.coalesce(func.sum(Project.storage_bytes), 0)
+    users = (
+        db.query(Project.author_id, User.name, func.count(Project.id), user_bytes)
+        .outerjoin(User, User.id == Project.author_id)
+        .group_by(Project.author_id, User.name)
+        .order_by(user_bytes.desc(), Project.author_id)
+        .limit(limit)
+        .all()
+    )
+    return {
+        "project_quota": settings.PROJECT_QUOTA_BYTES,
+        "user_quota": settings.USER_QUOTA_BYTES,
+        "total_files": int(total_files),
+        "total_bytes": int(total_bytes),
+        "uncounted": uncounted_projects(db),
+        "backfill_running": backfill_running(),
+        "projects": [
+            {
+                "object_id": project.object_id,
+                "name": project.name,
+                "author_name": author_name or "未知",
+                "file_count": project.file_count,
+                "storage_bytes": project.storage_bytes,
+            }
+            for project, author_name in projects
+        ],
+        "users": [
+            {
+                "author_id": author_id,
+                "author_name": author_name or "未知",
+                "projects": count,
+                "storage_bytes": int(used),
+            }
+            for author_id, author_name, count, used in users
+        ],
+    }
+
+
+@router.post("/storage/usage/backfill", status_code=202)
+def trigger_usage_backfill(current_user: User = Depends(get_current_user)):
+    """在后台补齐旧原型的用量（仅管理员），进度通过 GET /storage/usage 的 uncounted 查看"""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="只有管理员可以统计存储用量")
+    if not backfill_running():
+        schedule_backfill(lambda object_id: current_manifest(object_id)[1])
+    return {"message": "已开始统计"}
+
+
+def get_sync_for_user(object_id: str, sync_id: str, user: User) -> dict:
+    sync = load_sync(UPLOAD_DIR, sync_id)
+    if not sync or sync["object_id"] != object_id:
+        raise HTTPException(status_code=404, detail="同步会话不存在")
+    if sync["user_id"] != user.id:
+        raise HTTPException(status_code=403, detail="无权访问该同步会话")
+    return sync
+
+
+def current_manifest(object_id: str):
+    """当前发布版本的 (本机目录, 文件清单, 下载函数)
+
+    版本保存在存储后端时本机目录为 None，复用的文件通过下载函数从后端取回。
+    """
+    backend = get_backend()
+    if backend is None:
+        root = resolve_project_dir(UPLOAD_DIR, object_id)
+        return root, load_manifest(root), None
+    version = remote_current(backend, object_id)
+    if version is None:
+        return None, None, None
+    prefix = version_prefix(object_id, version)
+    manifest = backend.read_manifest(prefix)
+
+    def fetch(path, entry, target):
+        download_entry(backend, prefix, manifest, path, entry, target)
+    return None, manifest, fetch
+
+
+@router.post("/{object_id}/sync")
+def create_project_sync(
+    object_id: str,
+    data: SyncCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    增量同步：提交新版本的完整清单（相对路径 -> SHA-256），
+    返回需要上传的路径，内容已存在于当前版本中的文件无需上传
+    """
+    project = ProjectService.get_by_object_id(db, object_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="原型不存在")
+    if not can_manage(project, current_user):
+        raise HTTPException(status_code=403, detail="只有作者或管理员可以更新原型")
+    try:
+        files = normalize_files(data.files)
+    except SyncError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # 顺带清理过期的上传会话
+    reap_stale_sessions(UPLOAD_DIR, settings.UPLOAD_SESSION_TTL_HOURS * 3600)
+    
+    sync = create_sync(UPLOAD_DIR, current_user.id, object_id, files)
+    _, manifest, _ = current_manifest(object_id)
+    missing = missing_paths(UPLOAD_DIR, sync, manifest)
+    return {"sync_id": sync["id"], "missing": missing, "reused": len(files) - len(missing)}
+
+
+@router.put("/{object_id}/sync/{sync_id}/files/{path:path}")
+async def upload_sync_file(
+    object_id: str,
+    sync_id: str,
+    path: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """上传清单中一个文件的内容，SHA-256 与清单不一致时拒绝"""
+    sync = get_sync_for_user(object_id, sync_id, current_user)
+    try:
+        writer = await run_in_threadpool(BlobWriter, UPLOAD_DIR, sync, path)
+    except SyncError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        received = 0
+        async for chunk in request.stream():
+            if chunk:
+                # 单个文件已超出原型配额时不必等到提交
+                received += len(chunk)
+                check_quota(received, settings.PROJECT_QUOTA_BYTES or None)
+                await run_in_threadpool(writer.write, chunk)
+        await run_in_threadpool(writer.commit)
+    except BaseException as e:
+        writer.abort()
+        if isinstance(e, QuotaExceeded):
+            raise HTTPException(status_code=413, detail=str(e))
+        if isinstance(e, SyncError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+    return {"message": "上传成功"}
+
+
+@router.post("/{object_id}/sync/{sync_id}/commit")
+def commit_project_sync(
+    object_id: str,
+    sync_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    完成同步：新上传的文件和当前版本中未变化的文件组成新版本并原子发布
+    仍有文件未上传（或期间其他更新替换了当前版本）时返回 409 和需要上传的路径
+    """
+    sync = get_sync_for_user(object_id, sync_id, current_user)
+    project = ProjectService.get_by_object_id(db, object_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="原型不存在")
+    if not can_manage(project, current_user):
+        raise HTTPException(status_code=403, detail="只有作者或管理员可以更新原型")
+    
+    base_root, base_manifest, fetch = current_manifest(object_id)
+    missing = missing_paths(UPLOAD_DIR, sync, base_manifest)
+    if missing:
+        return JSONResponse(status_code=409, content={"detail": "仍有文件未上传", "missing": missing})
+    
+    version_dir = create_version(UPLOAD_DIR, object_id)
+    try:
+        manifest = build_version(UPLOAD_DIR, sync, base_root, base_manifest, version_dir, fetch)
+        usage = manifest_usage(manifest)
+        check_quota(usage[1], quota_allowance(db, project.author_id, project.id))
+        dedupe_version(version_dir, manifest)
+    except BaseException as e:
+        discard_version(version_dir)
+        if isinstance(e, QuotaExceeded):
+            raise HTTPException(status_code=413, detail=str(e))
+        raise
+    version = publish_version(object_id, version_dir)
+    remove_session(UPLOAD_DIR, sync_id)
+    
+    ProjectService.record_usage(db, project, *usage)
+    ProjectService.touch(db, project)
+    invalidate_project_meta(object_id)
+    return {"message": "同步成功", "version": version}
+
+
+@router.delete("/{object_id}/sync/{sync_id}")
+def cancel_project_sync(
+    object_id: str,
+    sync_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """取消同步并删除已上传的文件"""
+    get_sync_for_user(object_id, sync_id, current_user)
+    remove_session(UPLOAD_DIR, sync_id)
+    return {"message": "已取消同步"}
+
 
 @router.get("/{object_id}", response_model=ProjectResponse)
 def get_project(
@@ -332,7 +1079,7 @@ def get_project(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    project = ProjectService.get_by_object_id(db, object_id)
+    project = ProjectService.get_detail(db, object_id)
     if not project:
         raise HTTPException(status_code=404, detail="原型不存在")
     
@@ -351,7 +1098,9 @@ def get_project(
         "tags": [serialize_tag(tag) for tag in ProjectService.get_tags(project)],
         "created_at": project.created_at,
         "updated_at": project.updated_at,
-        "can_access": True
+        "can_access": True,
+        "file_count": project.file_count,
+        "storage_bytes": project.storage_bytes,
     }
 
 @router.post("/{object_id}/verify")
@@ -393,6 +1142,7 @@ def update_project(
         ProjectService.update(db, project, project_data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    invalidate_project_meta(object_id)
     return {"message": "更新成功"}
 
 @router.delete("/{object_id}")
@@ -408,17 +1158,21 @@ def delete_project(
     if not can_manage(project, current_user):
         raise HTTPException(status_code=403, detail="只有作者或管理员可以删除")
     
-    project_dir = os.path.join(UPLOAD_DIR, project.object_id)
-    if os.path.exists(project_dir):
-        shutil.rmtree(project_dir)
+    remove_project(UPLOAD_DIR, project.object_id)
+    backend = get_backend()
+    if backend is not None:
+        schedule_remote_delete(backend, project.object_id)
     
     ProjectService.delete(db, project)
+    invalidate_project_meta(object_id)
     return {"message": "删除成功"}
 
 
 @router.post("/{object_id}/update-file")
 def update_project_file(
     object_id: str,
+    request: Request,
+    response: Response,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -431,82 +1185,54 @@ def update_project_file(
     if not can_manage(project, current_user):
         raise HTTPException(status_code=403, detail="只有作者或管理员可以更新原型")
     
-    project_dir = os.path.join(UPLOAD_DIR, project.object_id)
-    
-    # 清空原有目录内容
-    if os.path.exists(project_dir):
-        for item in os.listdir(project_dir):
-            item_path = os.path.join(project_dir, item)
-            if os.path.isdir(item_path):
-                shutil.rmtree(item_path)
-            else:
-                os.remove(item_path)
-    else:
-        os.makedirs(project_dir, exist_ok=True)
-    
-    # 保存新文件
-    file_path = os.path.join(project_dir, file.filename)
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-    
-    # 如果是 zip 文件，自动解压
-    if file.filename and file.filename.lower().endswith('.zip'):
-        try:
-            temp_extract_dir = os.path.join(project_dir, '_temp_extract')
-            os.makedirs(temp_extract_dir, exist_ok=True)
-            
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                for info in zip_ref.infolist():
-                    decoded_name = decode_zip_filename(info)
-                    
-                    if "__MACOSX" in decoded_name or ".DS_Store" in decoded_name:
-                        continue
-
-                    target_path = os.path.join(temp_extract_dir, decoded_name)
-                    
-                    if not os.path.realpath(target_path).startswith(os.path.realpath(temp_extract_dir)):
-                        continue
-                    
-                    if info.is_dir():
-                        os.makedirs(target_path, exist_ok=True)
-                    else:
-                        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                        with zip_ref.open(info.filename) as source, open(target_path, 'wb') as target:
-                            shutil.copyfileobj(source, target)
-            
-            # 删除 zip 文件
-            os.remove(file_path)
-            
-            # 查找包含入口文件的目录
-            entry_dir = find_entry_directory(temp_extract_dir)
-            
-            if entry_dir is None:
-                shutil.rmtree(temp_extract_dir)
-                raise HTTPException(status_code=400, detail="上传的压缩包中未找到入口文件")
-            
-            # 将入口目录下的所有文件复制到 project_dir
-            for item in os.listdir(entry_dir):
-                src = os.path.join(entry_dir, item)
-                dst = os.path.join(project_dir, item)
-                if os.path.exists(dst):
-                    if os.path.isdir(dst):
-                        shutil.rmtree(dst)
-                    else:
-                        os.remove(dst)
-                shutil.move(src, dst)
-            
-            # 删除临时目录
-            shutil.rmtree(temp_extract_dir)
-            
-        except zipfile.BadZipFile:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            raise HTTPException(status_code=400, detail="无效的压缩文件")
+    return import_project_file(request, response, db, current_user, project, file.filename, file.file)
+
+
+def get_managed_project(db: Session, object_id: str, user: User) -> Project:
+    project = ProjectService.get_by_object_id(db, object_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="原型不存在")
+    if not can_manage(project, user):
+        raise HTTPException(status_code=403, detail="只有作者或管理员可以管理原型版本")
+    return project
+
+
+@router.get("/{object_id}/versions")
+def list_project_versions(
+    object_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """原型文件的历史版本（新版本在前），可回滚到其中任意一个"""
+    project = get_managed_project(db, object_id, current_user)
+    current, history = version_history(project.object_id)
+    items = [
+        {
+            "version": version,
+            "created_at": format_to_cst(datetime.fromtimestamp(mtime, tz=timezone.utc)),
+            "is_current": version == current,
+        }
+        for version, mtime in history
+    ]
+    return {"current": current, "versions": items}
+
+
+@router.post("/{object_id}/versions/{version}/rollback")
+def rollback_project_version(
+    object_id: str,
+    version: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """回滚到保留的历史版本：只切换当前版本指向，不复制文件"""
+    project = get_managed_project(db, object_id, current_user)
+    if not activate_version(project.object_id, version):
+        raise HTTPException(status_code=404, detail="版本不存在或已被清理")
     
-    # 更新项目更新时间
+    ProjectService.record_usage(db, project, *manifest_usage(current_manifest(project.object_id)[1]))
     ProjectService.touch(db, project)
-    
-    return {"message": "更新成功"}
+    invalidate_project_meta(project.object_id)
+    return {"message": "回滚成功", "current": version}
 
 
 @router.put("/{object_id}/change-author")
@@ -532,6 +1258,7 @@ def change_project_author(
         raise HTTPException(status_code=400, detail="新作者账户状态异常")
     
     ProjectService.change_author(db, project, data.new_author_id)
+    invalidate_project_meta(object_id)
     return {"message": "作者更改成功"}
 
 @router.post("/generate-password")
@@ -540,31 +1267,110 @@ def generate_random_password():
     return {"password": generate_password(6)}
 
 
-def find_start_file(project_dir: str) -> Optional[str]:
-    """查找 Axure 原型的起始 HTML 文件"""
-    start_files = ['start.html', 'index.html', 'home.html', 'Start.html', 'Index.html']
-    
-    for filename in start_files:
-        filepath = os.path.join(project_dir, filename)
-        if os.path.exists(filepath):
-            return filepath
-    
-    for root, dirs, files in os.walk(project_dir):
-        for filename in files:
-            if filename.lower().endswith('.html'):
-                return os.path.join(root, filename)
-    
-    return None
+@dataclass(frozen=True)
+class ProjectMeta:
+    """原型页面路由所需的项目元数据快照（脱离数据库会话，可跨请求缓存）"""
+    id: int
+    object_id: str
+    name: str
+    is_public: bool
+    updated_at: Optional[float]
+    project_dir: str
+    manifest: Optional[Manifest]
+    # 版本保存在存储后端时，当前版本在后端中的前缀
+    storage_prefix: Optional[str] = None
+
+    @property
+    def has_files(self) -> bool:
+        return self.manifest is not None and len(self.manifest) > 0
+
+    @property
+    def entry_file(self) -> Optional[str]:
+        return self.manifest.entry_file if self.manifest is not None else None
+
+
+# object_id -> ProjectMeta，静态资源请求命中缓存时不访问数据库
+project_meta_cache = TTLCache(
+    maxsize=settings.PROJECT_META_CACHE_SIZE,
+    ttl=settings.PROJECT_META_CACHE_TTL,
+)
+
+
+def get_project_meta(db: Session, object_id: str) -> Optional[ProjectMeta]:
+    """获取项目元数据（含文件清单），优先读取进程内缓存"""
+    meta = project_meta_cache.get(object_id)
+    if meta is not None:
+        return meta
 
+    project = ProjectService.get_by_object_id(db, object_id)
+    if not project:
+        return None
+
+    # 解析到当前版本目录：新版本发布后，缓存中的旧元数据仍完整地读取旧版本
+    project_dir = resolve_project_dir(UPLOAD_DIR, project.object_id)
+    backend = get_backend()
+    storage_prefix = None
+    if backend is not None:
+        version = remote_current(backend, project.object_id)
+        storage_prefix = version_prefix(project.object_id, version) if version is not None else None
+        manifest = backend.read_manifest(storage_prefix) if storage_prefix else None
+    else:
+        manifest = load_manifest(project_dir)
+    meta = ProjectMeta(
+        id=project.id,
+        object_id=project.object_id,
+        name=project.name,
+        is_public=bool(project.is_public),
+        updated_at=calendar.timegm(project.updated_at.utctimetuple()) if project.updated_at else None,
+        project_dir=project_dir,
+        manifest=manifest,
+        storage_prefix=storage_prefix,
+    )
+    project_meta_cache.set(object_id, meta)
+    return meta
 
-@page_router.get("/{object_id}/")
+
+def invalidate_project_meta(object_id: str):
+    """项目信息或文件变更后清除元数据缓存"""
+    project_meta_cache.invalidate(object_id)
+
+
+def project_file_response(request: Request, project: ProjectMeta, path: str):
+    """按清单返回原型文件，带 ETag / Cache-Control，支持条件请求"""
+    entry = project.manifest.get(path) if project.manifest is not None else None
+    if entry is None:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    if project.storage_prefix is not None:
+        return backend_asset_response(
+            request,
+            get_backend(),
+            project.storage_prefix,
+            path,
+            entry,
+            project.manifest,
+            is_public=project.is_public,
+            last_modified=project.updated_at,
+        )
+    return asset_response(
+        request,
+        project.project_dir,
+        path,
+        entry,
+        is_public=project.is_public,
+        last_modified=project.updated_at,
+        storage_root=UPLOAD_DIR,
+        manifest=project.manifest,
+    )
+
+
+@page_router.api_route("/{object_id}/", methods=["GET", "HEAD"])
 def view_project(
     object_id: str,
     request: Request,
     db: Session = Depends(get_db)
 ):
     """访问原型首页（返回 start.html）- 无需登录，公开原型可直接访问，密码保护原型需验证密码"""
-    project = ProjectService.get_by_object_id(db, object_id)
+    project = get_project_meta(db, object_id)
     if not project:
         raise HTTPException(status_code=404, detail="原型不存在")
     
@@ -576,19 +1382,16 @@ def view_project(
             # 需要密码验证，返回密码输入页面
             return HTMLResponse(content=get_password_verify_page(object_id, project.name))
     
-    project_dir = os.path.join(UPLOAD_DIR, project.object_id)
-    
-    if not os.path.exists(project_dir) or not os.listdir(project_dir):
+    if not project.has_files:
         raise HTTPException(status_code=404, detail="原型文件尚未上传")
     
-    start_file = find_start_file(project_dir)
-    if not start_file:
+    if not project.entry_file:
         raise HTTPException(status_code=404, detail="未找到可预览的 HTML 文件")
     
-    return FileResponse(start_file)
+    return project_file_response(request, project, project.entry_file)
 
 
-@page_router.get("/{object_id}/{filepath:path}")
+@page_router.api_route("/{object_id}/{filepath:path}", methods=["GET", "HEAD"])
 def serve_project_file(
     object_id: str,
     filepath: str,
@@ -596,7 +1399,7 @@ def serve_project_file(
     db: Session = Depends(get_db)
 ):
     """访问原型的静态资源文件 - 无需登录"""
-    project = ProjectService.get_by_object_id(db, object_id)
+    project = get_project_meta(db, object_id)
     if not project:
         raise HTTPException(status_code=404, detail="原型不存在")
     
@@ -606,23 +1409,16 @@ def serve_project_file(
         if verified != "1":
             raise HTTPException(status_code=403, detail="需要密码验证")
     
-    project_dir = os.path.join(UPLOAD_DIR, project.object_id)
-    
     # URL解码 filepath，处理中文文件名
     decoded_filepath = urllib.parse.unquote(filepath)
     
-    file_path = os.path.join(project_dir, decoded_filepath)
-    
-    # 安全检查
-    real_file_path = os.path.realpath(file_path)
-    real_project_dir = os.path.realpath(project_dir)
-    if not real_file_path.startswith(real_project_dir):
+    # 安全检查：清单键不含 ..，越界路径无法命中
+    path = normalize_path(decoded_filepath)
+    if path is None:
         raise HTTPException(status_code=403, detail="非法路径")
     
-    if not os.path.exists(file_path) or os.path.isdir(file_path):
-        raise HTTPException(status_code=404, detail="文件不存在")
-    
-    return FileResponse(file_path)
+    # 只按清单解析，不访问文件系统
+    return project_file_response(request, project, path)
 
 
 def get_password_verify_page(object_id: str, project_name: str) -> str:
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 from app.core.database import get_db
 from app.routers.auth import get_current_user
@@ -11,6 +11,8 @@ from app.schemas.schemas import (
     ProjectListResponse, ProjectVerifyRequest
 )
 from app.services.services import UserService, ProjectService
+from app.services.pagination import InvalidCursor, keyset_page
+from app.services.search import search_filter, search_ordering
 from app.core.security import get_password_hash
 from datetime import timedelta
 
@@ -51,23 +53,18 @@ def list_users(
     search: str = Query(""),
     status: str = Query(""),
     role: str = Query(""),
+    cursor: Optional[str] = Query(None, description="游标分页：首页传空字符串，之后传上一页返回的 next_cursor"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
-    """获取用户列表，支持搜索和筛选"""
-    from sqlalchemy import or_
-    
+    """获取用户列表，支持搜索和筛选；传入 cursor 时改用游标分页（按 ID 升序）"""
     query = db.query(User)
     
-    # 搜索姓名或工号
+    # 搜索姓名或工号（分页模式按相关度排序）
+    ordering = []
     if search:
-        search_pattern = f"%{search}%"
-        query = query.filter(
-            or_(
-                User.name.ilike(search_pattern),
-                User.employee_id.ilike(search_pattern)
-            )
-        )
+        query = query.filter(search_filter(db, [User.name, User.employee_id], search))
+        ordering = search_ordering(db, [User.name, User.employee_id], search)
     
     # 状态筛选
     if status:
@@ -79,8 +76,15 @@ def list_users(
     
     # 分页
     total = query.count()
-    skip = (page - 1) * per_page
-    users = query.offset(skip).limit(per_page).all()
+    next_cursor = None
+    if cursor is not None:
+        try:
+            users, next_cursor = keyset_page(query, [User.id], cursor, per_page, descending=False)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        skip = (page - 1) * per_page
+        users = query.order_by(*ordering, User.id).offset(skip).limit(per_page).all()
     
     # 格式化响应
     result = []
@@ -94,6 +98,8 @@ def list_users(
             "created_at": format_to_cst(user.created_at) if hasattr(user, 'created_at') else ""
         })
     
+    if cursor is not None:
+        return {"items": result, "total": total, "per_page": per_page, "next_cursor": next_cursor}
     return {
         "items": result,
         "total": total,
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 # 用户相关
 class UserBase(BaseModel):
@@ -96,6 +96,8 @@ class ProjectResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     can_access: bool = False
+    file_count: Optional[int] = None
+    storage_bytes: Optional[int] = None
 
 class ProjectVerifyRequest(BaseModel):
     password: str
@@ -104,9 +106,30 @@ class ProjectVerifyRequest(BaseModel):
 class ProjectListResponse(BaseModel):
     items: List[ProjectResponse]
     total: int
+    # exact / cached / estimated（total 为估算值）
+    count_strategy: str = "exact"
     page: int
     per_page: int
 
 # 更改作者请求
 class ChangeAuthorRequest(BaseModel):
     new_author_id: int
+
+# 分片上传：创建会话（object_id 为空表示上传新原型，否则为更新该原型的文件）
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int = Field(gt=0)
+    object_id: Optional[str] = None
+    sha256: Optional[str] = None
+
+# 分片上传：完成上传（上传新原型时填写原型信息）
+class UploadSessionFinalize(BaseModel):
+    name: Optional[str] = None
+    view_password: Optional[str] = None
+    is_public: bool = False
+    remark: Optional[str] = None
+    tag_names: List[str] = Field(default_factory=list)
+
+# 增量同步：原型的完整清单（相对路径 -> 文件内容 SHA-256）
+class SyncCreate(BaseModel):
+    files: Dict[str, str]
@@ -0,0 +1,299 @@
+"""
+ZIP 压缩包工具
+
+- 文件名解码（兼容 Windows 中文压缩包）
+- 仅凭中央目录定位 Axure 入口目录
+- 解压存储：直接读取上传的临时文件，入口目录下的成员一次写入最终位置并计算 SHA-256，同时生成文件清单
+- ZIP 存储模式：保留原始压缩包，为入口目录下的成员建立索引，请求时直接从压缩包读取
+  （stored 成员按偏移零拷贝发送，deflate 成员经 mmap 流式解压或加 gzip 头尾直接发送）
+"""
+
+import hashlib
+import mmap
+import os
+import posixpath
+import struct
+import threading
+import time
+import weakref
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from app.services.manifest import (
+    IGNORED_ROOT_ENTRIES, META_DIRNAME, ArchiveMember, Manifest, ManifestEntry,
+    guess_content_type, normalize_path, write_manifest,
+)
+
+ARCHIVE_FILENAME = "archive.zip"
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+LOCAL_HEADER_SIZE = 30
+SUPPORTED_COMPRESSION = {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED}
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class UnsupportedArchive(Exception):
+    """压缩包使用了无法直接读取的特性（加密、非 deflate 压缩算法）"""
+
+
+def decode_zip_filename(info: zipfile.ZipInfo) -> str:
+    """
+    更稳健的 ZIP 文件名解码逻辑
+
+    Python 3.11+ 的 zipfile 会根据 flag_bits 判断编码：
+    - flag_bits & 0x800: UTF-8 编码，已正确解码
+    - 否则: 默认 cp437 编码（Windows 中文压缩包通常是 GBK/GB18030）
+    """
+    filename = info.filename
+
+    # 如果设置了 UTF-8 flag，zipfile 已经用 UTF-8 正确解码，直接使用
+    if info.flag_bits & 0x800:
+        return filename
+
+    # zipfile 默认用 cp437 解码了文件名，尝试还原为原始字节再重新解码
+    try:
+        raw_bytes = filename.encode('cp437')
+    except UnicodeEncodeError:
+        return filename
+
+    # 依次尝试常见中文编码
+    for encoding in ('gbk', 'gb18030', 'utf-8'):
+        try:
+            return raw_bytes.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+
+    return filename
+
+
+def is_ignored_member(name: str) -> bool:
+    """过滤 macOS 自动生成的缓存文件夹"""
+    return "__MACOSX" in name or ".DS_Store" in name
+
+
+def find_entry_prefix(names: Iterable[str]) -> Optional[str]:
+    """
+    按成员名查找同时包含 index.html 和 start.html 的目录，返回目录前缀（根目录为 ""）
+    多个候选时取层级最浅的；隐藏目录和 __MACOSX 下的不算。未找到返回 None
+    """
+    files = {name for name in names if not name.endswith("/")}
+    candidates = []
+    for name in files:
+        directory, _, filename = name.rpartition("/")
+        if filename != "index.html":
+            continue
+        prefix = f"{directory}/" if directory else ""
+        if f"{prefix}start.html" not in files:
+            continue
+        if any(part.startswith(".") or part == "__MACOSX" for part in directory.split("/") if part):
+            continue
+        candidates.append(prefix)
+
+    if not candidates:
+        return None
+    return min(candidates, key=lambda prefix: (prefix.count("/"), prefix))
+
+
+def member_names(zip_ref: zipfile.ZipFile):
+    """(解码后的成员名, ZipInfo)，跳过目录和系统缓存文件"""
+    for info in zip_ref.infolist():
+        name = decode_zip_filename(info).replace("\\", "/")
+        if info.is_dir() or is_ignored_member(name):
+            continue
+        yield name, info
+
+
+def index_archive(archive_path: str) -> Optional[Manifest]:
+    """为 ZIP 存储模式建立清单：只收录入口目录下的成员。未找到入口文件返回 None
+
+    逐个成员读取一遍计算 SHA-256（同时校验 CRC），不落盘。
+    """
+    with open(archive_path, "rb") as fp, zipfile.ZipFile(fp) as zip_ref:
+        members = list(member_names(zip_ref))
+        prefix = find_entry_prefix(name for name, _ in members)
+        if prefix is None:
+            return None
+
+        files = {}
+        for name, info in members:
+            if not name.startswith(prefix):
+                continue
+            path = normalize_path(name[len(prefix):])
+            if path is None or path.split("/", 1)[0] == META_DIRNAME:
+                continue
+            if info.flag_bits & 0x1 or info.compress_type not in SUPPORTED_COMPRESSION:
+                raise UnsupportedArchive(name)
+
+            header = os.pread(fp.fileno(), LOCAL_HEADER_SIZE, info.header_offset)
+            if header[:4] != LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile(f"本地文件头损坏: {name}")
+            name_length, extra_length = struct.unpack("<HH", header[26:30])
+
+            digest = hashlib.sha256()
+            with zip_ref.open(info) as source:
+                for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                    digest.update(chunk)
+
+            files[path] = ManifestEntry(
+                size=info.file_size,
+                mtime=time.mktime(info.date_time + (0, 0, -1)),
+                content_type=guess_content_type(path),
+                sha256=digest.hexdigest(),
+                member=ArchiveMember(
+                    offset=info.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length,
+                    compress_size=info.compress_size,
+                    compress_type=info.compress_type,
+                    crc32=info.CRC,
+                ),
+            )
+
+    return Manifest(files, archive=f"{META_DIRNAME}/{ARCHIVE_FILENAME}")
+
+
+def store_archive(project_dir: str, upload_path: str) -> Optional[Manifest]:
+    """ZIP 存储模式：索引上传的压缩包并原样保存到 .axhost/archive.zip，未找到入口文件返回 None
+
+    压缩包无法直接读取时抛出 UnsupportedArchive，上传文件保持原位，由调用方改为解压存储。
+    """
+    manifest = index_archive(upload_path)
+    if manifest is None:
+        return None
+    archive_path = os.path.join(project_dir, manifest.archive)
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    os.replace(upload_path, archive_path)
+    write_manifest(project_dir, manifest)
+    return manifest
+
+
+def archive_entry_prefix(source: BinaryIO) -> Optional[str]:
+    """只读取中央目录查找入口目录前缀，不解压；未找到返回 None，压缩包损坏抛出 BadZipFile，无法解压抛出 ValueError"""
+    return archive_summary(source)[0]
+
+
+def entry_targets(members: Iterable[Tuple[str, zipfile.ZipInfo]], prefix: str) -> Dict[str, zipfile.ZipInfo]:
+    """
+    入口目录下要解压的成员：规范化的相对路径 -> ZipInfo
+    同名成员以后出现的为准，避免并发写同一个文件；同一路径既是文件又是目录时抛出 ValueError
+    """
+    targets = {}
+    for name, info in members:
+        if not name.startswith(prefix):
+            continue
+        path = normalize_path(name[len(prefix):])
+        if path is None or path.split("/", 1)[0] in IGNORED_ROOT_ENTRIES:
+            continue
+        targets[path] = info
+    conflicts = sorted(target_directories(targets).intersection(targets))
+    if conflicts:
+        raise ValueError(f"压缩包中存在同名的文件和目录: {conflicts[0]}")
+    return targets
+
+
+def target_directories(paths: Iterable[str]) -> Set[str]:
+    """路径的所有上级目录（不含根目录）"""
+    directories = set()
+    for path in paths:
+        directory = posixpath.dirname(path)
+        while directory and directory not in directories:
+            directories.add(directory)
+            directory = posixpath.dirname(directory)
+    return directories
+
+
+def archive_summary(source: BinaryIO) -> Tuple[Optional[str], int]:
+    """
+    只读取中央目录：(入口目录前缀, 入口目录下成员解压后的总字节数)，用于解压前检查配额
+    文件与目录同名等无法解压的压缩包抛出 ValueError
+    """
+    with zipfile.ZipFile(source) as zip_ref:
+        members = list(member_names(zip_ref))
+        prefix = find_entry_prefix(name for name, _ in members)
+        if prefix is None:
+            return None, 0
+        return prefix, sum(info.file_size for info in entry_targets(members, prefix).values())
+
+
+def extract_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, target: str, path: str) -> ManifestEntry:
+    """解压单个成员（目标目录需已存在），写入的同时计算 SHA-256；读完时 zipfile 校验 CRC，损坏抛出 BadZipFile"""
+    digest = hashlib.sha256()
+    with zip_ref.open(info) as source, open(target, "wb") as out:
+        for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            out.write(chunk)
+        out.flush()
+        mtime = os.fstat(out.fileno()).st_mtime
+    return ManifestEntry(
+        size=info.file_size,
+        mtime=mtime,
+        content_type=guess_content_type(path),
+        sha256=digest.hexdigest(),
+    )
+
+
+def extract_workers(configured: int) -> int:
+    """解压线程数：配置为 0 时按 CPU 核数选择，单核机器上并行只会增加开销"""
+    if configured > 0:
+        return configured
+    return min(4, os.cpu_count() or 1)
+
+
+def extract_archive(
+    source: BinaryIO,
+    project_dir: str,
+    workers: int = 1,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Optional[Manifest]:
+    """解压存储：把入口目录下的成员直接解压到项目目录，返回文件清单
+
+    source 为可 seek 的文件对象（UploadFile 的临时文件），不再另存一份压缩包。
+    入口目录由中央目录的成员名确定，入口目录之外的成员不解压；未找到入口文件时
+    不写任何文件，返回 None。同一路径既是文件又是目录（如成员 a 和 a/b）时不写任何文件，
+    抛出 ValueError。清单条目在解压时生成，无需再读取一遍文件计算哈希。
+
+    目录树先一次性创建；workers > 1 时成员的解压和写入分发到线程池
+    （zlib 解压、哈希和文件读写都会释放 GIL，zipfile 对共享文件对象的读取自带锁）。
+    progress(已完成数, 总数) 在每个成员写入完成后调用。
+    """
+    with zipfile.ZipFile(source) as zip_ref:
+        members = list(member_names(zip_ref))
+        prefix = find_entry_prefix(name for name, _ in members)
+        if prefix is None:
+            return None
+
+        targets = entry_targets(members, prefix)
+        for directory in sorted(target_directories(targets)):
+            os.makedirs(os.path.join(project_dir, directory), exist_ok=True)
+
+        def extract(item):
+            path, info = item
+            return path, extract_member(zip_ref, info, os.path.join(project_dir, path), path)
+
+        files = {}
+
+        def collect(results):
+            for path, entry in results:
+                files[path] = entry
+                if progress is not None:
+                    progress(len(files), len(targets))
+
+        if workers > 1 and len(targets) > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract") as pool:
+                collect(pool.map(extract, targets.items()))
+        else:
+            collect(map(extract, targets.items()))
+    return Manifest(files)
+
+
+# Manifest -> 压缩包 mmap；清单重新加载后旧映射随旧清单一起释放
+_archive_maps = weakref.WeakKeyDictionary()
+_archive_maps_lock = threading.Lock()
+
+
+def open_archive_map(root: str, manifest: Manifest) -> mmap.mmap:
+    with _archive_maps_lock:
+        archive_map = _archive_maps.get(manifest)
+        if archive_map is None:
+            with open(os.path.join(root, manifest.archive), "rb") as f:
+                archive_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            _archive_maps[manifest] = archive_map
+        return archive_map
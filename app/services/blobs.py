@@ -0,0 +1,129 @@
+"""
+内容寻址文件存储（跨原型去重）
+
+每个 Axure 导出都带着几乎相同的 resources/ 目录（jQuery、axure 脚本、字体、图片），
+开启 BLOB_STORE_ENABLED 后，新版本发布前把其中的文件按 SHA-256 收录到
+上传目录下的 .blobs/<前两位>/<SHA-256>：内容已存在时项目文件替换为该文件的硬链接，
+否则把项目文件本身链接进存储。项目目录结构和页面路由均不变。
+
+引用计数即文件系统的硬链接数：存储中的文件链接数为 1 时已没有原型引用它，
+删除原型或清理旧版本后按其清单释放这些文件。
+只有解压存储的文件参与去重，ZIP 存储模式的压缩包整体保存，不做拆分。
+"""
+
+import os
+import uuid
+from typing import Iterable, Optional, Set, Tuple
+
+from app.services.manifest import Manifest, load_manifest, manifest_path
+
+BLOBS_DIRNAME = ".blobs"
+
+
+def blobs_root(upload_dir: str) -> str:
+    return os.path.join(upload_dir, BLOBS_DIRNAME)
+
+
+def blob_path(upload_dir: str, sha256: str) -> str:
+    return os.path.join(blobs_root(upload_dir), sha256[:2], sha256)
+
+
+def intern_file(upload_dir: str, path: str, sha256: str) -> bool:
+    """收录一个文件，已有相同内容时把 path 替换为存储文件的硬链接并返回 True"""
+    blob = blob_path(upload_dir, sha256)
+    st = os.stat(path)
+    while True:
+        try:
+            blob_st = os.stat(blob)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                os.link(path, blob)
+            except FileExistsError:
+                # 其他请求同时收录了相同内容，改为链接到它
+                continue
+            except OSError:
+                # 跨文件系统、硬链接数达到上限等，不去重
+                return False
+            return False
+
+        if os.path.samestat(st, blob_st):
+            return False
+        if blob_st.st_size != st.st_size:
+            return False
+
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(blob, tmp_path)
+        except FileNotFoundError:
+            # 存储文件刚被释放，重新收录
+            continue
+        except OSError:
+            return False
+        os.replace(tmp_path, path)
+        return True
+
+
+def intern_tree(upload_dir: str, root: str, manifest: Manifest) -> Tuple[int, int]:
+    """收录版本目录中清单列出的文件，返回 (去重的文件数, 节省的字节数)"""
+    files = saved = 0
+    for path, entry in manifest.files.items():
+        if entry.member is not None:
+            continue
+        if intern_file(upload_dir, os.path.join(root, path), entry.sha256):
+            files += 1
+            saved += entry.size
+    return files, saved
+
+
+def tree_blobs(root: str) -> Set[str]:
+    """目录中清单列出的文件的 SHA-256，删除目录后据此释放存储文件
+
+    没有清单的目录（旧项目）从未收录过，不为它补建清单。
+    """
+    if not os.path.exists(manifest_path(root)):
+        return set()
+    manifest: Optional[Manifest] = load_manifest(root)
+    if manifest is None:
+        return set()
+    return {entry.sha256 for entry in manifest.files.values() if entry.member is None}
+
+
+def release_blobs(upload_dir: str, hashes: Iterable[str]) -> int:
+    """删除不再被任何原型引用（链接数为 1）的存储文件，返回删除数量
+
+    与并发收录竞争时最多使新版本的某个文件失去去重，不会影响原型文件本身。
+    """
+    if not os.path.isdir(blobs_root(upload_dir)):
+        return 0
+    removed = 0
+    for sha256 in hashes:
+        blob = blob_path(upload_dir, sha256)
+        try:
+            if os.stat(blob).st_nlink > 1:
+                continue
+            os.unlink(blob)
+        except FileNotFoundError:
+            continue
+        removed += 1
+    return removed
+
+
+def store_stats(upload_dir: str) -> dict:
+    """遍历存储统计：文件数、实际占用字节、原型引用数和去重节省的字节数"""
+    blobs = stored = references = saved = 0
+    root = blobs_root(upload_dir)
+    if os.path.isdir(root):
+        for prefix in os.listdir(root):
+            directory = os.path.join(root, prefix)
+            for name in os.listdir(directory):
+                try:
+                    st = os.stat(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+                refs = st.st_nlink - 1
+                blobs += 1
+                stored += st.st_size
+                references += refs
+                saved += st.st_size * max(refs - 1, 0)
+    return {"blobs": blobs, "bytes": stored, "references": references, "saved_bytes": saved}
@@ -0,0 +1,110 @@
+"""
+列表总数的计数方式
+
+项目列表每次请求都要对筛选、权限过滤后的查询再执行一次 COUNT，数据量大时与取一页数据的开销相当。
+计数方式：
+- exact：每次执行 COUNT
+- cached：按 (用户, 筛选条件) 缓存 COUNT 结果，LIST_COUNT_CACHE_TTL 秒后过期；本进程内经会话提交的
+  项目、标签关联、授权记录写操作（包括批量 UPDATE / DELETE 和 INSERT ... ON CONFLICT）使全部缓存
+  立即失效（其他 worker 依赖 TTL 过期）
+- estimated：读取 PostgreSQL 执行计划的估算行数，不实际扫描；估算值低于 LIST_COUNT_ESTIMATE_THRESHOLD
+  或数据库不支持时改为精确计数
+返回值中附带实际使用的计数方式，估算值只能作为"N+"展示。
+"""
+
+import itertools
+import json
+from typing import Hashable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.models import Project, ProjectAccess, ProjectTag
+
+COUNT_STRATEGIES = ("exact", "cached", "estimated")
+
+list_count_cache = TTLCache(maxsize=settings.LIST_COUNT_CACHE_SIZE, ttl=settings.LIST_COUNT_CACHE_TTL)
+
+# 写操作提交时递增，缓存键中包含该值，递增后旧条目不再被访问，随 LRU 淘汰
+_generation = itertools.count(1)
+_current_generation = 0
+
+_WATCHED = (Project, ProjectAccess, ProjectTag)
+_WATCHED_TABLES = {model.__table__ for model in _WATCHED}
+_CHANGED_KEY = "list_counts_changed"
+
+
+def invalidate_list_counts():
+    global _current_generation
+    _current_generation = next(_generation)
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_changed(session, flush_context):
+    if any(isinstance(obj, _WATCHED) for obj in itertools.chain(session.new, session.dirty, session.deleted)):
+        session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk_changed(orm_execute_state):
+    # 不经过 flush 的写操作：INSERT ... ON CONFLICT（授权）、query.update() / query.delete()（撤销授权等）
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if orm_execute_state.statement.table in _WATCHED_TABLES:
+            orm_execute_state.session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop(_CHANGED_KEY, False):
+        invalidate_list_counts()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop(_CHANGED_KEY, None)
+
+
+class explain(Executable, ClauseElement):
+    """EXPLAIN 语句，参数绑定与被解释的查询相同"""
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def estimate_rows(db: Session, query) -> Optional[int]:
+    """执行计划估算的结果行数，不支持的数据库返回 None"""
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    plan = db.execute(explain(query.statement)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_rows(db: Session, query, strategy: str, cache_key: Hashable) -> Tuple[int, str]:
+    """按计数方式统计查询的结果行数，返回 (总数, 实际使用的计数方式)"""
+    if strategy == "cached":
+        key = (_current_generation, cache_key)
+        total = list_count_cache.get(key)
+        if total is not None:
+            return total, "cached"
+        total = query.count()
+        list_count_cache.set(key, total)
+        return total, "exact"
+    if strategy == "estimated":
+        estimate = estimate_rows(db, query)
+        if estimate is not None and estimate >= settings.LIST_COUNT_ESTIMATE_THRESHOLD:
+            return estimate, "estimated"
+    return query.count(), "exact"
@@ -0,0 +1,209 @@
+"""
+上传后台任务
+
+请求头带 Prefer: respond-async 时，上传接口在文件落盘后立即返回 202 和任务 ID，
+解压、校验在后台线程池中执行。任务状态保存在 upload_jobs 表中，
+任意 worker 进程都可以查询；任务本身只在接收上传的进程内执行。
+
+每个进程定期为自己持有（排队或执行中）的任务更新 updated_at 作为心跳。进程退出（重启、发布）后
+其任务不再有心跳，超过 UPLOAD_JOB_STALE_AFTER 秒后由任意进程的任务监控标记为失败，并执行与失败任务
+相同的清理；已结束的任务记录保留 UPLOAD_JOB_RETENTION_DAYS 天。
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.models import UploadJob
+
+logger = logging.getLogger(__name__)
+
+# 暂存上传文件的目录（位于上传目录下）
+JOBS_DIRNAME = ".jobs"
+TERMINAL_STATUSES = {"succeeded", "failed"}
+INTERRUPTED_ERROR = "服务重启，任务已中断，请重新上传"
+
+# 后台线程使用的数据库会话工厂（测试中替换为测试数据库）
+session_factory = SessionLocal
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# 本进程持有的任务（已提交到线程池、尚未结束）
+_owned: Set[str] = set()
+_owned_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_JOB_WORKERS, thread_name_prefix="upload-job")
+        return _executor
+
+
+class ProgressReporter:
+    """把解压进度写回任务记录；进度每增加 5% 才提交一次，避免频繁写库"""
+
+    step = 5
+
+    def __init__(self, db: Session, job: UploadJob):
+        self.db = db
+        self.job = job
+
+    def __call__(self, done: int, total: int):
+        # 100% 留给任务完成时设置
+        progress = min(99, done * 100 // total) if total else 0
+        if progress >= self.job.progress + self.step:
+            self.job.progress = progress
+            self.db.commit()
+
+
+class JobService:
+    @staticmethod
+    def create(db: Session, kind: str, object_id: str, user_id: int) -> UploadJob:
+        job = UploadJob(id=uuid.uuid4().hex, kind=kind, object_id=object_id, user_id=user_id)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    @staticmethod
+    def get(db: Session, job_id: str) -> Optional[UploadJob]:
+        return db.get(UploadJob, job_id)
+
+
+def submit(job_id: str, work: Callable[[Session, ProgressReporter], None]):
+    """在后台线程池中执行任务；work 失败时自行清理，抛出 ValueError 时以其消息作为错误提示"""
+    with _owned_lock:
+        _owned.add(job_id)
+    get_executor().submit(run_job, job_id, work)
+
+
+def run_job(job_id: str, work: Callable[[Session, ProgressReporter], None]):
+    db = session_factory()
+    try:
+        job = db.get(UploadJob, job_id)
+        job.status = "running"
+        db.commit()
+        try:
+            work(db, ProgressReporter(db, job))
+        except ValueError as e:
+            db.rollback()
+            job.status, job.error = "failed", str(e)
+        except Exception:
+            logger.exception("上传任务 %s 执行失败", job_id)
+            db.rollback()
+            job.status, job.error = "failed", "处理上传文件失败"
+        else:
+            job.status, job.progress = "succeeded", 100
+        db.commit()
+    finally:
+        db.close()
+        with _owned_lock:
+            _owned.discard(job_id)
+
+
+def owned_jobs() -> Set[str]:
+    with _owned_lock:
+        return set(_owned)
+
+
+def heartbeat(db: Session):
+    """更新本进程持有的未结束任务的 updated_at"""
+    job_ids = owned_jobs()
+    if not job_ids:
+        return
+    db.query(UploadJob).filter(
+        UploadJob.id.in_(job_ids), UploadJob.status.notin_(TERMINAL_STATUSES)
+    ).update({UploadJob.updated_at: datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+
+
+def recover_stale_jobs(db: Session, cleanup: Callable[[Session, UploadJob], None], stale_after: float) -> List[str]:
+    """
+    把超过 stale_after 秒没有心跳的未结束任务标记为失败，并调用 cleanup 清理；返回处理的任务 ID
+    以条件 UPDATE 认领任务，多个进程同时检查时每个任务只清理一次
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    owned = owned_jobs()
+    stale = db.query(UploadJob.id).filter(
+        UploadJob.status.notin_(TERMINAL_STATUSES), UploadJob.updated_at < cutoff
+    ).all()
+    recovered = []
+    for (job_id,) in stale:
+        if job_id in owned:
+            continue
+        claimed = db.query(UploadJob).filter(
+            UploadJob.id == job_id, UploadJob.status.notin_(TERMINAL_STATUSES), UploadJob.updated_at < cutoff
+        ).update({UploadJob.status: "failed", UploadJob.error: INTERRUPTED_ERROR}, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            continue
+        logger.warning("上传任务 %s 所在进程已退出，标记为失败", job_id)
+        try:
+            cleanup(db, db.get(UploadJob, job_id))
+        except Exception:
+            db.rollback()
+            logger.exception("清理中断的上传任务 %s 失败", job_id)
+        recovered.append(job_id)
+    return recovered
+
+
+def prune_jobs(db: Session, retention_days: float) -> int:
+    """删除结束超过 retention_days 天的任务记录"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = db.query(UploadJob).filter(
+        UploadJob.status.in_(TERMINAL_STATUSES), UploadJob.updated_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def start_job_monitor(cleanup: Callable[[Session, UploadJob], None], interval: float):
+    """启动任务监控线程（每个 worker 进程一个）：心跳、回收中断的任务、清理过期记录"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            db = session_factory()
+            try:
+                heartbeat(db)
+                recover_stale_jobs(db, cleanup, settings.UPLOAD_JOB_STALE_AFTER)
+                prune_jobs(db, settings.UPLOAD_JOB_RETENTION_DAYS)
+            except Exception:
+                db.rollback()
+                logger.exception("上传任务监控失败")
+            finally:
+                db.close()
+
+    threading.Thread(target=loop, name="upload-job-monitor", daemon=True).start()
+
+
+def job_state(job_id: str) -> Optional[dict]:
+    """读取任务状态（SSE 轮询使用，每次使用独立会话以读到其他线程 / 进程的提交）"""
+    db = session_factory()
+    try:
+        job = db.get(UploadJob, job_id)
+        return serialize_job(job) if job else None
+    finally:
+        db.close()
+
+
+def serialize_job(job: UploadJob) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "object_id": job.object_id,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+    }
+
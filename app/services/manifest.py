@@ -0,0 +1,268 @@
+"""
+原型文件清单（manifest）
+
+上传解压完成后为项目目录生成文件清单，记录每个可访问文件的大小、修改时间、
+MIME 类型和 SHA-256。页面路由按清单解析请求路径：不在清单中的路径直接返回 404，
+请求期间除最终打开文件外不访问文件系统。
+
+清单保存在项目目录下的 .axhost/manifest.json，该目录本身不会出现在清单中。
+ZIP 存储模式下项目目录只保存原始压缩包（.axhost/archive.zip），清单条目记录对应
+成员在压缩包中的数据偏移，请求时直接从压缩包读取。
+"""
+
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import stat
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# 项目目录下的系统保留目录（清单、预压缩文件等）
+META_DIRNAME = ".axhost"
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_FORMAT_VERSION = 1
+
+# 生成清单时忽略的根目录条目（旧版本解压残留的临时目录）
+IGNORED_ROOT_ENTRIES = {META_DIRNAME, "_temp_extract"}
+
+# Axure 起始页候选，按优先级排列
+START_FILES = ['start.html', 'index.html', 'home.html', 'Start.html', 'Index.html']
+
+
+class ArchiveMember(NamedTuple):
+    """ZIP 成员的数据位置（跳过本地文件头后的压缩数据）"""
+    offset: int
+    compress_size: int
+    compress_type: int
+    crc32: int
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    size: int
+    mtime: float
+    content_type: str
+    sha256: str
+    # 预压缩副本：编码名（gzip / br）-> 压缩后大小
+    encodings: Dict[str, int] = field(default_factory=dict)
+    # ZIP 存储模式下成员在压缩包中的位置
+    member: Optional[ArchiveMember] = None
+
+
+class Manifest:
+    """项目文件清单：相对路径（/ 分隔）-> ManifestEntry"""
+
+    def __init__(
+        self,
+        files: Dict[str, ManifestEntry],
+        entry_file: Optional[str] = None,
+        archive: Optional[str] = None,
+    ):
+        self.files = files
+        self.entry_file = entry_file if entry_file is not None else find_entry_file(files)
+        # ZIP 存储模式下压缩包相对项目目录的路径
+        self.archive = archive
+
+    def get(self, path: str) -> Optional[ManifestEntry]:
+        key = normalize_path(path)
+        if key is None:
+            return None
+        return self.files.get(key)
+
+    def __contains__(self, path: str) -> bool:
+        return self.get(path) is not None
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def to_dict(self) -> dict:
+        data = {
+            "version": MANIFEST_FORMAT_VERSION,
+            "entry": self.entry_file,
+            "files": {path: _entry_to_list(entry) for path, entry in self.files.items()},
+        }
+        if self.archive:
+            data["archive"] = self.archive
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Manifest":
+        files = {
+            path: ManifestEntry(
+                size=item[0],
+                mtime=item[1],
+                content_type=item[2],
+                sha256=item[3],
+                encodings=item[4] if len(item) > 4 else {},
+                member=ArchiveMember(*item[5]) if len(item) > 5 else None,
+            )
+            for path, item in data.get("files", {}).items()
+        }
+        return cls(files, data.get("entry"), data.get("archive"))
+
+
+def _entry_to_list(entry: ManifestEntry) -> list:
+    """紧凑格式：[size, mtime, content_type, sha256, encodings?, member?]"""
+    item = [entry.size, entry.mtime, entry.content_type, entry.sha256]
+    if entry.member is not None:
+        item += [entry.encodings, list(entry.member)]
+    elif entry.encodings:
+        item.append(entry.encodings)
+    return item
+
+
+def normalize_path(path: str) -> Optional[str]:
+    """将请求路径规范化为清单键；越界或空路径返回 None"""
+    path = path.replace("\\", "/").lstrip("/")
+    if not path:
+        return None
+    normalized = posixpath.normpath(path)
+    if normalized == "." or normalized == ".." or normalized.startswith("../"):
+        return None
+    return normalized
+
+
+def guess_content_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def find_entry_file(paths: Iterable[str]) -> Optional[str]:
+    """查找 Axure 原型的起始 HTML 文件：优先根目录候选文件，其次层级最浅的 HTML 文件"""
+    paths = set(paths)
+    for filename in START_FILES:
+        if filename in paths:
+            return filename
+
+    html_files = [p for p in paths if p.lower().endswith('.html')]
+    if not html_files:
+        return None
+    return min(html_files, key=lambda p: (p.count("/"), p))
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_manifest(root: str) -> Manifest:
+    """遍历项目目录生成清单"""
+    files: Dict[str, ManifestEntry] = {}
+    for current, dirs, filenames in os.walk(root):
+        rel_dir = os.path.relpath(current, root)
+        if rel_dir == ".":
+            rel_dir = ""
+            dirs[:] = [d for d in dirs if d not in IGNORED_ROOT_ENTRIES]
+        for filename in filenames:
+            if not rel_dir and filename in IGNORED_ROOT_ENTRIES:
+                continue
+            full_path = os.path.join(current, filename)
+            st = os.stat(full_path)
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            rel_path = posixpath.join(rel_dir.replace(os.sep, "/"), filename) if rel_dir else filename
+            files[rel_path] = ManifestEntry(
+                size=st.st_size,
+                mtime=st.st_mtime,
+                content_type=guess_content_type(filename),
+                sha256=hash_file(full_path),
+            )
+    return Manifest(files)
+
+
+def manifest_path(root: str) -> str:
+    return os.path.join(root, META_DIRNAME, MANIFEST_FILENAME)
+
+
+def write_manifest(root: str, manifest: Manifest):
+    """原子写入清单文件"""
+    path = manifest_path(root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 临时文件名唯一，并发写入同一目录的清单时互不覆盖
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def rebuild_manifest(root: str, manifest: Optional[Manifest] = None) -> Manifest:
+    """重新生成清单并生成预压缩副本后保存（上传、更新文件后调用）
+
+    传入解压时已生成的清单时不再遍历目录。
+    """
+    from app.services.archive import extract_workers
+    from app.services.precompress import precompress_project
+
+    if manifest is None:
+        manifest = build_manifest(root)
+    if settings.PRECOMPRESS_ENABLED:
+        manifest = precompress_project(root, manifest, workers=extract_workers(settings.EXTRACT_WORKERS))
+    write_manifest(root, manifest)
+    return manifest
+
+
+# (项目目录, 清单文件 mtime) -> Manifest，避免元数据缓存过期后重复解析清单
+_manifest_cache = TTLCache(maxsize=settings.MANIFEST_CACHE_SIZE, ttl=3600)
+
+# 正在补建清单的项目目录 -> 锁，同一目录的并发请求只遍历、计算哈希一次
+_build_locks: Dict[str, threading.Lock] = {}
+_build_locks_guard = threading.Lock()
+
+
+def load_manifest(root: str) -> Optional[Manifest]:
+    """加载项目清单；旧项目没有清单时现场生成一次并保存。目录不存在返回 None"""
+    path = manifest_path(root)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        if not os.path.isdir(root):
+            return None
+        return build_missing_manifest(root)
+
+    key = (root, mtime_ns)
+    manifest = _manifest_cache.get(key)
+    if manifest is None:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = Manifest.from_dict(json.load(f))
+        _manifest_cache.set(key, manifest)
+    return manifest
+
+
+def build_missing_manifest(root: str) -> Manifest:
+    """为没有清单的旧项目补建清单：同一目录同时只有一个线程生成，其余线程等待后直接读取结果"""
+    with _build_locks_guard:
+        lock = _build_locks.setdefault(root, threading.Lock())
+    with lock:
+        try:
+            # 等待期间其他线程已生成
+            if os.path.exists(manifest_path(root)):
+                return load_manifest(root)
+            # 清单无法保存（目录只读）时缓存生成结果，不再逐请求重新计算
+            manifest = _manifest_cache.get((root, None))
+            if manifest is not None:
+                return manifest
+            manifest = build_manifest(root)
+            try:
+                write_manifest(root, manifest)
+            except OSError:
+                _manifest_cache.set((root, None), manifest)
+            return manifest
+        finally:
+            with _build_locks_guard:
+                _build_locks.pop(root, None)
@@ -0,0 +1,59 @@
+"""
+键集（游标）分页
+
+OFFSET 分页翻到越后面越慢（数据库要先数过前面所有行），翻页期间有原型被更新时还会
+出现重复或遗漏。游标模式下按排序列 + 主键排列，游标记录上一页最后一行的这些列的值，
+下一页直接从复合索引中该位置之后开始读取：
+    WHERE (updated_at, id) < (:updated_at, :id) ORDER BY updated_at DESC, id DESC LIMIT :n
+
+游标对客户端不透明（base64url 编码的 JSON），排序列不同的游标不能混用。
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, tuple_
+
+
+class InvalidCursor(ValueError):
+    """游标无法解析"""
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> list:
+    """按排序列的类型还原游标中的值"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise InvalidCursor("无效的分页游标")
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else column.type.python_type(value)
+            for column, value in zip(columns, values)
+        ]
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, TypeError, ValueError):
+        raise InvalidCursor("无效的分页游标")
+
+
+def keyset_page(
+    query, columns: Sequence, cursor: Optional[str], limit: int, descending: bool = True
+) -> Tuple[List, Optional[str]]:
+    """
+    按 columns 排序取一页（最后一列须为主键以保证顺序唯一），cursor 为空时从第一页开始
+    返回 (本页记录, 下一页游标)，没有下一页时游标为 None
+    """
+    if cursor:
+        key, values = tuple_(*columns), tuple_(*decode_cursor(cursor, columns))
+        query = query.filter(key < values if descending else key > values)
+    rows = query.order_by(*[column.desc() if descending else column.asc() for column in columns]).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor([getattr(last, column.key) for column in columns])
@@ -0,0 +1,139 @@
+"""
+预压缩副本
+
+Axure 导出以体积较大、压缩率很高的 .js / .css / .html 为主。解压完成后为超过阈值的
+文本资源生成 gzip 副本（安装 brotli 时另生成 br 副本），保存在 .axhost/<编码>/ 下，
+请求时按 Accept-Encoding 直接返回预压缩字节，不做实时压缩。
+
+文件按块流式压缩，不整个读入内存；项目中的文件分发到与解压相同大小的线程池
+（EXTRACT_WORKERS），zlib 和 brotli 压缩时会释放 GIL。
+"""
+
+import dataclasses
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.services.manifest import META_DIRNAME, Manifest
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".html", ".htm", ".js", ".mjs", ".css", ".json", ".map",
+    ".svg", ".xml", ".txt", ".csv", ".ttf", ".otf", ".eot",
+}
+
+# 编码名 -> 副本扩展名
+SIDECAR_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# 压缩后至少节省 5% 才保留副本
+MIN_SAVING_RATIO = 0.95
+
+# 流式压缩每次读取的字节数
+CHUNK_SIZE = 1024 * 1024
+
+
+def available_encodings():
+    """当前环境可生成的编码，按优先级排列"""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def sidecar_path(root: str, path: str, encoding: str) -> str:
+    return os.path.join(root, META_DIRNAME, encoding, path + SIDECAR_SUFFIXES[encoding])
+
+
+def is_compressible(path: str, size: int) -> bool:
+    if size < settings.PRECOMPRESS_MIN_SIZE:
+        return False
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def compress_file(source_path: str, target: str, encoding: str) -> int:
+    """流式压缩文件写入 target，返回压缩后大小"""
+    with open(source_path, "rb") as source, open(target, "wb") as out:
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=9)
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                out.write(compressor.process(chunk))
+            out.write(compressor.finish())
+        else:
+            with gzip.GzipFile(filename="", mode="wb", compresslevel=9, fileobj=out, mtime=0) as gz:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    gz.write(chunk)
+        return out.tell()
+
+
+def precompress_file(root: str, path: str, size: int) -> Dict[str, int]:
+    """为项目目录中的单个文件生成预压缩副本，返回 编码名 -> 副本大小"""
+    encodings = {}
+    for encoding in available_encodings():
+        target = sidecar_path(root, path, encoding)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        compressed_size = compress_file(os.path.join(root, path), target, encoding)
+        if compressed_size >= size * MIN_SAVING_RATIO:
+            os.remove(target)
+            continue
+        encodings[encoding] = compressed_size
+    return encodings
+
+
+def precompress_project(root: str, manifest: Manifest, workers: int = 1) -> Manifest:
+    """为清单中所有可压缩文件生成副本，返回带编码信息的新清单；workers > 1 时并行压缩"""
+    pending = [(path, entry) for path, entry in manifest.files.items() if is_compressible(path, entry.size)]
+
+    def compress(item):
+        path, entry = item
+        return path, precompress_file(root, path, entry.size)
+
+    if workers > 1 and len(pending) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="precompress") as pool:
+            results = dict(pool.map(compress, pending))
+    else:
+        results = dict(map(compress, pending))
+
+    files = {}
+    for path, entry in manifest.files.items():
+        if results.get(path):
+            entry = dataclasses.replace(entry, encodings=results[path])
+        files[path] = entry
+    return Manifest(files, manifest.entry_file)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """解析 Accept-Encoding，返回 编码名 -> q 值"""
+    accepted = {}
+    for part in header.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: Optional[str], encodings: Dict[str, int]) -> Optional[str]:
+    """从已生成的副本中选择客户端可接受的编码，优先 br；无可用编码返回 None"""
+    if not accept_encoding or not encodings:
+        return None
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in ("br", "gzip"):
+        if encoding not in encodings:
+            continue
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
@@ -0,0 +1,131 @@
+"""
+原型存储用量与配额
+
+每个原型当前版本的文件数和占用空间记录在 projects 表中（file_count / storage_bytes），
+发布新版本时由文件清单直接算出，不需要遍历上传目录。占用空间按实际保存的内容计算：
+解压存储为文件和预压缩副本的大小，ZIP 存储模式为压缩包中成员的压缩数据大小。
+保留用于回滚的旧版本不计入。
+
+配额（0 表示不限制）：
+- PROJECT_QUOTA_BYTES：单个原型当前版本的大小
+- USER_QUOTA_BYTES：作者名下全部原型的总大小
+上传时先按中央目录（或分片上传声明的大小）估算，超出配额时在解压前拒绝；
+版本组装完成后按实际用量再检查一次，超出时丢弃该版本，当前版本保持不变。
+
+升级前上传的原型没有用量记录（storage_bytes 为 NULL），由管理员触发的后台任务逐个从清单补齐；
+没有清单的旧原型需要遍历目录、计算 SHA-256 生成清单，耗时较长，不在请求中执行。
+"""
+
+import logging
+import threading
+from typing import Callable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.models import Project
+from app.services.manifest import Manifest
+from app.services.services import ProjectService
+
+logger = logging.getLogger(__name__)
+
+# 后台线程使用的数据库会话工厂（测试中替换为测试数据库）
+session_factory = SessionLocal
+
+_backfill_lock = threading.Lock()
+
+
+class QuotaExceeded(ValueError):
+    """超出存储配额"""
+
+
+def manifest_usage(manifest: Optional[Manifest]) -> Tuple[int, int]:
+    """(文件数, 占用字节数)"""
+    if manifest is None:
+        return 0, 0
+    total = 0
+    for entry in manifest.files.values():
+        if entry.member is not None:
+            total += entry.member.compress_size
+        else:
+            total += entry.size + sum(entry.encodings.values())
+    return len(manifest.files), total
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def quota_allowance(db: Session, author_id: int, project_id: Optional[int] = None) -> Optional[int]:
+    """该原型一个版本最多可占用的字节数，不限制时返回 None
+
+    更新已有原型时其当前用量会被新版本替换，不计入作者已用空间。
+    """
+    limits = []
+    if settings.PROJECT_QUOTA_BYTES > 0:
+        limits.append(settings.PROJECT_QUOTA_BYTES)
+    if settings.USER_QUOTA_BYTES > 0:
+        used = ProjectService.author_usage(db, author_id, exclude_id=project_id)
+        limits.append(max(settings.USER_QUOTA_BYTES - used, 0))
+    return min(limits) if limits else None
+
+
+def check_quota(size: int, allowance: Optional[int]):
+    """size 超出 allowance 时抛出 QuotaExceeded"""
+    if allowance is not None and size > allowance:
+        raise QuotaExceeded(f"超出存储配额：需要 {format_size(size)}，可用 {format_size(allowance)}")
+
+
+def uncounted_projects(db: Session) -> int:
+    """尚未统计用量的原型数"""
+    return db.query(Project).filter(Project.storage_bytes.is_(None)).count()
+
+
+def backfill_running() -> bool:
+    return _backfill_lock.locked()
+
+
+def backfill_usage(load: Callable[[str], Optional[Manifest]], batch_size: int = 50) -> Optional[int]:
+    """逐个补齐尚未统计用量的原型，每个原型单独提交；返回补齐的数量，已有补齐任务在执行时返回 None"""
+    if not _backfill_lock.acquire(blocking=False):
+        return None
+    done = 0
+    failed = set()
+    db = session_factory()
+    try:
+        while True:
+            query = db.query(Project).filter(Project.storage_bytes.is_(None))
+            if failed:
+                query = query.filter(Project.id.notin_(failed))
+            projects = query.order_by(Project.id).limit(batch_size).all()
+            if not projects:
+                break
+            for project in projects:
+                try:
+                    ProjectService.record_usage(db, project, *manifest_usage(load(project.object_id)))
+                except Exception:
+                    db.rollback()
+                    logger.exception("统计原型用量失败: %s", project.object_id)
+                    failed.add(project.id)
+                    continue
+                done += 1
+    finally:
+        db.close()
+        _backfill_lock.release()
+    logger.info("存储用量补齐完成: %d 个原型，失败 %d 个", done, len(failed))
+    return done
+
+
+def schedule_backfill(load: Callable[[str], Optional[Manifest]]):
+    """在后台线程中补齐用量"""
+    def run():
+        try:
+            backfill_usage(load)
+        except Exception:
+            logger.exception("存储用量补齐失败")
+
+    threading.Thread(target=run, name="usage-backfill", daemon=True).start()
@@ -0,0 +1,100 @@
+"""
+文本搜索（项目名称 / 备注、用户姓名 / 工号、标签名称）
+
+PostgreSQL 使用 pg_trgm 扩展（索引见 scripts/init.sql）：
+- 子串匹配仍为 ILIKE '%关键词%'，由 gin_trgm_ops 索引加速，不再顺序扫描
+- 模糊匹配使用 <% 运算符（关键词与名称中某一片段的 word_similarity() 不低于
+  pg_trgm.word_similarity_threshold，默认 0.6），容忍拼写错误，使用同一索引
+- 排序时包含关键词的结果在前，其余按 word_similarity() 降序
+SQLite（测试、本地开发）在建立连接时注册 Python 实现的 word_similarity()，与 pg_trgm 的算法一致，不使用索引。
+其他数据库或 SEARCH_TRIGRAM=false 时只做子串匹配。
+"""
+
+import sqlite3
+from typing import List, Optional, Sequence, Set
+
+from sqlalchemy import case, event, func, literal, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+# 与 pg_trgm.word_similarity_threshold 的默认值相同
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+
+def trigram_list(text: Optional[str]) -> List[str]:
+    """按 pg_trgm 的规则按顺序提取三元组：转小写，按非字母数字字符分词，每个词前补两个空格、后补一个空格"""
+    result = []
+    word = []
+    for char in (text or "").lower() + " ":
+        if char.isalnum():
+            word.append(char)
+            continue
+        if word:
+            padded = "  " + "".join(word) + " "
+            result.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+            word = []
+    return result
+
+
+def trigrams(text: Optional[str]) -> Set[str]:
+    return set(trigram_list(text))
+
+
+def word_similarity(a: Optional[str], b: Optional[str]) -> float:
+    """a 的三元组与 b 中任一连续片段的三元组的最大相似度（pg_trgm word_similarity()），适合在较长的名称中查找一个词"""
+    query, target = trigrams(a), trigram_list(b)
+    best = 0.0
+    for start, first in enumerate(target):
+        # 以不共有的三元组开头的片段不会更相似
+        if first not in query:
+            continue
+        seen, common = set(), 0
+        for trigram in target[start:]:
+            if trigram not in seen:
+                seen.add(trigram)
+                common += trigram in query
+                best = max(best, common / (len(query) + len(seen) - common))
+    return best
+
+
+@event.listens_for(Engine, "connect")
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("word_similarity", 2, word_similarity, deterministic=True)
+
+
+def fuzzy_dialect(db: Session) -> Optional[str]:
+    """支持相似度匹配的数据库方言，不支持时返回 None"""
+    name = db.get_bind().dialect.name
+    if name == "sqlite" or (name == "postgresql" and settings.SEARCH_TRIGRAM):
+        return name
+    return None
+
+
+def like_pattern(keyword: str) -> str:
+    escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_filter(db: Session, columns: Sequence, keyword: str):
+    """任一列包含关键词（不区分大小写）或与关键词相似"""
+    pattern = like_pattern(keyword)
+    clauses = [column.ilike(pattern, escape="\\") for column in columns]
+    dialect = fuzzy_dialect(db)
+    if dialect == "postgresql":
+        # keyword <% column 即 word_similarity(keyword, column) 不低于阈值，可使用三元组索引
+        clauses += [literal(keyword).op("<%")(column) for column in columns]
+    elif dialect == "sqlite":
+        clauses += [func.word_similarity(keyword, column) >= WORD_SIMILARITY_THRESHOLD for column in columns]
+    return or_(*clauses)
+
+
+def search_ordering(db: Session, columns: Sequence, keyword: str) -> List:
+    """相关度排序：按列的先后，包含关键词的在前，再按相似度降序"""
+    pattern = like_pattern(keyword)
+    ordering = [case((column.ilike(pattern, escape="\\"), 1), else_=0).desc() for column in columns]
+    if fuzzy_dialect(db):
+        ordering += [func.word_similarity(keyword, func.coalesce(column, "")).desc() for column in columns]
+    return ordering
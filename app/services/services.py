@@ -1,11 +1,14 @@
 import secrets
 import string
 from typing import Optional, List
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from app.models.models import User, Project, ProjectAccess, Tag, ProjectTag, UserCommonTag
 from app.schemas.schemas import UserCreate, UserUpdate, ProjectCreate, ProjectUpdate, TagCreate, TagUpdate
 from app.core.security import get_password_hash
+from app.services.search import search_filter, search_ordering
 
 TAG_ALLOWED_COLORS = {
     "#ffffff",
@@ -20,6 +23,12 @@ TAG_ALLOWED_COLORS = {
 }
 TAG_DEFAULT_COLOR = "#ffffff"
 
+# 支持 INSERT ... ON CONFLICT 的数据库方言
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
 def generate_object_id() -> str:
     """生成唯一的 object_id"""
     import uuid
@@ -115,6 +124,23 @@ class ProjectService:
     def get_by_object_id(db: Session, object_id: str) -> Optional[Project]:
         return db.query(Project).filter(Project.object_id == object_id).first()
     
+    @staticmethod
+    def with_details(query):
+        """
+        预加载序列化项目时用到的作者和标签，避免逐条懒加载（N+1）
+        作者随主查询 JOIN，标签整页一次 IN 查询，查询次数不随条数增长
+        """
+        return query.options(
+            joinedload(Project.author),
+            selectinload(Project.project_tags).joinedload(ProjectTag.tag),
+        )
+    
+    @staticmethod
+    def get_detail(db: Session, object_id: str) -> Optional[Project]:
+        """按 object_id 获取项目并预加载作者和标签（详情接口使用）"""
+        query = ProjectService.with_details(db.query(Project))
+        return query.filter(Project.object_id == object_id).first()
+    
     @staticmethod
     def create(db: Session, project_data: ProjectCreate, author_id: int) -> Project:
         db_project = Project(
@@ -166,35 +192,49 @@ class ProjectService:
             pass
         # 产品经理可以看公开的 + 自己的 + 被授权的
         elif user.role == "product_manager":
-            access_project_ids = db.query(ProjectAccess.project_id).filter(ProjectAccess.user_id == user.id).all()
-            access_ids = [p[0] for p in access_project_ids]
             query = query.filter(
                 or_(
                     Project.is_public == True,
                     Project.author_id == user.id,
-                    Project.id.in_(access_ids) if access_ids else False
+                    ProjectService.granted_to(user.id),
                 )
             )
         # 开发者只能看公开的 + 被授权的
         else:
-            access_project_ids = db.query(ProjectAccess.project_id).filter(ProjectAccess.user_id == user.id).all()
-            access_ids = [p[0] for p in access_project_ids]
             query = query.filter(
                 or_(
                     Project.is_public == True,
-                    Project.id.in_(access_ids) if access_ids else False
+                    ProjectService.granted_to(user.id),
                 )
             )
         
-        # 搜索
+        # 搜索（按相关度排序）
+        ordering = []
         if search:
-            query = query.filter(Project.name.ilike(f"%{search}%"))
+            columns = [Project.name, Project.remark]
+            query = query.filter(search_filter(db, columns, search))
+            ordering = search_ordering(db, columns, search)
         
         total = query.count()
-        projects = query.order_by(Project.updated_at.desc()).offset(skip).limit(limit).all()
+        projects = (
+            ProjectService.with_details(query)
+            .order_by(*ordering, Project.updated_at.desc(), Project.id.desc())
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
         
         return projects, total
     
+    @staticmethod
+    def granted_to(user_id: int):
+        """
+        项目已授权给该用户的过滤条件：在数据库内与 project_access 做半连接（非关联子查询，
+        由 (user_id, project_id) 唯一索引提供），不再把用户的全部授权记录取回 Python
+        后拼成 IN 参数列表（记录多了既慢又会超出数据库的参数个数上限）
+        """
+        return Project.id.in_(select(ProjectAccess.project_id).where(ProjectAccess.user_id == user_id))
+    
     @staticmethod
     def can_access(db: Session, project: Project, user: User) -> bool:
         """检查用户是否有权限访问项目"""
@@ -223,10 +263,36 @@ class ProjectService:
     
     @staticmethod
     def grant_access(db: Session, project_id: int, user_id: int):
-        """授权用户访问项目"""
-        access = ProjectAccess(project_id=project_id, user_id=user_id)
-        db.add(access)
-        db.commit()
+        """
+        授权用户访问项目：一条 INSERT ... ON CONFLICT DO UPDATE 完成，
+        已授权时只更新访问时间（依赖 (user_id, project_id) 唯一索引）
+        """
+        from datetime import datetime
+        now = datetime.utcnow()
+        insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+        if insert is not None:
+            stmt = insert(ProjectAccess).values(project_id=project_id, user_id=user_id, accessed_at=now)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ProjectAccess.user_id, ProjectAccess.project_id],
+                set_={"accessed_at": stmt.excluded.accessed_at},
+            )
+            db.execute(stmt)
+            db.commit()
+            return
+        
+        # 其他数据库：先更新，没有记录时再插入；并发插入冲突时改为更新
+        for _ in range(2):
+            updated = db.query(ProjectAccess).filter(
+                ProjectAccess.project_id == project_id,
+                ProjectAccess.user_id == user_id
+            ).update({ProjectAccess.accessed_at: now}, synchronize_session=False)
+            if not updated:
+                db.add(ProjectAccess(project_id=project_id, user_id=user_id, accessed_at=now))
+            try:
+                db.commit()
+                return
+            except IntegrityError:
+                db.rollback()
     
     @staticmethod
     def revoke_access(db: Session, project: Project):
@@ -251,6 +317,30 @@ class ProjectService:
         db.refresh(project)
         return project
 
+    @staticmethod
+    def record_usage(db: Session, project: Project, file_count: int, storage_bytes: int):
+        """记录当前版本的文件数和占用空间，不改变项目更新时间"""
+        db.query(Project).filter(Project.id == project.id).update(
+            {
+                Project.file_count: file_count,
+                Project.storage_bytes: storage_bytes,
+                Project.updated_at: Project.updated_at,
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        db.refresh(project)
+        return project
+
+    @staticmethod
+    def author_usage(db: Session, author_id: int, exclude_id: Optional[int] = None) -> int:
+        """用户名下原型的总占用空间（字节）；exclude_id 为即将被新版本替换用量的原型"""
+        from sqlalchemy import func
+        query = db.query(func.coalesce(func.sum(Project.storage_bytes), 0)).filter(Project.author_id == author_id)
+        if exclude_id is not None:
+            query = query.filter(Project.id != exclude_id)
+        return int(query.scalar())
+
     @staticmethod
     def get_tags(project: Project) -> List[Tag]:
         return [item.tag for item in project.project_tags if item.tag]
@@ -260,9 +350,11 @@ class TagService:
     @staticmethod
     def list_all(db: Session, search: str = ""):
         query = db.query(Tag)
+        ordering = []
         if search:
-            query = query.filter(Tag.name.ilike(f"%{search}%"))
-        return query.order_by(Tag.created_at.desc()).all()
+            query = query.filter(search_filter(db, [Tag.name], search))
+            ordering = search_ordering(db, [Tag.name], search)
+        return query.order_by(*ordering, Tag.created_at.desc()).all()
 
     @staticmethod
     def get_by_name(db: Session, name: str) -> Optional[Tag]:
@@ -342,7 +434,13 @@ class TagService:
 
     @staticmethod
     def list_common_tags(db: Session, user_id: int) -> List[Tag]:
-        rows = db.query(UserCommonTag).filter(UserCommonTag.user_id == user_id).order_by(UserCommonTag.created_at.asc()).all()
+        rows = (
+            db.query(UserCommonTag)
+            .options(joinedload(UserCommonTag.tag))
+            .filter(UserCommonTag.user_id == user_id)
+            .order_by(UserCommonTag.created_at.asc())
+            .all()
+        )
         return [row.tag for row in rows if row.tag]
 
     @staticmethod
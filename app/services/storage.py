@@ -0,0 +1,430 @@
+"""
+原型内容存储后端
+
+默认（STORAGE_BACKEND=local）原型发布在本机上传目录的版本目录中，由 versions 模块管理。
+配置其他后端后，上传目录只作为解压的暂存区：版本在本机组装完成后整体上传到后端，
+再更新当前版本指针，所有 web 节点都从后端读取清单和文件内容，节点本身不保存状态。
+
+- fs：StorageBackend 的本地文件系统实现，根目录为 STORAGE_FS_ROOT（如多个节点共享的挂载点）
+- s3：S3 兼容对象存储（AWS S3、MinIO 等），需要安装 boto3
+
+后端中的布局：
+- <object_id>/current：当前版本号
+- <object_id>/<版本号>/...：该版本的文件、预压缩副本、压缩包和 .axhost/manifest.json
+- <object_id>/<版本号>/.axhost/claim：版本号占位对象，以独占创建认领版本号，多个节点同时发布时不会写入同一版本
+"""
+
+import json
+import logging
+import os
+import posixpath
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from abc import ABC, abstractmethod
+from typing import Callable, Iterator, List, NamedTuple, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.manifest import META_DIRNAME, MANIFEST_FILENAME, Manifest, ManifestEntry
+from app.services.precompress import SIDECAR_SUFFIXES
+
+try:
+    import boto3
+except ImportError:  # 可选依赖
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+CURRENT_KEY = "current"
+MANIFEST_KEY = f"{META_DIRNAME}/{MANIFEST_FILENAME}"
+CLAIM_KEY = f"{META_DIRNAME}/claim"
+# S3 条件写入失败：对象已存在（412）或有并发的条件写入（409）
+S3_CONFLICT_CODES = ("PreconditionFailed", "412", "ConditionalRequestConflict", "409")
+CHUNK_SIZE = 256 * 1024
+
+
+class ObjectInfo(NamedTuple):
+    size: int
+    mtime: float
+
+
+class StorageBackend(ABC):
+    """对象存储接口：键为 / 分隔的相对路径，对象写入后不再修改"""
+
+    @abstractmethod
+    def put_file(self, key: str, path: str):
+        """从本地文件流式上传"""
+
+    @abstractmethod
+    def put_bytes(self, key: str, data: bytes):
+        """写入整个对象（覆盖已有对象）"""
+
+    @abstractmethod
+    def put_bytes_if_absent(self, key: str, data: bytes) -> bool:
+        """对象不存在时写入（原子的独占创建），已存在时返回 False"""
+
+    @abstractmethod
+    def get_bytes(self, key: str) -> bytes:
+        """读取整个对象，不存在时抛出 FileNotFoundError"""
+
+    @abstractmethod
+    def iter_range(self, key: str, start: int, length: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """流式读取对象中的一段"""
+
+    @abstractmethod
+    def stat(self, key: str) -> ObjectInfo:
+        """对象大小和修改时间，不存在时抛出 FileNotFoundError"""
+
+    @abstractmethod
+    def list(self, prefix: str) -> List[str]:
+        """“目录” prefix 下的全部键"""
+
+    @abstractmethod
+    def list_dirs(self, prefix: str) -> List[str]:
+        """前缀下一级的“目录”名"""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> int:
+        """删除“目录” prefix 下的全部对象，返回删除数量"""
+
+    def read_manifest(self, prefix: str) -> Optional[Manifest]:
+        """读取版本的文件清单；版本不可变，解析结果按前缀缓存"""
+        manifest = _manifest_cache.get((id(self), prefix))
+        if manifest is None:
+            try:
+                data = self.get_bytes(f"{prefix}/{MANIFEST_KEY}")
+            except FileNotFoundError:
+                return None
+            manifest = Manifest.from_dict(json.loads(data))
+            _manifest_cache.set((id(self), prefix), manifest)
+        return manifest
+
+    def write_manifest(self, prefix: str, manifest: Manifest):
+        data = json.dumps(manifest.to_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.put_bytes(f"{prefix}/{MANIFEST_KEY}", data)
+
+
+_manifest_cache = TTLCache(maxsize=settings.MANIFEST_CACHE_SIZE, ttl=3600)
+
+
+class LocalStorage(StorageBackend):
+    """本地文件系统实现：对象保存为根目录下的文件，写入时先写临时文件再 rename"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        normalized = posixpath.normpath(key)
+        if normalized.startswith("../") or normalized.startswith("/") or normalized == "..":
+            raise ValueError(f"无效的键: {key}")
+        return os.path.join(self.root, normalized)
+
+    def _write(self, key: str, write: Callable):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def put_file(self, key: str, path: str):
+        def write(f):
+            with open(path, "rb") as source:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        self._write(key, write)
+
+    def put_bytes(self, key: str, data: bytes):
+        self._write(key, lambda f: f.write(data))
+
+    def put_bytes_if_absent(self, key: str, data: bytes) -> bool:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return True
+
+    def get_bytes(self, key: str) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def iter_range(self, key: str, start: int, length: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        with open(self.path(key), "rb") as f:
+            offset, end = start, start + length
+            while offset < end:
+                chunk = os.pread(f.fileno(), min(chunk_size, end - offset), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                yield chunk
+
+    def stat(self, key: str) -> ObjectInfo:
+        st = os.stat(self.path(key))
+        return ObjectInfo(st.st_size, st.st_mtime)
+
+    def list(self, prefix: str) -> List[str]:
+        base = self.path(prefix)
+        keys = []
+        for current, _, filenames in os.walk(base):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                relative = os.path.relpath(os.path.join(current, filename), self.root)
+                keys.append(relative.replace(os.sep, "/"))
+        return sorted(keys)
+
+    def list_dirs(self, prefix: str) -> List[str]:
+        base = self.path(prefix)
+        try:
+            names = os.listdir(base)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if os.path.isdir(os.path.join(base, name)))
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = self.list(prefix)
+        shutil.rmtree(self.path(prefix), ignore_errors=True)
+        return len(keys)
+
+
+class S3Storage(StorageBackend):
+    """S3 兼容对象存储实现（AWS S3、MinIO 等）"""
+
+    def __init__(self, bucket: str, prefix: str = "", client=None):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("使用 S3 存储需要安装 boto3")
+            client = boto3.client(
+                "s3",
+                endpoint_url=settings.S3_ENDPOINT_URL or None,
+                region_name=settings.S3_REGION or None,
+                aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+                aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    def key(self, key: str) -> str:
+        return self.prefix + key
+
+    @staticmethod
+    def _error_code(error: Exception) -> Optional[str]:
+        return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+    @classmethod
+    def _not_found(cls, error: Exception) -> bool:
+        return cls._error_code(error) in ("NoSuchKey", "404", "NotFound")
+
+    def put_file(self, key: str, path: str):
+        # upload_file 按文件大小自动分段上传，不把整个文件读入内存
+        self.client.upload_file(path, self.bucket, self.key(key))
+
+    def put_bytes(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self.key(key), Body=data)
+
+    def put_bytes_if_absent(self, key: str, data: bytes) -> bool:
+        # 条件写入（If-None-Match: *），需要服务端支持（AWS S3 2024-08 起、MinIO 等）
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=self.key(key), Body=data, IfNoneMatch="*")
+        except Exception as e:
+            if self._error_code(e) in S3_CONFLICT_CODES:
+                return False
+            raise
+        return True
+
+    def _get(self, key: str, **kwargs):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.key(key), **kwargs)
+        except Exception as e:
+            if self._not_found(e):
+                raise FileNotFoundError(key)
+            raise
+
+    def get_bytes(self, key: str) -> bytes:
+        return self._get(key)["Body"].read()
+
+    def iter_range(self, key: str, start: int, length: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        if length <= 0:
+            return
+        body = self._get(key, Range=f"bytes={start}-{start + length - 1}")["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def stat(self, key: str) -> ObjectInfo:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.key(key))
+        except Exception as e:
+            if self._not_found(e):
+                raise FileNotFoundError(key)
+            raise
+        return ObjectInfo(head["ContentLength"], head["LastModified"].timestamp())
+
+    def _pages(self, prefix: str, **kwargs):
+        paginator = self.client.get_paginator("list_objects_v2")
+        return paginator.paginate(Bucket=self.bucket, Prefix=self.key(prefix), **kwargs)
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        for page in self._pages(prefix.rstrip("/") + "/"):
+            keys.extend(item["Key"][len(self.prefix):] for item in page.get("Contents", []))
+        return sorted(keys)
+
+    def list_dirs(self, prefix: str) -> List[str]:
+        base = self.key(prefix.rstrip("/") + "/")
+        names = []
+        for page in self._pages(prefix.rstrip("/") + "/", Delimiter="/"):
+            names.extend(item["Prefix"][len(base):].rstrip("/") for item in page.get("CommonPrefixes", []))
+        return sorted(names)
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = self.list(prefix)
+        # DeleteObjects 每次最多 1000 个键
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": self.key(key)} for key in batch], "Quiet": True},
+            )
+        return len(keys)
+
+
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def create_backend() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "fs":
+        if not settings.STORAGE_FS_ROOT:
+            raise RuntimeError("STORAGE_BACKEND=fs 需要配置 STORAGE_FS_ROOT")
+        return LocalStorage(settings.STORAGE_FS_ROOT)
+    if settings.STORAGE_BACKEND == "s3":
+        if not settings.S3_BUCKET:
+            raise RuntimeError("STORAGE_BACKEND=s3 需要配置 S3_BUCKET")
+        return S3Storage(settings.S3_BUCKET, settings.S3_PREFIX)
+    raise RuntimeError(f"未知的存储后端: {settings.STORAGE_BACKEND}")
+
+
+def get_backend() -> Optional[StorageBackend]:
+    """配置的存储后端；使用本机上传目录（local）时返回 None"""
+    global _backend
+    if settings.STORAGE_BACKEND == "local":
+        return None
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
+
+
+def version_prefix(object_id: str, version: int) -> str:
+    return f"{object_id}/{version}"
+
+
+def sidecar_key(path: str, encoding: str) -> str:
+    return f"{META_DIRNAME}/{encoding}/{path}{SIDECAR_SUFFIXES[encoding]}"
+
+
+def remote_versions(backend: StorageBackend, object_id: str) -> List[int]:
+    return sorted(int(name) for name in backend.list_dirs(object_id) if name.isdigit())
+
+
+def remote_current(backend: StorageBackend, object_id: str) -> Optional[int]:
+    try:
+        return json.loads(backend.get_bytes(f"{object_id}/{CURRENT_KEY}"))["version"]
+    except FileNotFoundError:
+        return None
+
+
+def set_remote_current(backend: StorageBackend, object_id: str, version: int):
+    """切换当前版本：版本内容全部上传完成后才写入指针，读取方不会看到不完整的版本"""
+    backend.put_bytes(f"{object_id}/{CURRENT_KEY}", json.dumps({"version": version}).encode())
+
+
+def upload_version(backend: StorageBackend, object_id: str, version_dir: str, manifest: Manifest) -> int:
+    """把本机组装好的版本上传到后端，清单最后上传；返回后端中的版本号"""
+    existing = remote_versions(backend, object_id)
+    version = existing[-1] + 1 if existing else 1
+    # 其他节点可能同时发布：独占创建占位对象认领版本号，已被占用时顺延
+    while not backend.put_bytes_if_absent(f"{version_prefix(object_id, version)}/{CLAIM_KEY}", b""):
+        version += 1
+    prefix = version_prefix(object_id, version)
+    if manifest.archive:
+        backend.put_file(f"{prefix}/{manifest.archive}", os.path.join(version_dir, manifest.archive))
+    for path, entry in manifest.files.items():
+        if entry.member is not None:
+            continue
+        backend.put_file(f"{prefix}/{path}", os.path.join(version_dir, path))
+        for encoding in entry.encodings:
+            key = sidecar_key(path, encoding)
+            backend.put_file(f"{prefix}/{key}", os.path.join(version_dir, key))
+    backend.write_manifest(prefix, manifest)
+    return version
+
+
+def download_entry(
+    backend: StorageBackend, prefix: str, manifest: Manifest, path: str, entry: ManifestEntry, target: str
+):
+    """把后端版本中的一个文件下载到本地（增量同步复用未变化的文件）"""
+    from app.services.delivery import inflate_chunks
+
+    if entry.member is None:
+        chunks = backend.iter_range(f"{prefix}/{path}", 0, entry.size)
+    else:
+        member = entry.member
+        chunks = backend.iter_range(f"{prefix}/{manifest.archive}", member.offset, member.compress_size)
+        if member.compress_type != zipfile.ZIP_STORED:
+            chunks = inflate_chunks(chunks)
+    with open(target, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def reap_remote_versions(backend: StorageBackend, object_id: str, keep: int) -> List[int]:
+    """删除比当前版本更早、超出保留数量的版本"""
+    current = remote_current(backend, object_id)
+    if current is None:
+        return []
+    older = [version for version in remote_versions(backend, object_id) if version < current]
+    expired = older[:-keep] if keep > 0 else older
+    for version in expired:
+        backend.delete_prefix(version_prefix(object_id, version))
+    return expired
+
+
+def schedule_remote_reap(backend: StorageBackend, object_id: str, keep: int, delay: float):
+    """延迟 delay 秒后在后台清理旧版本，其他节点缓存的元数据在此期间仍可读取旧版本"""
+    def reap():
+        try:
+            reap_remote_versions(backend, object_id, keep)
+        except Exception:
+            logger.exception("清理旧版本失败: %s", object_id)
+
+    timer = threading.Timer(delay, reap)
+    timer.daemon = True
+    timer.start()
+
+
+def schedule_remote_delete(backend: StorageBackend, object_id: str):
+    """在后台删除原型的全部对象"""
+    def delete():
+        started = time.monotonic()
+        try:
+            count = backend.delete_prefix(object_id)
+        except Exception:
+            logger.exception("删除原型存储失败: %s", object_id)
+            return
+        logger.info("已删除原型 %s 的 %d 个对象，用时 %.1fs", object_id, count, time.monotonic() - started)
+
+    threading.Thread(target=delete, name=f"delete-{object_id}", daemon=True).start()
@@ -0,0 +1,228 @@
+"""
+增量同步
+
+客户端提交整个原型的清单（相对路径 -> SHA-256），服务端对照当前版本的文件清单，
+只要求上传内容哈希不存在于当前版本中的文件；提交时在新版本目录中组装完整的原型：
+新上传的文件直接移入，未变化的文件从当前版本硬链接（不支持硬链接时复制，
+ZIP 存储模式下从压缩包解出），然后按版本目录原子发布。
+
+同步会话与分片上传会话共用 .uploads/<会话 ID>/ 目录和过期清理：
+- sync.json：会话信息（用户、原型、完整清单）
+- blobs/<SHA-256>：已上传并校验过的文件内容，同一内容只需上传一次
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from typing import Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.archive import open_archive_map
+from app.services.delivery import iter_archive_slice, iter_inflated_member
+from app.services.manifest import (
+    IGNORED_ROOT_ENTRIES, Manifest, ManifestEntry, guess_content_type, normalize_path, write_manifest,
+)
+from app.services.precompress import is_compressible, precompress_file, sidecar_path
+from app.services.uploads import UploadSessionError, session_dir
+
+SYNC_FILENAME = "sync.json"
+BLOBS_DIRNAME = "blobs"
+ENTRY_FILES = ("index.html", "start.html")
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class SyncError(UploadSessionError):
+    pass
+
+
+def is_sha256(value: str) -> bool:
+    return len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+def normalize_files(files: Dict[str, str]) -> Dict[str, str]:
+    """校验客户端提交的清单，返回 规范化路径 -> 小写 SHA-256"""
+    normalized = {}
+    for path, sha256 in files.items():
+        key = normalize_path(path)
+        if key is None or key.split("/", 1)[0] in IGNORED_ROOT_ENTRIES:
+            raise SyncError(f"无效的文件路径: {path}")
+        sha256 = sha256.lower()
+        if not is_sha256(sha256):
+            raise SyncError(f"无效的 SHA-256: {path}")
+        normalized[key] = sha256
+    if not all(name in normalized for name in ENTRY_FILES):
+        raise SyncError("上传的清单中未找到入口文件")
+    return normalized
+
+
+def blobs_dir(upload_dir: str, sync_id: str) -> str:
+    return os.path.join(session_dir(upload_dir, sync_id), BLOBS_DIRNAME)
+
+
+def blob_path(upload_dir: str, sync_id: str, sha256: str) -> str:
+    return os.path.join(blobs_dir(upload_dir, sync_id), sha256)
+
+
+def create_sync(upload_dir: str, user_id: int, object_id: str, files: Dict[str, str]) -> dict:
+    sync = {
+        "id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "object_id": object_id,
+        "files": files,
+        "created_at": time.time(),
+    }
+    directory = session_dir(upload_dir, sync["id"])
+    os.makedirs(os.path.join(directory, BLOBS_DIRNAME))
+    with open(os.path.join(directory, SYNC_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(sync, f, ensure_ascii=False)
+    return sync
+
+
+def load_sync(upload_dir: str, sync_id: str) -> Optional[dict]:
+    # 会话 ID 为 uuid4 hex，拒绝其他形式避免路径穿越
+    if len(sync_id) != 32 or not all(c in "0123456789abcdef" for c in sync_id):
+        return None
+    try:
+        with open(os.path.join(session_dir(upload_dir, sync_id), SYNC_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def content_index(manifest: Optional[Manifest]) -> Dict[str, str]:
+    """SHA-256 -> 当前版本中该内容的一个路径"""
+    if manifest is None:
+        return {}
+    return {entry.sha256: path for path, entry in manifest.files.items()}
+
+
+def missing_paths(upload_dir: str, sync: dict, manifest: Optional[Manifest]) -> List[str]:
+    """内容既未上传、当前版本中也不存在的路径"""
+    available = content_index(manifest)
+    missing = []
+    for path, sha256 in sorted(sync["files"].items()):
+        if sha256 in available or os.path.exists(blob_path(upload_dir, sync["id"], sha256)):
+            continue
+        missing.append(path)
+    return missing
+
+
+class BlobWriter:
+    """接收清单中某个路径的文件内容：写入临时文件并计算 SHA-256，commit 时与清单比对"""
+
+    def __init__(self, upload_dir: str, sync: dict, path: str):
+        key = normalize_path(path)
+        if key is None or key not in sync["files"]:
+            raise SyncError(f"清单中没有该文件: {path}")
+        self.expected = sync["files"][key]
+        self.target = blob_path(upload_dir, sync["id"], self.expected)
+        self.tmp_path = f"{self.target}.{uuid.uuid4().hex}.tmp"
+        self.file = open(self.tmp_path, "wb")
+        self.digest = hashlib.sha256()
+
+    def write(self, data: bytes):
+        self.file.write(data)
+        self.digest.update(data)
+
+    def commit(self):
+        self.file.close()
+        if self.digest.hexdigest() != self.expected:
+            os.remove(self.tmp_path)
+            raise SyncError("文件内容与清单中的 SHA-256 不一致")
+        os.replace(self.tmp_path, self.target)
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def link_or_copy(source: str, target: str):
+    """硬链接复用文件（各版本的文件写入后不再修改），跨文件系统等不支持时复制"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def copy_archive_member(root: str, manifest: Manifest, entry: ManifestEntry, target: str):
+    """ZIP 存储模式的当前版本：从压缩包中解出成员"""
+    archive_map = open_archive_map(root, manifest)
+    member = entry.member
+    if member.compress_type == zipfile.ZIP_STORED:
+        chunks = iter_archive_slice(archive_map, member.offset, member.compress_size, COPY_CHUNK_SIZE)
+    else:
+        chunks = iter_inflated_member(archive_map, entry, COPY_CHUNK_SIZE)
+    with open(target, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def build_version(
+    upload_dir: str,
+    sync: dict,
+    base_root: Optional[str],
+    base_manifest: Optional[Manifest],
+    version_dir: str,
+    fetch: Optional[Callable[[str, ManifestEntry, str], None]] = None,
+) -> Manifest:
+    """在 version_dir 中组装同步后的完整原型并写入清单
+
+    复用的文件连同预压缩副本一起硬链接，清单条目沿用当前版本的，不重新计算哈希和压缩；
+    只有新上传的文件需要生成预压缩副本。当前版本保存在存储后端（base_root 为 None）时，
+    复用的文件通过 fetch(路径, 清单条目, 目标文件) 从后端下载。
+    """
+    available = content_index(base_manifest)
+    files: Dict[str, ManifestEntry] = {}
+    for path, sha256 in sync["files"].items():
+        target = os.path.join(version_dir, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        blob = blob_path(upload_dir, sync["id"], sha256)
+        if os.path.exists(blob):
+            link_or_copy(blob, target)
+            entry = new_entry(version_dir, path, sha256)
+        elif sha256 in available:
+            source_path = available[sha256]
+            entry = base_manifest.files[source_path]
+            if base_root is None:
+                fetch(source_path, entry, target)
+                entry = new_entry(version_dir, path, sha256)
+            elif entry.member is not None:
+                copy_archive_member(base_root, base_manifest, entry, target)
+                entry = new_entry(version_dir, path, sha256)
+            else:
+                link_or_copy(os.path.join(base_root, source_path), target)
+                for encoding in entry.encodings:
+                    sidecar = sidecar_path(version_dir, path, encoding)
+                    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+                    link_or_copy(sidecar_path(base_root, source_path, encoding), sidecar)
+                entry = dataclasses.replace(entry, content_type=guess_content_type(path))
+        else:
+            raise SyncError(f"文件尚未上传: {path}")
+        files[path] = entry
+
+    manifest = Manifest(files)
+    write_manifest(version_dir, manifest)
+    return manifest
+
+
+def new_entry(root: str, path: str, sha256: str) -> ManifestEntry:
+    """新写入的文件：按需生成预压缩副本"""
+    full_path = os.path.join(root, path)
+    st = os.stat(full_path)
+    encodings = {}
+    if settings.PRECOMPRESS_ENABLED and is_compressible(path, st.st_size):
+        encodings = precompress_file(root, path, st.st_size)
+    return ManifestEntry(
+        size=st.st_size,
+        mtime=st.st_mtime,
+        content_type=guess_content_type(path),
+        sha256=sha256,
+        encodings=encodings,
+    )
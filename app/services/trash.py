@@ -0,0 +1,336 @@
+"""
+后台删除与孤儿目录清理
+
+删除原型时只把版本目录 rename 到上传目录下的 .trash/（O(1)），由后台线程按
+STORAGE_REAP_RATE 限速逐个删除文件，删除请求不再等待遍历上万个文件。
+
+定期清理（STORAGE_REAP_INTERVAL）对照 projects 表检查上传目录中的孤儿目录：
+- 没有对应原型记录的项目目录和版本目录（上传失败、手工删库等残留）
+- 旧版本解压残留的 _temp_extract 目录
+- 发布版本时遗留的临时符号链接
+连接到空库或错误的数据库时所有原型都会被当作孤儿，因此孤儿目录默认只写入清理报告，
+开启 STORAGE_REAP_ORPHANS 或由管理员确认后（POST /storage/reaper?orphans=true）才移入回收区；
+projects 表为空时跳过检查。.jobs/ 中没有对应未结束任务的上传暂存文件总是移入回收区。
+每次清理的结果写入 .trash/.report.json。多个 worker 进程通过文件锁保证同时只有一个在清理。
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Optional, Set
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.models import Project, UploadJob
+from app.services.blobs import blobs_root, release_blobs, tree_blobs
+from app.services.manifest import manifest_path
+
+logger = logging.getLogger(__name__)
+
+TRASH_DIRNAME = ".trash"
+LOCK_FILENAME = ".lock"
+REPORT_FILENAME = ".report.json"
+TEMP_EXTRACT_DIRNAME = "_temp_extract"
+# 比这更新的目录可能属于正在创建的原型，不视为孤儿
+ORPHAN_MIN_AGE = 3600
+
+# 后台线程使用的数据库会话工厂（测试中替换为测试数据库）
+session_factory = SessionLocal
+
+_purge_lock = threading.Lock()
+
+
+def trash_root(upload_dir: str) -> str:
+    return os.path.join(upload_dir, TRASH_DIRNAME)
+
+
+def move_to_trash(upload_dir: str, path: str) -> Optional[str]:
+    """把目录移入回收区（同一文件系统内 rename），路径不存在时返回 None"""
+    root = trash_root(upload_dir)
+    os.makedirs(root, exist_ok=True)
+    target = os.path.join(root, f"{os.path.basename(path)}.{uuid.uuid4().hex}")
+    try:
+        os.rename(path, target)
+    except FileNotFoundError:
+        return None
+    return target
+
+
+def trash_items(upload_dir: str) -> List[str]:
+    try:
+        names = os.listdir(trash_root(upload_dir))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(trash_root(upload_dir), name) for name in sorted(names) if not name.startswith(".")]
+
+
+def item_blobs(path: str) -> Set[str]:
+    """回收区条目引用的去重存储文件：条目为版本目录的集合或单个项目目录"""
+    if os.path.exists(manifest_path(path)):
+        return tree_blobs(path)
+    hashes = set()
+    if os.path.isdir(path) and not os.path.islink(path):
+        for name in os.listdir(path):
+            child = os.path.join(path, name)
+            if os.path.exists(manifest_path(child)):
+                hashes |= tree_blobs(child)
+    return hashes
+
+
+class Throttle:
+    """限制每秒删除的文件数，避免清理大目录时占满磁盘 I/O"""
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.count = 0
+
+    def tick(self):
+        self.count += 1
+        if self.rate <= 0:
+            return
+        delay = self.count / self.rate - (time.monotonic() - self.started)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def remove_tree(path: str, throttle: Throttle) -> int:
+    """逐个删除文件后删除目录，返回释放的字节数"""
+    if os.path.islink(path) or not os.path.isdir(path):
+        size = os.lstat(path).st_size
+        os.unlink(path)
+        throttle.tick()
+        return size
+    freed = 0
+    for current, dirs, files in os.walk(path, topdown=False):
+        for name in files:
+            file_path = os.path.join(current, name)
+            st = os.lstat(file_path)
+            os.unlink(file_path)
+            # 还有其他硬链接的文件（去重存储、增量同步复用）并未真正释放空间
+            if st.st_nlink <= 1:
+                freed += st.st_size
+            throttle.tick()
+        for name in dirs:
+            dir_path = os.path.join(current, name)
+            if os.path.islink(dir_path):
+                os.unlink(dir_path)
+            else:
+                os.rmdir(dir_path)
+    os.rmdir(path)
+    return freed
+
+
+def purge_trash(upload_dir: str, rate: int = 0) -> dict:
+    """删除回收区中的全部条目并释放不再被引用的去重存储文件"""
+    report = {"items": 0, "bytes": 0, "blobs": 0}
+    throttle = Throttle(rate)
+    failed = set()
+    with _purge_lock:
+        while True:
+            items = [item for item in trash_items(upload_dir) if item not in failed]
+            if not items:
+                break
+            for item in items:
+                try:
+                    hashes = item_blobs(item) if os.path.isdir(blobs_root(upload_dir)) else set()
+                    report["bytes"] += remove_tree(item, throttle)
+                    report["blobs"] += release_blobs(upload_dir, hashes)
+                except FileNotFoundError:
+                    # 其他线程已删除
+                    continue
+                except OSError:
+                    logger.exception("删除回收区条目失败: %s", item)
+                    failed.add(item)
+                    continue
+                report["items"] += 1
+    report["files"] = throttle.count
+    return report
+
+
+@contextmanager
+def reaper_lock(upload_dir: str):
+    """跨进程的清理锁，已被其他进程持有时返回 False（该进程会继续清理新移入的条目）"""
+    os.makedirs(trash_root(upload_dir), exist_ok=True)
+    with open(os.path.join(trash_root(upload_dir), LOCK_FILENAME), "w") as lock:
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def schedule_purge(upload_dir: str):
+    """在后台线程中清空回收区"""
+    def purge():
+        try:
+            with reaper_lock(upload_dir) as acquired:
+                if acquired:
+                    purge_trash(upload_dir, settings.STORAGE_REAP_RATE)
+        except Exception:
+            logger.exception("清空回收区失败")
+
+    threading.Thread(target=purge, name="purge-trash", daemon=True).start()
+
+
+def find_orphans(upload_dir: str, object_ids: Iterable[str], min_age: float = ORPHAN_MIN_AGE) -> List[str]:
+    """对照原型记录查找上传目录中的残留目录，只返回超过 min_age 秒未修改的"""
+    from app.services.versions import VERSIONS_DIRNAME
+
+    object_ids = set(object_ids)
+    now = time.time()
+
+    def is_old(path):
+        try:
+            return now - os.lstat(path).st_mtime >= min_age
+        except FileNotFoundError:
+            return False
+
+    orphans = []
+    for name in sorted(os.listdir(upload_dir)):
+        path = os.path.join(upload_dir, name)
+        if name.startswith(".") or not (os.path.islink(path) or os.path.isdir(path)):
+            continue
+        if name in object_ids:
+            temp_dir = os.path.join(path, TEMP_EXTRACT_DIRNAME)
+            if not os.path.islink(path) and os.path.isdir(temp_dir) and is_old(temp_dir):
+                orphans.append(temp_dir)
+        elif is_old(path):
+            orphans.append(path)
+
+    versions_root = os.path.join(upload_dir, VERSIONS_DIRNAME)
+    if os.path.isdir(versions_root):
+        for name in sorted(os.listdir(versions_root)):
+            path = os.path.join(versions_root, name)
+            if name not in object_ids and is_old(path):
+                orphans.append(path)
+    return orphans
+
+
+def find_staged_orphans(upload_dir: str, load_active_jobs: Callable[[], Set[str]],
+                        min_age: float = ORPHAN_MIN_AGE) -> List[str]:
+    """查找超过 min_age 秒未修改、且没有对应未结束任务的上传暂存文件"""
+    from app.services.jobs import JOBS_DIRNAME
+
+    staging_dir = os.path.join(upload_dir, JOBS_DIRNAME)
+    if not os.path.isdir(staging_dir):
+        return []
+    now = time.time()
+    stale = []
+    for name in sorted(os.listdir(staging_dir)):
+        path = os.path.join(staging_dir, name)
+        try:
+            if now - os.lstat(path).st_mtime >= min_age:
+                stale.append(path)
+        except FileNotFoundError:
+            continue
+    if not stale:
+        return []
+    active = load_active_jobs()
+    return [path for path in stale if os.path.basename(path) not in active]
+
+
+def reap_paths(upload_dir: str, paths: Iterable[str]) -> List[str]:
+    """把残留目录和暂存文件移入回收区，返回相对上传目录的路径"""
+    moved = []
+    for path in paths:
+        if os.path.islink(path):
+            os.unlink(path)
+        elif move_to_trash(upload_dir, path) is None:
+            continue
+        moved.append(os.path.relpath(path, upload_dir))
+    return moved
+
+
+def known_object_ids() -> Set[str]:
+    db = session_factory()
+    try:
+        return {object_id for (object_id,) in db.query(Project.object_id)}
+    finally:
+        db.close()
+
+
+def active_job_ids() -> Set[str]:
+    from app.services.jobs import TERMINAL_STATUSES
+
+    db = session_factory()
+    try:
+        return {job_id for (job_id,) in db.query(UploadJob.id).filter(UploadJob.status.notin_(TERMINAL_STATUSES))}
+    finally:
+        db.close()
+
+
+def run_reaper(upload_dir: str, load_object_ids: Callable[[], Set[str]] = known_object_ids,
+               load_active_jobs: Callable[[], Set[str]] = active_job_ids,
+               reap_orphans: Optional[bool] = None) -> Optional[dict]:
+    """
+    检查孤儿目录、清理暂存文件并清空回收区，返回清理报告；其他进程正在清理时返回 None
+    reap_orphans 为 None 时按 STORAGE_REAP_ORPHANS 决定是否把孤儿目录移入回收区，否则只列在报告中
+    """
+    if reap_orphans is None:
+        reap_orphans = settings.STORAGE_REAP_ORPHANS
+    with reaper_lock(upload_dir) as acquired:
+        if not acquired:
+            return None
+
+        started = time.time()
+        object_ids = load_object_ids()
+        if object_ids:
+            found = find_orphans(upload_dir, object_ids)
+            orphans = reap_paths(upload_dir, found) if reap_orphans else [os.path.relpath(path, upload_dir) for path in found]
+        else:
+            logger.warning("projects 表为空，跳过孤儿目录检查（请确认数据库配置）")
+            orphans, reap_orphans = [], False
+        staged = reap_paths(upload_dir, find_staged_orphans(upload_dir, load_active_jobs))
+        report = purge_trash(upload_dir, settings.STORAGE_REAP_RATE)
+        report.update(
+            orphans=orphans, orphans_reaped=reap_orphans, orphans_skipped=not object_ids, staged=staged,
+            started_at=started, duration=round(time.time() - started, 3),
+        )
+
+        tmp_path = os.path.join(trash_root(upload_dir), f"{REPORT_FILENAME}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(trash_root(upload_dir), REPORT_FILENAME))
+    logger.info("存储清理完成: 孤儿目录 %d 个（%s），删除 %d 个文件，释放 %d 字节",
+                len(report["orphans"]), "已移入回收区" if report["orphans_reaped"] else "仅报告",
+                report["files"], report["bytes"])
+    return report
+
+
+def last_report(upload_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(trash_root(upload_dir), REPORT_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def schedule_reaper(upload_dir: str, reap_orphans: Optional[bool] = None):
+    """在后台线程中立即执行一次清理"""
+    def reap():
+        try:
+            run_reaper(upload_dir, reap_orphans=reap_orphans)
+        except Exception:
+            logger.exception("存储清理失败")
+
+    threading.Thread(target=reap, name="storage-reaper-once", daemon=True).start()
+
+
+def start_reaper(upload_dir: str, interval: float):
+    """启动定期清理线程（每个 worker 进程一个，文件锁保证同时只有一个在执行）"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                run_reaper(upload_dir)
+            except Exception:
+                logger.exception("存储清理失败")
+
+    threading.Thread(target=loop, name="storage-reaper", daemon=True).start()
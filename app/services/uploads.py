@@ -0,0 +1,178 @@
+"""
+可续传的分片上传
+
+上传会话保存在上传目录下的 .uploads/<会话 ID>/ 中：
+- session.json：会话信息（用户、文件名、总大小、要更新的原型等）
+- data：已提交的内容；已提交偏移量即该文件的大小
+
+分片按偏移量顺序追加：请求体边接收边写入磁盘并计算 SHA-256，不在内存中缓存整个分片。
+分片写入失败（连接中断、校验和不一致、超出总大小）时截断回分片开始前的偏移量，
+客户端查询已提交偏移量后从该位置继续上传。
+超过 UPLOAD_SESSION_TTL_HOURS 未写入的会话在创建新会话时清理。
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Optional
+
+SESSIONS_DIRNAME = ".uploads"
+SESSION_FILENAME = "session.json"
+DATA_FILENAME = "data"
+
+
+class UploadSessionError(ValueError):
+    pass
+
+
+class OffsetMismatch(UploadSessionError):
+    """分片偏移量与已提交偏移量不一致"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"偏移量不一致，已提交 {offset} 字节")
+        self.offset = offset
+
+
+class SessionBusy(UploadSessionError):
+    def __init__(self):
+        super().__init__("该上传会话正在写入其他分片")
+
+
+def sessions_root(upload_dir: str) -> str:
+    return os.path.join(upload_dir, SESSIONS_DIRNAME)
+
+
+def session_dir(upload_dir: str, session_id: str) -> str:
+    return os.path.join(sessions_root(upload_dir), session_id)
+
+
+def data_path(upload_dir: str, session_id: str) -> str:
+    return os.path.join(session_dir(upload_dir, session_id), DATA_FILENAME)
+
+
+def create_session(
+    upload_dir: str,
+    user_id: int,
+    filename: str,
+    size: int,
+    object_id: Optional[str] = None,
+    sha256: Optional[str] = None,
+) -> dict:
+    session = {
+        "id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "filename": os.path.basename(filename),
+        "size": size,
+        "object_id": object_id,
+        "sha256": sha256.lower() if sha256 else None,
+        "created_at": time.time(),
+    }
+    directory = session_dir(upload_dir, session["id"])
+    os.makedirs(directory)
+    open(os.path.join(directory, DATA_FILENAME), "wb").close()
+    with open(os.path.join(directory, SESSION_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(session, f, ensure_ascii=False)
+    return session
+
+
+def load_session(upload_dir: str, session_id: str) -> Optional[dict]:
+    # 会话 ID 为 uuid4 hex，拒绝其他形式避免路径穿越
+    if len(session_id) != 32 or not all(c in "0123456789abcdef" for c in session_id):
+        return None
+    try:
+        with open(os.path.join(session_dir(upload_dir, session_id), SESSION_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def committed_offset(upload_dir: str, session_id: str) -> int:
+    return os.path.getsize(data_path(upload_dir, session_id))
+
+
+def remove_session(upload_dir: str, session_id: str):
+    shutil.rmtree(session_dir(upload_dir, session_id), ignore_errors=True)
+
+
+class ChunkWriter:
+    """向会话追加一个分片
+
+    打开时对数据文件加排他锁（同一会话同时只能写一个分片）并校验偏移量；
+    写入时计算 SHA-256；commit 时校验和不一致，或中途出错调用 abort，截断回原偏移量。
+    """
+
+    def __init__(self, upload_dir: str, session: dict, offset: int):
+        self.limit = session["size"]
+        self.file = open(data_path(upload_dir, session["id"]), "r+b")
+        try:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.file.close()
+            raise SessionBusy()
+        self.offset = os.fstat(self.file.fileno()).st_size
+        if offset != self.offset:
+            self.close()
+            raise OffsetMismatch(self.offset)
+        self.file.seek(self.offset)
+        self.written = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, data: bytes):
+        if self.offset + self.written + len(data) > self.limit:
+            raise UploadSessionError("分片超出文件大小")
+        self.file.write(data)
+        self.digest.update(data)
+        self.written += len(data)
+
+    def commit(self, checksum: Optional[str]) -> int:
+        """校验分片，返回新的已提交偏移量"""
+        if checksum and checksum.lower() != self.digest.hexdigest():
+            raise UploadSessionError("分片校验和不一致")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.offset + self.written
+
+    def abort(self):
+        self.file.flush()
+        self.file.truncate(self.offset)
+
+    def close(self):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+
+
+def verify_upload(upload_dir: str, session: dict):
+    """完成上传前校验：大小完整，若创建会话时提供了整个文件的 SHA-256 则一并校验"""
+    path = data_path(upload_dir, session["id"])
+    if os.path.getsize(path) != session["size"]:
+        raise UploadSessionError("文件尚未上传完成")
+    if session.get("sha256"):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        if digest.hexdigest() != session["sha256"]:
+            raise UploadSessionError("文件校验和不一致")
+
+
+def reap_stale_sessions(upload_dir: str, max_age: float) -> int:
+    """删除超过 max_age 秒未写入的会话，返回删除数量"""
+    root = sessions_root(upload_dir)
+    if not os.path.isdir(root):
+        return 0
+    now = time.time()
+    removed = 0
+    for session_id in os.listdir(root):
+        directory = os.path.join(root, session_id)
+        try:
+            last_write = max(os.path.getmtime(os.path.join(directory, name)) for name in os.listdir(directory))
+        except (OSError, ValueError):
+            last_write = 0
+        if now - last_write > max_age:
+            shutil.rmtree(directory, ignore_errors=True)
+            removed += 1
+    return removed
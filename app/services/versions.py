@@ -0,0 +1,160 @@
+"""
+原型版本目录
+
+每次上传、更新原型文件都解压到新的版本目录 .versions/<object_id>/<版本号>，
+全部写完后把项目路径 UPLOAD_DIR/<object_id>（符号链接）原子地替换为指向新版本：
+解压期间和解压失败时访问者始终看到完整的旧版本，不会读到写了一半的目录。
+
+当前版本之外保留最近 PROJECT_VERSIONS_KEEP 个旧版本，可通过接口即时回滚；
+更早的版本在发布后由后台线程删除。版本退役后先保留一段宽限期，
+其他 worker 缓存的项目元数据在这段时间内仍可能指向它。
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+from app.services.blobs import blobs_root, release_blobs, tree_blobs
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIRNAME = ".versions"
+
+
+def versions_dir(upload_dir: str, object_id: str) -> str:
+    return os.path.join(upload_dir, VERSIONS_DIRNAME, object_id)
+
+
+def version_path(upload_dir: str, object_id: str, version: int) -> str:
+    return os.path.join(versions_dir(upload_dir, object_id), str(version))
+
+
+def list_versions(upload_dir: str, object_id: str) -> List[int]:
+    """已有的版本号，升序"""
+    try:
+        names = os.listdir(versions_dir(upload_dir, object_id))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name) for name in names if name.isdigit())
+
+
+def current_version(upload_dir: str, object_id: str) -> Optional[int]:
+    """项目路径当前指向的版本号；旧布局（普通目录）或项目不存在时返回 None"""
+    try:
+        target = os.readlink(os.path.join(upload_dir, object_id))
+    except OSError:
+        return None
+    name = os.path.basename(target)
+    return int(name) if name.isdigit() else None
+
+
+def resolve_project_dir(upload_dir: str, object_id: str) -> str:
+    """项目路径解析到当前版本目录，使缓存的元数据在新版本发布后仍读取同一个版本"""
+    link = os.path.join(upload_dir, object_id)
+    try:
+        target = os.readlink(link)
+    except OSError:
+        return link
+    return os.path.normpath(os.path.join(upload_dir, target))
+
+
+def create_version(upload_dir: str, object_id: str) -> str:
+    """创建下一个版本目录并返回其路径（并发创建时各自取得不同的版本号）"""
+    parent = versions_dir(upload_dir, object_id)
+    os.makedirs(parent, exist_ok=True)
+    while True:
+        existing = list_versions(upload_dir, object_id)
+        path = os.path.join(parent, str(existing[-1] + 1 if existing else 1))
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            continue
+        return path
+
+
+def publish(upload_dir: str, object_id: str, version_dir: str):
+    """把项目路径原子地切换到 version_dir
+
+    先在旁边建好指向新版本的临时符号链接，再 rename 覆盖项目路径；
+    旧布局的项目目录（普通目录）先整体移为版本 0，之后按版本目录管理。
+    """
+    link = os.path.join(upload_dir, object_id)
+    if os.path.isdir(link) and not os.path.islink(link):
+        os.makedirs(versions_dir(upload_dir, object_id), exist_ok=True)
+        os.rename(link, version_path(upload_dir, object_id, 0))
+
+    # 相对路径的链接，上传目录整体迁移或挂载到其他位置后仍然有效
+    target = os.path.relpath(version_dir, upload_dir)
+    tmp_link = f"{link}.{uuid.uuid4().hex}.tmp"
+    os.symlink(target, tmp_link)
+    try:
+        os.replace(tmp_link, link)
+    except BaseException:
+        os.unlink(tmp_link)
+        raise
+
+
+def discard_version(version_dir: str):
+    """删除未发布的版本目录（解压失败时调用）"""
+    shutil.rmtree(version_dir, ignore_errors=True)
+
+
+def remove_project(upload_dir: str, object_id: str):
+    """删除项目路径，版本目录移入回收区后由后台线程删除并释放去重存储文件"""
+    from app.services.trash import move_to_trash, schedule_purge
+
+    link = os.path.join(upload_dir, object_id)
+    moved = []
+    if os.path.islink(link):
+        os.unlink(link)
+    elif os.path.isdir(link):
+        moved.append(move_to_trash(upload_dir, link))
+    moved.append(move_to_trash(upload_dir, versions_dir(upload_dir, object_id)))
+    if any(moved):
+        schedule_purge(upload_dir)
+
+
+def reap_versions(upload_dir: str, object_id: str, keep: int, grace: float) -> List[int]:
+    """删除超出保留数量的旧版本，返回删除的版本号
+
+    保留当前版本以及比它更早的最近 keep 个版本；比当前版本新的目录是正在解压
+    或尚未发布的版本，不删除。版本的退役时间取其下一个版本目录的修改时间，
+    退役不足 grace 秒的不删除。
+    """
+    current = current_version(upload_dir, object_id)
+    if current is None:
+        return []
+    versions = list_versions(upload_dir, object_id)
+    older = [version for version in versions if version < current]
+    expired = older[:-keep] if keep > 0 else older
+    now = time.time()
+    removed = []
+    for version in expired:
+        successor = versions[versions.index(version) + 1]
+        try:
+            retired_at = os.stat(version_path(upload_dir, object_id, successor)).st_mtime
+        except FileNotFoundError:
+            continue
+        if now - retired_at < grace:
+            continue
+        path = version_path(upload_dir, object_id, version)
+        hashes = tree_blobs(path) if os.path.isdir(blobs_root(upload_dir)) else set()
+        shutil.rmtree(path, ignore_errors=True)
+        release_blobs(upload_dir, hashes)
+        removed.append(version)
+    return removed
+
+
+def schedule_reap(upload_dir: str, object_id: str, keep: int, grace: float):
+    """在后台线程中清理旧版本，不阻塞发布请求"""
+    def reap():
+        try:
+            reap_versions(upload_dir, object_id, keep, grace)
+        except Exception:
+            logger.exception("清理旧版本失败: %s", object_id)
+
+    threading.Thread(target=reap, name=f"reap-{object_id}", daemon=True).start()
@@ -4,6 +4,13 @@ let currentProjectType = 'my';
 let projectsData = [];
 let activeDropdown = null;
 let perPage = parseInt(localStorage.getItem('projectPerPage')) || 12;
+// 滚动加载模式：按游标向后续加载，不再按页码翻页
+let scrollMode = localStorage.getItem('projectScrollMode') === '1';
+let nextCursor = null;
+let loadingMore = false;
+let loadMoreObserver = null;
+// 列表总数的计数方式，estimated 时总数为估算值
+let countStrategy = 'exact';
 
 let allTags = [];
 let commonTags = [];
@@ -330,6 +337,13 @@ function switchProjectType(type) {
     loadProjects(1);
 }
 
+// 估算的总数只显示量级，如 "12,000+"
+function formatTotal(total) {
+    if (countStrategy !== 'estimated') return total;
+    const rounded = total >= 1000 ? Math.floor(total / 1000) * 1000 : total;
+    return `${Number(rounded).toLocaleString()}+`;
+}
+
 // 分页组件渲染
 function renderPagination(total, totalPages, currentPageNum) {
     const pageEl = document.getElementById('pagination');
@@ -338,6 +352,20 @@ function renderPagination(total, totalPages, currentPageNum) {
     pageEl.dataset.total = total;
     pageEl.dataset.totalPages = totalPages;
     
+    const modeToggleHtml = `
+        <button type="button" onclick="toggleScrollMode()" class="h-8 px-3 rounded-lg border border-gray-300 text-gray-600 hover:border-orange-500 hover:text-orange-600 transition-colors">
+            ${scrollMode ? '分页显示' : '滚动加载'}
+        </button>
+    `;
+    
+    if (scrollMode) {
+        pageEl.innerHTML = `
+            <span class="text-gray-500">已加载 ${projectsData.length} / 共 ${formatTotal(total)} 条数据</span>
+            ${modeToggleHtml}
+        `;
+        return;
+    }
+    
     const hasPrev = currentPageNum > 1;
     const hasNext = currentPageNum < totalPages;
     
@@ -347,7 +375,7 @@ function renderPagination(total, totalPages, currentPageNum) {
     ).join('');
     
     pageEl.innerHTML = `
-        <span class="text-gray-500">共 ${total} 条数据</span>
+        <span class="text-gray-500">共 ${formatTotal(total)} 条数据</span>
         
         <div class="flex items-center gap-2">
             <button onclick="loadProjects(${currentPageNum - 1})" 
@@ -390,9 +418,18 @@ function renderPagination(total, totalPages, currentPageNum) {
                 ${perPageOptionsHtml}
             </div>
         </div>
+        
+        ${modeToggleHtml}
     `;
 }
 
+// 切换分页 / 滚动加载模式
+function toggleScrollMode() {
+    scrollMode = !scrollMode;
+    localStorage.setItem('projectScrollMode', scrollMode ? '1' : '0');
+    loadProjects(1);
+}
+
 // 显示页码输入框
 function showPageInput(currentPageNum, totalPages) {
     const displayEl = document.getElementById('pageNumberDisplay');
@@ -441,29 +478,34 @@ function changePerPage(newPerPage) {
     loadProjects(1);
 }
 
-async function loadProjects(page = 1) {
-    currentPage = page;
+function buildProjectsUrl(page) {
     const search = document.getElementById('searchInput').value;
     const authorId = document.getElementById('authorFilter')?.value || '';
 
-    let url = `/api/projects?page=${page}&per_page=${perPage}&search=${encodeURIComponent(search)}&project_type=${currentProjectType}`;
+    let url = `/api/projects?per_page=${perPage}&search=${encodeURIComponent(search)}&project_type=${currentProjectType}`;
+    // 滚动加载模式下首页传空游标，之后传上一页返回的 next_cursor
+    url += scrollMode ? `&cursor=${encodeURIComponent(nextCursor || '')}` : `&page=${page}`;
     if (authorId && currentProjectType === 'collaborate') {
         url += `&author_id=${authorId}`;
     }
     if (selectedTagFilter) {
         url += `&tag_id=${selectedTagFilter}`;
     }
+    return url;
+}
+
+async function loadProjects(page = 1) {
+    currentPage = page;
+    nextCursor = null;
 
     try {
-        const response = await fetch(url);
+        const response = await fetch(buildProjectsUrl(page));
         const data = await response.json();
         projectsData = data.items || [];
+        nextCursor = data.next_cursor || null;
+        countStrategy = data.count_strategy || 'exact';
 
-        if (currentView === 'card') {
-            renderCardView(projectsData);
-        } else {
-            renderListView(projectsData);
-        }
+        renderProjects();
 
         const totalPages = Math.ceil((data.total || 0) / (data.per_page || perPage));
         renderPagination(data.total || 0, totalPages, page);
@@ -473,6 +515,65 @@ async function loadProjects(page = 1) {
     }
 }
 
+// 滚动到底部时按游标加载下一批并追加到列表
+async function loadMoreProjects() {
+    if (!scrollMode || !nextCursor || loadingMore) return;
+    loadingMore = true;
+    const requestUrl = buildProjectsUrl();
+
+    try {
+        const response = await fetch(requestUrl);
+        const data = await response.json();
+        // 等待期间筛选条件已变化（列表已重新加载）时丢弃结果
+        if (!scrollMode || buildProjectsUrl() !== requestUrl) return;
+        projectsData = projectsData.concat(data.items || []);
+        nextCursor = data.next_cursor || null;
+        countStrategy = data.count_strategy || 'exact';
+
+        renderProjects();
+        renderPagination(data.total || 0, 1, 1);
+    } catch (error) {
+        console.error('加载失败:', error);
+        showToast('加载失败', 'error');
+    } finally {
+        loadingMore = false;
+    }
+}
+
+function renderProjects() {
+    if (currentView === 'card') {
+        renderCardView(projectsData);
+    } else {
+        renderListView(projectsData);
+    }
+    observeLoadMore();
+}
+
+// 在列表末尾放置加载提示，进入视口时加载下一批
+function observeLoadMore() {
+    if (loadMoreObserver) {
+        loadMoreObserver.disconnect();
+        loadMoreObserver = null;
+    }
+    if (!scrollMode || !nextCursor || !('IntersectionObserver' in window)) return;
+
+    const container = document.getElementById(currentView === 'card' ? 'cardView' : 'listViewBody');
+    if (!container) return;
+    const sentinel = document.createElement('div');
+    sentinel.className = currentView === 'card'
+        ? 'col-span-full text-center py-4 text-sm text-gray-400'
+        : 'px-6 py-4 text-center text-sm text-gray-400';
+    sentinel.textContent = '加载中...';
+    container.appendChild(sentinel);
+
+    loadMoreObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreProjects();
+        }
+    });
+    loadMoreObserver.observe(sentinel);
+}
+
 function renderCardView(projects) {
     const listEl = document.getElementById('cardView');
     if (!projects.length) {
@@ -584,14 +685,13 @@ function switchView(view) {
         listBtn?.classList.remove('active');
         cardView.classList.remove('hidden');
         listView.classList.add('hidden');
-        renderCardView(projectsData);
     } else {
         listBtn?.classList.add('active');
         cardBtn?.classList.remove('active');
         listView.classList.remove('hidden');
         cardView.classList.add('hidden');
-        renderListView(projectsData);
     }
+    renderProjects();
 }
 
 function toggleDropdown(event, projectId) {
@@ -1364,14 +1464,99 @@ function setFormLoading(formId, isLoading, loadingText = '处理中...') {
     }
 }
 
+function setFormLoadingText(formId, loadingText) {
+    const submitBtn = document.getElementById(formId).querySelector('button[type="submit"]');
+    const spinner = submitBtn.querySelector('svg');
+    submitBtn.innerHTML = `${spinner ? spinner.outerHTML : ''}${loadingText}`;
+}
+
+// 等待后台上传任务结束（SSE 推送进度），返回任务最终状态
+function waitForUploadJob(jobId, formId) {
+    return new Promise((resolve) => {
+        const source = new EventSource(`/api/projects/jobs/${jobId}/events`);
+        source.onmessage = (event) => {
+            const job = JSON.parse(event.data);
+            if (job.status === 'succeeded' || job.status === 'failed') {
+                source.close();
+                resolve(job);
+            } else {
+                setFormLoadingText(formId, `解压中 ${job.progress}%`);
+            }
+        };
+        source.onerror = async () => {
+            // 连接中断时改为查询一次任务状态
+            source.close();
+            try {
+                const response = await fetch(`/api/projects/jobs/${jobId}`);
+                const job = await response.json();
+                resolve(job.status === 'pending' || job.status === 'running' ? await waitForUploadJob(jobId, formId) : job);
+            } catch (error) {
+                resolve({ status: 'failed', error: '网络错误' });
+            }
+        };
+    });
+}
+
+// 超过该大小的文件使用分片上传，断线后从已提交的偏移量继续
+const CHUNKED_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+const CHUNK_UPLOAD_RETRIES = 5;
+
+async function getUploadOffset(sessionId) {
+    const response = await fetch(`/api/projects/uploads/${sessionId}`);
+    if (!response.ok) throw new Error('上传会话已失效');
+    return (await response.json()).offset;
+}
+
+// 分片上传文件，完成后按普通上传流程处理；返回完成上传接口的响应
+async function uploadInChunks(file, objectId, finalizeBody, formId) {
+    const created = await fetch('/api/projects/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size, object_id: objectId })
+    });
+    if (!created.ok) return created;
+    const session = await created.json();
+
+    let offset = 0;
+    let failures = 0;
+    while (offset < file.size) {
+        setFormLoadingText(formId, `上传中 ${Math.floor(offset * 100 / file.size)}%`);
+        try {
+            const chunk = file.slice(offset, offset + session.chunk_size);
+            const response = await fetch(`/api/projects/uploads/${session.session_id}?offset=${offset}`, {
+                method: 'PUT',
+                body: chunk
+            });
+            if (response.ok) {
+                offset = (await response.json()).offset;
+                failures = 0;
+                continue;
+            }
+            if (response.status !== 409) return response;
+        } catch (error) {
+            if (++failures > CHUNK_UPLOAD_RETRIES) throw error;
+            await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+        }
+        offset = await getUploadOffset(session.session_id);
+    }
+
+    setFormLoadingText(formId, '处理中...');
+    return fetch(`/api/projects/uploads/${session.session_id}/finalize`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Prefer': 'respond-async' },
+        body: JSON.stringify(finalizeBody)
+    });
+}
+
 document.getElementById('uploadForm').addEventListener('submit', async (e) => {
     e.preventDefault();
 
     setFormLoading('uploadForm', true, '上传中...');
 
     const usePassword = document.getElementById('usePassword').checked;
+    const file = document.getElementById('projectFile').files[0];
     const formData = new FormData();
-    formData.append('file', document.getElementById('projectFile').files[0]);
+    formData.append('file', file);
     formData.append('name', document.getElementById('projectName').value);
     formData.append('is_public', !usePassword);
     formData.append('remark', document.getElementById('remark').value);
@@ -1382,8 +1567,23 @@ document.getElementById('uploadForm').addEventListener('submit', async (e) => {
     }
 
     try {
-        const response = await fetch('/api/projects/upload', { method: 'POST', body: formData });
-        if (response.ok) {
+        const response = file.size > CHUNKED_UPLOAD_THRESHOLD
+            ? await uploadInChunks(file, null, {
+                name: formData.get('name'),
+                is_public: !usePassword,
+                remark: formData.get('remark'),
+                tag_names: uniqueTagNames(uploadSelectedTags),
+                view_password: usePassword ? formData.get('view_password') : null
+            }, 'uploadForm')
+            : await fetch('/api/projects/upload', {
+                method: 'POST',
+                body: formData,
+                headers: { 'Prefer': 'respond-async' }
+            });
+        const job = response.status === 202 ? await waitForUploadJob((await response.json()).job_id, 'uploadForm') : null;
+        if (job && job.status === 'failed') {
+            showToast(job.error || '上传失败', 'error');
+        } else if (response.ok) {
             closeUploadModal();
             await refreshTagsData();
             loadProjects();
@@ -1405,12 +1605,22 @@ document.getElementById('updateForm').addEventListener('submit', async (e) => {
     setFormLoading('updateForm', true, '更新中...');
 
     const objectId = document.getElementById('updateProjectId').value;
+    const file = document.getElementById('updateProjectFile').files[0];
     const formData = new FormData();
-    formData.append('file', document.getElementById('updateProjectFile').files[0]);
+    formData.append('file', file);
 
     try {
-        const response = await fetch(`/api/projects/${objectId}/update-file`, { method: 'POST', body: formData });
-        if (response.ok) {
+        const response = file.size > CHUNKED_UPLOAD_THRESHOLD
+            ? await uploadInChunks(file, objectId, {}, 'updateForm')
+            : await fetch(`/api/projects/${objectId}/update-file`, {
+                method: 'POST',
+                body: formData,
+                headers: { 'Prefer': 'respond-async' }
+            });
+        const job = response.status === 202 ? await waitForUploadJob((await response.json()).job_id, 'updateForm') : null;
+        if (job && job.status === 'failed') {
+            showToast(job.error || '更新失败', 'error');
+        } else if (response.ok) {
             closeUpdateModal();
             loadProjects();
             showToast('更新成功', 'success');
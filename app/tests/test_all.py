@@ -4,11 +4,20 @@ AxHost 单元测试
 运行测试: python -m pytest app/tests/ -v
 """
 
+import io
+import os
+import json
+import time
+import zipfile
+from datetime import datetime, timedelta
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from app.core.database import Base, get_db
-from app.models.models import User, Project, ProjectAccess
+from app.core.cache import TTLCache
+from app.models.models import User, Project, ProjectAccess, Tag, UploadJob
+from app.routers import projects
 from app.services.services import UserService, ProjectService, generate_password, generate_object_id
 from app.core.security import get_password_hash, verify_password, create_access_token, decode_token
 
@@ -74,6 +83,50 @@ def sample_project(db, sample_user):
     db.refresh(project)
     return project
 
+@pytest.fixture
+def auth_headers(sample_user):
+    """测试用户的认证请求头"""
+    token = create_access_token({"sub": str(sample_user.id)})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    """将原型上传目录指向临时目录"""
+    from app.services.delivery import asset_memory_cache
+    monkeypatch.setattr(projects, "UPLOAD_DIR", str(tmp_path))
+    projects.project_meta_cache.clear()
+    asset_memory_cache.clear()
+    return tmp_path
+
+
+def make_axure_zip(files, prefix=""):
+    """生成 Axure 导出结构的 ZIP 字节"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path, content in files.items():
+            zf.writestr(prefix + path, content)
+    return buffer.getvalue()
+
+AXURE_FILES = {
+    "index.html": "<html>index</html>",
+    "start.html": "<html>start</html>",
+    "resources/scripts/axure/axQuery.js": "var axQuery = {};" * 200,
+    "data/document.js": "$axure.loadDocument({});",
+}
+
+
+def upload_prototype(client, headers, files=AXURE_FILES, name="测试原型", status_code=200, **form):
+    """通过上传接口创建公开原型并检查状态码，返回 object_id；files 为文件字典或 ZIP 字节"""
+    archive = files if isinstance(files, bytes) else make_axure_zip(files)
+    response = client.post(
+        "/api/projects/upload",
+        data={"name": name, "is_public": "true", **form},
+        files={"file": ("proto.zip", archive, "application/zip")},
+        headers=headers,
+    )
+    assert response.status_code == status_code
+    return response.json().get("object_id")
+
 
 class TestSecurity:
     """安全模块测试"""
@@ -345,5 +398,1721 @@ class TestUtils:
         assert len(id1.split('_')) == 2  # 格式: 时间戳_uuid
 
 
+class TestProjectMetaCache:
+    """原型元数据缓存测试"""
+
+    def test_ttl_cache_lru_and_expiry(self):
+        """测试 LRU 淘汰和 TTL 过期"""
+        now = [0.0]
+        cache = TTLCache(maxsize=2, ttl=10, timer=lambda: now[0])
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+
+        # 超出容量时淘汰最久未使用的 b
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+
+        now[0] = 11
+        assert cache.get("a") is None
+        assert len(cache) == 1
+
+    def test_serve_file_without_db_query(self, client, sample_project, upload_dir):
+        """测试缓存命中后访问静态资源不查询数据库"""
+        resource_dir = upload_dir / sample_project.object_id / "resources"
+        resource_dir.mkdir(parents=True)
+        (resource_dir / "app.js").write_text("var a = 1;")
+        url = f"/projects/{sample_project.object_id}/resources/app.js"
+        assert client.get(url).status_code == 200
+
+        statements = []
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            response = client.get(url)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert response.status_code == 200
+        assert response.text == "var a = 1;"
+        assert statements == []
+
+    def test_update_project_invalidates_cache(self, client, sample_project, auth_headers, upload_dir):
+        """测试修改项目后缓存失效"""
+        project_dir = upload_dir / sample_project.object_id
+        project_dir.mkdir()
+        (project_dir / "page.html").write_text("<html></html>")
+        url = f"/projects/{sample_project.object_id}/page.html"
+        assert client.get(url).status_code == 200
+
+        response = client.put(
+            f"/api/projects/{sample_project.object_id}",
+            json={"is_public": False, "view_password": "abc123"},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        assert client.get(url).status_code == 403
+
+
+class TestProjectManifest:
+    """原型文件清单测试"""
+
+    def test_upload_builds_manifest(self, client, auth_headers, upload_dir):
+        """测试上传后生成清单并按清单提供文件"""
+        object_id = upload_prototype(client, auth_headers, make_axure_zip(AXURE_FILES, prefix="proto/"))
+        project_dir = upload_dir / object_id
+
+        manifest = json.loads((project_dir / ".axhost" / "manifest.json").read_text())
+        assert manifest["entry"] == "start.html"
+        assert set(manifest["files"]) == set(AXURE_FILES)
+        size, _, content_type, _ = manifest["files"]["data/document.js"]
+        assert size == len(AXURE_FILES["data/document.js"])
+        assert "javascript" in content_type
+
+        assert client.get(f"/projects/{object_id}/").text == "<html>start</html>"
+        assert client.get(f"/projects/{object_id}/data/document.js").status_code == 200
+
+        # 清单之外的文件（包括清单本身）不对外提供
+        (project_dir / "extra.js").write_text("var extra;")
+        assert client.get(f"/projects/{object_id}/extra.js").status_code == 404
+        assert client.get(f"/projects/{object_id}/.axhost/manifest.json").status_code == 404
+        assert client.get(f"/projects/{object_id}/resources").status_code == 404
+
+    def test_legacy_manifest_built_once(self, tmp_path, monkeypatch):
+        """测试旧项目并发请求时只补建一次清单，临时文件不残留"""
+        from concurrent.futures import ThreadPoolExecutor
+        from app.services import manifest as manifest_module
+        for path, content in AXURE_FILES.items():
+            (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / path).write_text(content)
+        calls = []
+        build = manifest_module.build_manifest
+
+        def slow_build(root):
+            calls.append(root)
+            time.sleep(0.05)
+            return build(root)
+        monkeypatch.setattr(manifest_module, "build_manifest", slow_build)
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            results = list(pool.map(lambda _: manifest_module.load_manifest(str(tmp_path)), range(20)))
+        assert len(calls) == 1
+        assert all(set(result.files) == set(AXURE_FILES) for result in results)
+        assert os.listdir(tmp_path / ".axhost") == ["manifest.json"]
+
+    def test_normalize_path(self):
+        """测试请求路径规范化"""
+        from app.services.manifest import normalize_path
+
+        assert normalize_path("data//document.js") == "data/document.js"
+        assert normalize_path("./files/页面/data.js") == "files/页面/data.js"
+        assert normalize_path("../etc/passwd") is None
+        assert normalize_path("resources/../../secret") is None
+        assert normalize_path("") is None
+
+
+class TestConditionalRequests:
+    """条件请求与缓存策略测试"""
+
+    def test_etag_and_not_modified(self, client, auth_headers, upload_dir):
+        """测试 ETag / If-None-Match / If-Modified-Since"""
+        object_id = upload_prototype(client, auth_headers, view_password="abc123")
+        url = f"/projects/{object_id}/data/document.js"
+
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        assert response.headers["cache-control"].startswith("public")
+        last_modified = response.headers["last-modified"]
+
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+        assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+        assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+        assert client.get(url, headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+
+    def test_head_request(self, client, auth_headers, upload_dir):
+        """测试 HEAD 请求"""
+        object_id = upload_prototype(client, auth_headers, view_password="abc123")
+        response = client.head(f"/projects/{object_id}/data/document.js")
+        assert response.status_code == 200
+        assert response.content == b""
+        assert int(response.headers["content-length"]) == len(AXURE_FILES["data/document.js"])
+        assert client.head(f"/projects/{object_id}/").status_code == 200
+
+    def test_private_cache_control(self, client, auth_headers, upload_dir):
+        """测试私密原型使用 private 缓存"""
+        object_id = upload_prototype(client, auth_headers, is_public="false", view_password="abc123")
+        client.cookies.set(f"project_access_{object_id}", "1")
+        response = client.get(f"/projects/{object_id}/start.html")
+        assert response.status_code == 200
+        assert response.headers["cache-control"].startswith("private")
+
+    def test_update_file_invalidates_etag(self, client, auth_headers, upload_dir):
+        """测试更新原型文件后内容变化的文件 ETag 失效"""
+        object_id = upload_prototype(client, auth_headers, view_password="abc123")
+        url = f"/projects/{object_id}/data/document.js"
+        etag = client.get(url).headers["etag"]
+
+        files = dict(AXURE_FILES, **{"data/document.js": "$axure.loadDocument({v: 2});"})
+        response = client.post(
+            f"/api/projects/{object_id}/update-file",
+            files={"file": ("proto.zip", make_axure_zip(files), "application/zip")},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert "v: 2" in response.text
+
+
+class TestPrecompressedAssets:
+    """预压缩副本测试"""
+
+    def test_upload_writes_gzip_sidecar(self, client, auth_headers, upload_dir):
+        """测试上传时生成 gzip 副本并按 Accept-Encoding 返回"""
+        object_id = upload_prototype(client, auth_headers)
+        project_dir = upload_dir / object_id
+        sidecar = project_dir / ".axhost" / "gzip" / "resources/scripts/axure/axQuery.js.gz"
+        assert sidecar.exists()
+        # 低于阈值的小文件不生成副本
+        assert not (project_dir / ".axhost" / "gzip" / "data/document.js.gz").exists()
+
+        url = f"/projects/{object_id}/resources/scripts/axure/axQuery.js"
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) == sidecar.stat().st_size
+        assert response.text == AXURE_FILES["resources/scripts/axure/axQuery.js"]
+        gzip_etag = response.headers["etag"]
+
+        response = client.get(url, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+        assert response.headers["etag"] != gzip_etag
+        assert response.text == AXURE_FILES["resources/scripts/axure/axQuery.js"]
+
+        response = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_etag})
+        assert response.status_code == 304
+
+    def test_precompress_project_parallel(self, tmp_path, monkeypatch):
+        """测试分块流式压缩并行生成副本，压缩效果不足的文件不保留副本"""
+        import gzip
+        from app.services import precompress
+        from app.services.manifest import build_manifest
+        monkeypatch.setattr(precompress, "CHUNK_SIZE", 1000)
+        files = {f"page{i}.js": f"var page{i} = 1;" * 500 for i in range(6)}
+        for path, content in files.items():
+            (tmp_path / path).write_text(content)
+        (tmp_path / "font.ttf").write_bytes(os.urandom(4096))
+
+        manifest = precompress.precompress_project(str(tmp_path), build_manifest(str(tmp_path)), workers=4)
+        for i in range(6):
+            path = f"page{i}.js"
+            sidecar = tmp_path / ".axhost" / "gzip" / f"{path}.gz"
+            assert manifest.files[path].encodings["gzip"] == sidecar.stat().st_size
+            assert gzip.decompress(sidecar.read_bytes()).decode() == files[path]
+        assert manifest.files["font.ttf"].encodings == {}
+        assert not (tmp_path / ".axhost" / "gzip" / "font.ttf.gz").exists()
+
+    def test_negotiate_encoding(self):
+        """测试 Accept-Encoding 协商"""
+        from app.services.precompress import negotiate_encoding
+
+        both = {"gzip": 10, "br": 8}
+        assert negotiate_encoding("gzip, deflate, br", both) == "br"
+        assert negotiate_encoding("gzip, deflate, br", {"gzip": 10}) == "gzip"
+        assert negotiate_encoding("br;q=0, gzip;q=0.5", both) == "gzip"
+        assert negotiate_encoding("gzip;q=0", {"gzip": 10}) is None
+        assert negotiate_encoding("*", {"gzip": 10}) == "gzip"
+        assert negotiate_encoding(None, both) is None
+        assert negotiate_encoding("gzip", {}) is None
+
+
+class TestRangeRequests:
+    """区间请求测试"""
+
+    @pytest.fixture
+    def media_url(self, client, sample_project, upload_dir, monkeypatch):
+        # 关闭内存缓存，覆盖按文件发送的路径
+        from app.services.delivery import asset_memory_cache
+        monkeypatch.setattr(asset_memory_cache, "max_bytes", 0)
+        project_dir = upload_dir / sample_project.object_id / "images"
+        project_dir.mkdir(parents=True)
+        (project_dir / "video.mp4").write_bytes(bytes(range(256)) * 40)
+        return f"/projects/{sample_project.object_id}/images/video.mp4"
+
+    def test_single_range(self, client, media_url):
+        """测试单区间、开放区间和后缀区间"""
+        body = bytes(range(256)) * 40
+        response = client.get(media_url)
+        assert response.headers["accept-ranges"] == "bytes"
+
+        response = client.get(media_url, headers={"Range": "bytes=10-19"})
+        assert response.status_code == 206
+        assert response.content == body[10:20]
+        assert response.headers["content-range"] == f"bytes 10-19/{len(body)}"
+        assert response.headers["content-length"] == "10"
+
+        response = client.get(media_url, headers={"Range": "bytes=10000-"})
+        assert response.status_code == 206
+        assert response.content == body[10000:]
+
+        response = client.get(media_url, headers={"Range": "bytes=-5"})
+        assert response.content == body[-5:]
+
+    def test_unsatisfiable_and_multi_range(self, client, media_url):
+        """测试超出范围和多区间请求返回 416"""
+        response = client.get(media_url, headers={"Range": "bytes=20000-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == "bytes */10240"
+
+        response = client.get(media_url, headers={"Range": "bytes=0-1,5-6"})
+        assert response.status_code == 416
+
+        # 无法识别的 Range 被忽略
+        response = client.get(media_url, headers={"Range": "items=0-1"})
+        assert response.status_code == 200
+
+    def test_if_range(self, client, media_url):
+        """测试 If-Range：校验值不匹配时返回完整内容"""
+        etag = client.get(media_url).headers["etag"]
+        response = client.get(media_url, headers={"Range": "bytes=0-9", "If-Range": etag})
+        assert response.status_code == 206
+        response = client.get(media_url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        assert response.status_code == 200
+        assert len(response.content) == 10240
+
+    def test_missing_file_returns_404(self, client, media_url, upload_dir):
+        """测试清单中的文件已被删除时返回 404"""
+        assert client.get(media_url).status_code == 200
+        for path in upload_dir.rglob("video.mp4"):
+            path.unlink()
+        assert client.get(media_url).status_code == 404
+
+    def test_parse_range(self):
+        """测试 Range 头解析"""
+        from app.services.delivery import parse_range, RangeNotSatisfiable
+
+        assert parse_range("bytes=0-0", 10) == (0, 0)
+        assert parse_range("bytes=5-100", 10) == (5, 9)
+        assert parse_range("bytes=-100", 10) == (0, 9)
+        assert parse_range("bytes=7-3", 10) is None
+        assert parse_range("bytes=abc", 10) is None
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range("bytes=10-", 10)
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range("bytes=0-1, 3-4", 10)
+
+
+class TestAssetOffload:
+    """静态资源卸载测试"""
+
+    @pytest.fixture
+    def project_url(self, sample_project, upload_dir):
+        page_dir = upload_dir / sample_project.object_id / "files" / "首页"
+        page_dir.mkdir(parents=True)
+        (page_dir / "data.js").write_text("var page = {};")
+        return f"/projects/{sample_project.object_id}"
+
+    def test_x_accel_redirect(self, client, sample_project, project_url, monkeypatch):
+        """测试 X-Accel-Redirect 模式只返回内部路径"""
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "ASSET_OFFLOAD", "x-accel-redirect")
+
+        response = client.get(f"{project_url}/files/首页/data.js")
+        assert response.status_code == 200
+        assert response.content == b""
+        assert response.headers["x-accel-redirect"] == (
+            f"/_axhost_internal/{sample_project.object_id}/files/%E9%A6%96%E9%A1%B5/data.js"
+        )
+        assert "etag" in response.headers
+        assert response.headers["content-type"].startswith("text/javascript")
+
+        # 条件请求仍由应用处理
+        etag = response.headers["etag"]
+        assert client.get(f"{project_url}/files/首页/data.js", headers={"If-None-Match": etag}).status_code == 304
+
+    def test_x_sendfile(self, client, project_url, upload_dir, monkeypatch):
+        """测试 X-Sendfile 模式返回文件绝对路径"""
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "ASSET_OFFLOAD", "x-sendfile")
+
+        response = client.get(f"{project_url}/files/首页/data.js")
+        header = response.headers["x-sendfile"]
+        assert header.startswith(str(upload_dir))
+        assert header.endswith("/files/%E9%A6%96%E9%A1%B5/data.js")
+
+    def test_offload_requires_authorization(self, client, sample_project, project_url, db, monkeypatch):
+        """测试卸载模式下私密原型仍需验证"""
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "ASSET_OFFLOAD", "x-accel-redirect")
+        sample_project.is_public = False
+        db.commit()
+
+        response = client.get(f"{project_url}/files/首页/data.js")
+        assert response.status_code == 403
+        assert "x-accel-redirect" not in response.headers
+
+
+class TestArchiveExtraction:
+    """上传解压测试"""
+
+    def test_manifest_matches_extracted_tree(self, client, auth_headers, upload_dir):
+        """测试解压时生成的清单与遍历目录生成的一致，且不保留上传的压缩包"""
+        from app.services.manifest import build_manifest
+        project_dir = upload_dir / upload_prototype(client, auth_headers, make_axure_zip(AXURE_FILES, prefix="导出/proto/"))
+
+        assert sorted(p.name for p in project_dir.iterdir()) == [".axhost", "data", "index.html", "resources", "start.html"]
+        manifest = json.loads((project_dir / ".axhost" / "manifest.json").read_text())
+        expected = build_manifest(str(project_dir))
+        assert set(manifest["files"]) == set(expected.files)
+        for path, entry in expected.files.items():
+            assert manifest["files"][path][3] == entry.sha256
+
+    def test_invalid_archive_rejected(self, client, auth_headers, upload_dir, db):
+        """测试损坏的压缩包和缺少入口文件的压缩包被拒绝，不留下项目目录和记录"""
+        for content, detail in [
+            (b"not a zip file", "无效的压缩文件"),
+            (make_axure_zip({"readme.txt": "hello"}), "上传的压缩包中未找到入口文件"),
+            (make_axure_zip({**AXURE_FILES, "data": "file", "data/b.js": "b"}), "压缩包中存在同名的文件和目录: data"),
+        ]:
+            response = client.post(
+                "/api/projects/upload",
+                data={"name": "无效压缩包"},
+                files={"file": ("proto.zip", content, "application/zip")},
+                headers=auth_headers,
+            )
+            assert response.status_code == 400
+            assert response.json()["detail"] == detail
+        assert list(upload_dir.iterdir()) == []
+        assert db.query(Project).filter(Project.name == "无效压缩包").count() == 0
+
+    def test_path_conflict_writes_nothing(self, tmp_path):
+        """测试同一路径既是文件又是目录时解压前拒绝，不写任何文件"""
+        from app.services.archive import extract_archive
+        archive = make_axure_zip({**AXURE_FILES, "a/b": "file", "a/b/c.js": "nested"})
+        with pytest.raises(ValueError, match="a/b"):
+            extract_archive(io.BytesIO(archive), str(tmp_path))
+        assert list(tmp_path.iterdir()) == []
+
+    def test_only_entry_directory_extracted(self, upload_dir):
+        """测试只解压入口目录下的成员"""
+        from app.services.archive import extract_archive
+        files = {f"proto/{path}": content for path, content in AXURE_FILES.items()}
+        files["说明.txt"] = "readme"
+        files["proto/old/index.html"] = files["proto/old/start.html"] = "old"
+        project_dir = upload_dir / "p"
+        project_dir.mkdir()
+
+        manifest = extract_archive(io.BytesIO(make_axure_zip(files)), str(project_dir))
+        assert set(manifest.files) == set(AXURE_FILES) | {"old/index.html", "old/start.html"}
+        assert not (project_dir / "说明.txt").exists()
+
+        project_dir = upload_dir / "q"
+        project_dir.mkdir()
+        assert extract_archive(io.BytesIO(make_axure_zip({"a/index.html": "x"})), str(project_dir)) is None
+        assert list(project_dir.iterdir()) == []
+
+    def test_parallel_extraction_matches_sequential(self, upload_dir):
+        """测试并行解压与逐个解压结果一致"""
+        from app.services.archive import extract_archive
+        files = dict(AXURE_FILES)
+        for i in range(50):
+            files[f"files/页面{i}/data.js"] = f"var page{i} = {{}};" * (i + 1)
+        archive = make_axure_zip(files)
+
+        manifests = []
+        for workers in (1, 8):
+            project_dir = upload_dir / str(workers)
+            project_dir.mkdir()
+            manifests.append(extract_archive(io.BytesIO(archive), str(project_dir), workers=workers))
+            assert (project_dir / "files" / "页面49" / "data.js").read_text() == files["files/页面49/data.js"]
+
+        sequential, parallel = manifests
+        assert len(parallel) == len(files)
+        assert {p: e.sha256 for p, e in sequential.files.items()} == {p: e.sha256 for p, e in parallel.files.items()}
+
+    def test_invalid_update_keeps_existing_files(self, client, auth_headers, upload_dir):
+        """测试更新文件时无效的压缩包不会清空原有原型"""
+        object_id = upload_prototype(client, auth_headers)
+
+        response = client.post(
+            f"/api/projects/{object_id}/update-file",
+            files={"file": ("proto.zip", make_axure_zip({"readme.txt": "hello"}), "application/zip")},
+            headers=auth_headers,
+        )
+        assert response.status_code == 400
+        assert client.get(f"/projects/{object_id}").text == AXURE_FILES["start.html"]
+
+class TestUploadJobs:
+    """异步上传任务测试"""
+
+    @pytest.fixture(autouse=True)
+    def job_sessions(self, monkeypatch):
+        from app.services import jobs
+        monkeypatch.setattr(jobs, "session_factory", TestingSessionLocal)
+
+    def wait_events(self, client, headers, job_id):
+        """读取 SSE 直到任务结束，返回所有事件"""
+        response = client.get(f"/api/projects/jobs/{job_id}/events", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        return [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+
+    def test_async_upload(self, client, auth_headers, upload_dir, db):
+        """测试 Prefer: respond-async 返回 202，后台解压完成后可访问"""
+        response = client.post(
+            "/api/projects/upload",
+            data={"name": "异步上传", "is_public": "true"},
+            files={"file": ("proto.zip", make_axure_zip(AXURE_FILES), "application/zip")},
+            headers={**auth_headers, "Prefer": "respond-async"},
+        )
+        assert response.status_code == 202
+        body = response.json()
+        assert response.headers["location"] == body["status_url"]
+
+        events = self.wait_events(client, auth_headers, body["job_id"])
+        assert events[-1]["status"] == "succeeded"
+        assert events[-1]["progress"] == 100
+        assert client.get(f"/projects/{body['object_id']}").text == AXURE_FILES["start.html"]
+        assert not any((upload_dir / ".jobs").iterdir())
+
+        db.expire_all()
+        status = client.get(body["status_url"], headers=auth_headers).json()
+        assert status["status"] == "succeeded"
+        assert status["object_id"] == body["object_id"]
+
+    def test_failed_job_cleans_up(self, client, auth_headers, upload_dir, db):
+        """测试后台解压失败时删除项目记录和目录"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            for path, content in AXURE_FILES.items():
+                zf.writestr(path, content)
+        # 破坏成员数据：中央目录完整，可以通过上传时的校验，解压时 CRC 校验失败
+        archive = bytearray(buffer.getvalue())
+        archive[archive.index(b"$axure.loadDocument")] ^= 0xFF
+        response = client.post(
+            "/api/projects/upload",
+            data={"name": "异步失败"},
+            files={"file": ("proto.zip", bytes(archive), "application/zip")},
+            headers={**auth_headers, "Prefer": "respond-async"},
+        )
+        assert response.status_code == 202
+        body = response.json()
+
+        events = self.wait_events(client, auth_headers, body["job_id"])
+        assert events[-1]["status"] == "failed"
+        assert events[-1]["error"] == "无效的压缩文件"
+        assert not (upload_dir / body["object_id"]).exists()
+        db.expire_all()
+        assert ProjectService.get_by_object_id(db, body["object_id"]) is None
+
+    def test_job_visible_to_owner_only(self, client, auth_headers, sample_project, upload_dir, db):
+        """测试其他用户无法查看任务"""
+        from app.services.jobs import JobService
+        other = User(name="其他用户", employee_id="other001", password_hash="x", role="developer", status="active")
+        db.add(other)
+        db.commit()
+        job = JobService.create(db, "update", sample_project.object_id, other.id)
+
+        assert client.get(f"/api/projects/jobs/{job.id}", headers=auth_headers).status_code == 403
+        assert client.get("/api/projects/jobs/missing", headers=auth_headers).status_code == 404
+
+    def stale_job(self, db, kind, object_id, user_id, status="running"):
+        """创建一个超过心跳超时的未结束任务（所在进程已退出）"""
+        from app.services.jobs import JobService
+        job = JobService.create(db, kind, object_id, user_id)
+        job.status = status
+        db.commit()
+        db.query(UploadJob).filter(UploadJob.id == job.id).update(
+            {UploadJob.updated_at: datetime.utcnow() - timedelta(hours=1)}, synchronize_session=False
+        )
+        db.commit()
+        return job
+
+    def test_recover_interrupted_upload(self, client, auth_headers, sample_user, upload_dir, db):
+        """测试进程退出后遗留的新建任务标记为失败，删除原型记录、目录和暂存文件"""
+        from app.schemas.schemas import ProjectCreate
+        from app.services.jobs import INTERRUPTED_ERROR, recover_stale_jobs
+        project = ProjectService.create(db, ProjectCreate(name="中断的上传"), sample_user.id)
+        # 解压到一半的版本目录，尚未发布
+        (upload_dir / ".versions" / project.object_id / "1").mkdir(parents=True)
+        job = self.stale_job(db, "upload", project.object_id, sample_user.id, status="pending")
+        (upload_dir / ".jobs").mkdir()
+        (upload_dir / ".jobs" / job.id).write_bytes(b"zip")
+
+        assert recover_stale_jobs(db, projects.cleanup_interrupted_job, 60) == [job.id]
+        db.expire_all()
+        status = client.get(f"/api/projects/jobs/{job.id}", headers=auth_headers).json()
+        assert status["status"] == "failed"
+        assert status["error"] == INTERRUPTED_ERROR
+        assert ProjectService.get_by_object_id(db, project.object_id) is None
+        assert not (upload_dir / ".versions" / project.object_id).exists()
+        assert not (upload_dir / ".jobs" / job.id).exists()
+        # 已结束的任务不再处理
+        assert recover_stale_jobs(db, projects.cleanup_interrupted_job, 60) == []
+
+    def test_recover_published_upload(self, client, auth_headers, upload_dir, db):
+        """测试版本已发布、进程在更新任务状态前退出时任务改为成功"""
+        from app.services.jobs import recover_stale_jobs
+        object_id = upload_prototype(client, auth_headers)
+        project = ProjectService.get_by_object_id(db, object_id)
+        job = self.stale_job(db, "upload", object_id, project.author_id)
+
+        assert recover_stale_jobs(db, projects.cleanup_interrupted_job, 60) == [job.id]
+        db.expire_all()
+        assert db.get(UploadJob, job.id).status == "succeeded"
+        assert ProjectService.get_by_object_id(db, object_id) is not None
+        assert client.get(f"/projects/{object_id}").text == AXURE_FILES["start.html"]
+
+    def test_recover_skips_live_jobs(self, sample_project, upload_dir, db, monkeypatch):
+        """测试本进程持有的任务和仍有心跳的任务不被回收"""
+        from app.services import jobs
+        owned = self.stale_job(db, "update", sample_project.object_id, sample_project.author_id)
+        fresh = jobs.JobService.create(db, "update", sample_project.object_id, sample_project.author_id)
+        monkeypatch.setattr(jobs, "_owned", {owned.id})
+
+        assert jobs.recover_stale_jobs(db, projects.cleanup_interrupted_job, 60) == []
+        jobs.heartbeat(db)
+        db.expire_all()
+        assert db.get(UploadJob, owned.id).updated_at > datetime.utcnow() - timedelta(minutes=1)
+        assert db.get(UploadJob, fresh.id).status == "pending"
+
+    def test_prune_jobs(self, sample_project, db):
+        """测试删除结束超过保留天数的任务记录，未结束的任务保留"""
+        from app.services.jobs import prune_jobs
+        self.stale_job(db, "update", sample_project.object_id, sample_project.author_id, status="failed")
+        old_running = self.stale_job(db, "update", sample_project.object_id, sample_project.author_id)
+        db.query(UploadJob).update(
+            {UploadJob.updated_at: datetime.utcnow() - timedelta(days=10)}, synchronize_session=False
+        )
+        db.commit()
+        running_id = old_running.id
+
+        assert prune_jobs(db, 7) == 1
+        db.expunge_all()
+        assert [job_id for (job_id,) in db.query(UploadJob.id)] == [running_id]
+
+
+class TestChunkedUploads:
+    """分片上传测试"""
+
+    def put_chunk(self, client, headers, session_id, offset, chunk, checksum=None):
+        import hashlib
+        return client.put(
+            f"/api/projects/uploads/{session_id}",
+            params={"offset": offset},
+            content=chunk,
+            headers={**headers, "X-Chunk-SHA256": checksum or hashlib.sha256(chunk).hexdigest()},
+        )
+
+    def test_resumable_upload(self, client, auth_headers, upload_dir):
+        """测试分片上传、偏移量校验、校验和校验和完成上传"""
+        archive = make_axure_zip(AXURE_FILES)
+        response = client.post(
+            "/api/projects/uploads",
+            json={"filename": "proto.zip", "size": len(archive)},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        session_id = response.json()["session_id"]
+        assert response.json()["offset"] == 0
+
+        half = len(archive) // 2
+        assert self.put_chunk(client, auth_headers, session_id, 0, archive[:half]).json()["offset"] == half
+
+        # 偏移量不一致返回 409 和已提交偏移量
+        response = self.put_chunk(client, auth_headers, session_id, 0, archive[:half])
+        assert response.status_code == 409
+        assert response.headers["upload-offset"] == str(half)
+
+        # 校验和不一致时分片作废
+        response = self.put_chunk(client, auth_headers, session_id, half, archive[half:], checksum="0" * 64)
+        assert response.status_code == 400
+        assert client.get(f"/api/projects/uploads/{session_id}", headers=auth_headers).json()["offset"] == half
+
+        # 未上传完成不能完成上传
+        response = client.post(f"/api/projects/uploads/{session_id}/finalize", json={"name": "分片"}, headers=auth_headers)
+        assert response.status_code == 400
+
+        assert self.put_chunk(client, auth_headers, session_id, half, archive[half:]).json()["offset"] == len(archive)
+        response = client.post(
+            f"/api/projects/uploads/{session_id}/finalize",
+            json={"name": "分片上传", "is_public": True},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        object_id = response.json()["object_id"]
+        assert client.get(f"/projects/{object_id}").text == AXURE_FILES["start.html"]
+        assert client.get(f"/api/projects/uploads/{session_id}", headers=auth_headers).status_code == 404
+
+    def test_chunk_beyond_size_rejected(self, client, auth_headers, upload_dir):
+        """测试超出声明大小的分片被拒绝"""
+        response = client.post("/api/projects/uploads", json={"filename": "a.zip", "size": 4}, headers=auth_headers)
+        session_id = response.json()["session_id"]
+        assert self.put_chunk(client, auth_headers, session_id, 0, b"12345").status_code == 400
+        assert client.get(f"/api/projects/uploads/{session_id}", headers=auth_headers).json()["offset"] == 0
+
+    def test_update_via_session(self, client, auth_headers, sample_project, upload_dir):
+        """测试通过分片上传更新原型文件"""
+        archive = make_axure_zip(dict(AXURE_FILES, **{"start.html": "<html>v2</html>"}))
+        response = client.post(
+            "/api/projects/uploads",
+            json={"filename": "proto.zip", "size": len(archive), "object_id": sample_project.object_id},
+            headers=auth_headers,
+        )
+        session_id = response.json()["session_id"]
+        self.put_chunk(client, auth_headers, session_id, 0, archive)
+
+        response = client.post(f"/api/projects/uploads/{session_id}/finalize", headers=auth_headers)
+        assert response.status_code == 200
+        assert client.get(f"/projects/{sample_project.object_id}").text == "<html>v2</html>"
+
+    def test_reap_stale_sessions(self, upload_dir):
+        """测试清理过期的上传会话"""
+        import os
+        import time
+        from app.services.uploads import create_session, data_path, load_session, reap_stale_sessions
+        stale = create_session(str(upload_dir), 1, "a.zip", 10)
+        fresh = create_session(str(upload_dir), 1, "b.zip", 10)
+        old = time.time() - 7200
+        for name in os.listdir(os.path.dirname(data_path(str(upload_dir), stale["id"]))):
+            os.utime(os.path.join(os.path.dirname(data_path(str(upload_dir), stale["id"])), name), (old, old))
+
+        assert reap_stale_sessions(str(upload_dir), 3600) == 1
+        assert load_session(str(upload_dir), stale["id"]) is None
+        assert load_session(str(upload_dir), fresh["id"]) is not None
+        assert load_session(str(upload_dir), "../../etc") is None
+
+
+class TestZipStorageMode:
+    """ZIP 存储模式测试"""
+
+    @pytest.fixture
+    def zip_mode(self, monkeypatch):
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "STORAGE_MODE", "zip")
+
+    def make_zip(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            zf.writestr("proto/index.html", "<html>index</html>", zipfile.ZIP_DEFLATED)
+            zf.writestr("proto/start.html", "<html>start</html>", zipfile.ZIP_DEFLATED)
+            zf.writestr("proto/images/logo.png", bytes(range(256)) * 8, zipfile.ZIP_STORED)
+            zf.writestr("proto/resources/axQuery.js", AXURE_FILES["resources/scripts/axure/axQuery.js"], zipfile.ZIP_DEFLATED)
+        return buffer.getvalue()
+
+    def test_archive_kept_without_extraction(self, client, auth_headers, upload_dir, zip_mode):
+        """测试压缩包原样保存，不解压文件"""
+        object_id = upload_prototype(client, auth_headers, self.make_zip())
+        project_dir = upload_dir / object_id
+        assert (project_dir / ".axhost" / "archive.zip").is_file()
+        assert sorted(p.name for p in project_dir.iterdir()) == [".axhost"]
+
+        manifest = json.loads((project_dir / ".axhost" / "manifest.json").read_text())
+        assert manifest["entry"] == "start.html"
+        assert set(manifest["files"]) == {"index.html", "start.html", "images/logo.png", "resources/axQuery.js"}
+
+        response = client.get(f"/projects/{object_id}")
+        assert response.status_code == 200
+        assert response.text == "<html>start</html>"
+
+    def test_stored_member_range(self, client, auth_headers, upload_dir, zip_mode):
+        """测试 stored 成员按偏移发送并支持区间请求"""
+        object_id = upload_prototype(client, auth_headers, self.make_zip())
+        url = f"/projects/{object_id}/images/logo.png"
+        expected = bytes(range(256)) * 8
+
+        assert client.get(url).content == expected
+        response = client.get(url, headers={"Range": "bytes=100-355"})
+        assert response.status_code == 206
+        assert response.headers["content-range"] == f"bytes 100-355/{len(expected)}"
+        assert response.content == expected[100:356]
+
+    def test_deflated_member_gzip_passthrough(self, client, auth_headers, upload_dir, zip_mode):
+        """测试 deflate 成员直接包装为 gzip 返回，或流式解压返回原文"""
+        object_id = upload_prototype(client, auth_headers, self.make_zip())
+        url = f"/projects/{object_id}/resources/axQuery.js"
+        expected = AXURE_FILES["resources/scripts/axure/axQuery.js"]
+
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert int(response.headers["content-length"]) < len(expected)
+        assert response.text == expected
+
+        response = client.get(url, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+        assert response.headers["content-length"] == str(len(expected))
+        assert response.text == expected
+
+        # deflate 成员忽略 Range，返回完整内容
+        response = client.get(url, headers={"Accept-Encoding": "identity", "Range": "bytes=0-9"})
+        assert response.status_code == 200
+        assert response.text == expected
+
+    def test_find_entry_prefix(self):
+        """测试按中央目录定位入口目录"""
+        from app.services.archive import find_entry_prefix
+        names = [
+            "__MACOSX/a/index.html", "__MACOSX/a/start.html",
+            "a/b/index.html", "a/b/start.html",
+            "a/index.html", "a/start.html",
+        ]
+        assert find_entry_prefix(names) == "a/"
+        assert find_entry_prefix(["index.html", "start.html"]) == ""
+        assert find_entry_prefix(["a/index.html"]) is None
+
+
+class TestAssetMemoryCache:
+    """热点静态资源内存缓存测试"""
+
+    def test_hot_asset_served_from_memory(self, client, auth_headers, upload_dir):
+        """测试第二次请求命中内存缓存，区间请求从缓存切片"""
+        from app.services.delivery import asset_memory_cache
+        object_id = upload_prototype(client, auth_headers)
+        url = f"/projects/{object_id}/data/document.js"
+
+        before = asset_memory_cache.stats()
+        assert client.get(url).text == AXURE_FILES["data/document.js"]
+        stats = asset_memory_cache.stats()
+        assert stats["hits"] - before["hits"] == 0
+        assert stats["misses"] - before["misses"] == 1
+
+        # 命中后不再读取磁盘
+        for path in upload_dir.rglob("document.js"):
+            path.write_text("changed on disk")
+        response = client.get(url, headers={"Range": "bytes=0-5"})
+        assert response.status_code == 206
+        assert response.content == AXURE_FILES["data/document.js"].encode()[:6]
+        assert asset_memory_cache.stats()["hits"] - before["hits"] == 1
+
+        # 不同编码分别缓存
+        client.get(f"/projects/{object_id}/resources/scripts/axure/axQuery.js", headers={"Accept-Encoding": "gzip"})
+        client.get(f"/projects/{object_id}/resources/scripts/axure/axQuery.js", headers={"Accept-Encoding": "identity"})
+        assert asset_memory_cache.stats()["misses"] - before["misses"] == 3
+
+    def test_cache_stats_endpoint(self, client):
+        """测试缓存统计端点"""
+        response = client.get("/api/health/cache")
+        assert response.status_code == 200
+        assert set(response.json()["asset_cache"]) >= {"hits", "misses", "evictions", "bytes"}
+
+    def test_byte_budget_eviction(self):
+        """测试按字节预算淘汰和单个对象上限"""
+        from app.core.cache import ByteBudgetCache
+        cache = ByteBudgetCache(max_bytes=10, max_item_size=6)
+
+        cache.get_or_load("a", lambda: b"aaaa")
+        cache.get_or_load("b", lambda: b"bbbb")
+        cache.get_or_load("a", lambda: b"")
+        cache.get_or_load("c", lambda: b"cccc")
+        assert "b" not in cache
+        assert "a" in cache and "c" in cache
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["bytes"] == 8
+
+        assert cache.get_or_load("big", lambda: b"x" * 7) == b"x" * 7
+        assert "big" not in cache
+
+    def test_single_flight(self):
+        """测试并发未命中只加载一次"""
+        import threading
+        from app.core.cache import ByteBudgetCache
+        cache = ByteBudgetCache(max_bytes=1024, max_item_size=1024)
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return b"value"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert results == [b"value"] * 5
+        assert len(calls) == 1
+        assert cache.stats()["misses"] == 1
+
+
+class TestProjectVersions:
+    """原型版本目录测试"""
+
+    def update(self, client, auth_headers, object_id, files):
+        return client.post(
+            f"/api/projects/{object_id}/update-file",
+            files={"file": ("proto.zip", make_axure_zip(files), "application/zip")},
+            headers=auth_headers,
+        )
+
+    def test_update_publishes_new_version(self, client, auth_headers, upload_dir, db):
+        """测试更新文件解压到新版本目录后切换，已缓存的元数据仍完整读取旧版本"""
+        from app.routers.projects import get_project_meta
+        object_id = upload_prototype(client, auth_headers, {**AXURE_FILES, "start.html": "v1"})
+        old_meta = get_project_meta(db, object_id)
+
+        response = self.update(client, auth_headers, object_id, {**AXURE_FILES, "start.html": "v2"})
+        assert response.status_code == 200
+        assert (upload_dir / object_id).is_symlink()
+        assert os.readlink(upload_dir / object_id) == os.path.join(".versions", object_id, "2")
+        with open(os.path.join(old_meta.project_dir, "start.html")) as f:
+            assert f.read() == "v1"
+        assert client.get(f"/projects/{object_id}").text == "v2"
+
+        # 无效的压缩包不产生新版本
+        assert self.update(client, auth_headers, object_id, {"readme.txt": "hello"}).status_code == 400
+        body = client.get(f"/api/projects/{object_id}/versions", headers=auth_headers).json()
+        assert body["current"] == 2
+        assert [item["version"] for item in body["versions"]] == [2, 1]
+
+    def test_rollback(self, client, auth_headers, upload_dir):
+        """测试回滚到历史版本"""
+        object_id = upload_prototype(client, auth_headers, {**AXURE_FILES, "start.html": "v1"})
+        self.update(client, auth_headers, object_id, {**AXURE_FILES, "start.html": "v2"})
+
+        response = client.post(f"/api/projects/{object_id}/versions/1/rollback", headers=auth_headers)
+        assert response.status_code == 200
+        assert client.get(f"/projects/{object_id}").text == "v1"
+
+        response = client.post(f"/api/projects/{object_id}/versions/9/rollback", headers=auth_headers)
+        assert response.status_code == 404
+
+    def test_delete_removes_versions(self, client, auth_headers, upload_dir):
+        """测试删除原型时删除全部版本目录"""
+        object_id = upload_prototype(client, auth_headers, {**AXURE_FILES, "start.html": "v1"})
+        self.update(client, auth_headers, object_id, {**AXURE_FILES, "start.html": "v2"})
+
+        assert client.delete(f"/api/projects/{object_id}", headers=auth_headers).status_code == 200
+        assert not os.path.lexists(upload_dir / object_id)
+        assert not (upload_dir / ".versions" / object_id).exists()
+
+    def test_reap_versions_and_legacy_layout(self, upload_dir):
+        """测试旧布局目录转为版本 0，超出保留数量且过了宽限期的旧版本被清理"""
+        from app.services.versions import create_version, list_versions, publish, reap_versions
+        legacy = upload_dir / "p"
+        legacy.mkdir()
+        (legacy / "start.html").write_text("legacy")
+
+        for _ in range(3):
+            publish(str(upload_dir), "p", create_version(str(upload_dir), "p"))
+        assert list_versions(str(upload_dir), "p") == [0, 1, 2, 3]
+        assert (upload_dir / ".versions" / "p" / "0" / "start.html").read_text() == "legacy"
+
+        assert reap_versions(str(upload_dir), "p", keep=1, grace=3600) == []
+        assert reap_versions(str(upload_dir), "p", keep=1, grace=0) == [0, 1]
+        assert list_versions(str(upload_dir), "p") == [2, 3]
+
+
+class TestDeltaSync:
+    """增量同步测试"""
+
+    def sha256(self, content):
+        import hashlib
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def start_sync(self, client, auth_headers, object_id, files):
+        response = client.post(
+            f"/api/projects/{object_id}/sync",
+            json={"files": {path: self.sha256(content) for path, content in files.items()}},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    def test_sync_uploads_only_changed_files(self, client, auth_headers, upload_dir):
+        """测试只上传变化的文件，未变化的文件连同预压缩副本从当前版本硬链接"""
+        object_id = upload_prototype(client, auth_headers)
+        files = {**AXURE_FILES, "start.html": "<html>v2</html>", "page1.html": "<html>page1</html>"}
+        body = self.start_sync(client, auth_headers, object_id, files)
+        assert body["missing"] == ["page1.html", "start.html"]
+        assert body["reused"] == 3
+        sync_url = f"/api/projects/{object_id}/sync/{body['sync_id']}"
+
+        response = client.put(f"{sync_url}/files/start.html", content=b"tampered", headers=auth_headers)
+        assert response.status_code == 400
+        response = client.post(f"{sync_url}/commit", headers=auth_headers)
+        assert response.status_code == 409
+        assert response.json()["missing"] == ["page1.html", "start.html"]
+
+        for path in body["missing"]:
+            response = client.put(f"{sync_url}/files/{path}", content=files[path].encode(), headers=auth_headers)
+            assert response.status_code == 200
+        response = client.post(f"{sync_url}/commit", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["version"] == 2
+
+        assert client.get(f"/projects/{object_id}").text == "<html>v2</html>"
+        assert client.get(f"/projects/{object_id}/page1.html").text == "<html>page1</html>"
+        versions = upload_dir / ".versions" / object_id
+        script = "resources/scripts/axure/axQuery.js"
+        assert (versions / "1" / script).stat().st_ino == (versions / "2" / script).stat().st_ino
+        response = client.get(f"/projects/{object_id}/{script}", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.text == AXURE_FILES[script]
+
+    def test_invalid_manifest_rejected(self, client, auth_headers, upload_dir):
+        """测试清单路径越界或缺少入口文件时拒绝"""
+        object_id = upload_prototype(client, auth_headers)
+        for files in [{"../start.html": "x", "index.html": "x"}, {"start.html": "x"}]:
+            response = client.post(
+                f"/api/projects/{object_id}/sync",
+                json={"files": {path: self.sha256(content) for path, content in files.items()}},
+                headers=auth_headers,
+            )
+            assert response.status_code == 400
+
+    def test_sync_from_zip_storage(self, client, auth_headers, upload_dir, monkeypatch):
+        """测试当前版本为 ZIP 存储时从压缩包解出未变化的文件"""
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "STORAGE_MODE", "zip")
+        object_id = upload_prototype(client, auth_headers)
+        files = {**AXURE_FILES, "start.html": "<html>v2</html>"}
+        body = self.start_sync(client, auth_headers, object_id, files)
+        assert body["missing"] == ["start.html"]
+
+        sync_url = f"/api/projects/{object_id}/sync/{body['sync_id']}"
+        client.put(f"{sync_url}/files/start.html", content=files["start.html"].encode(), headers=auth_headers)
+        assert client.post(f"{sync_url}/commit", headers=auth_headers).status_code == 200
+        assert client.get(f"/projects/{object_id}/data/document.js").text == AXURE_FILES["data/document.js"]
+
+
+class TestBlobStore:
+    """去重存储测试"""
+
+    @pytest.fixture
+    def blob_store(self, monkeypatch):
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "BLOB_STORE_ENABLED", True)
+
+    def test_identical_files_shared_and_released(self, client, auth_headers, upload_dir, sample_admin, blob_store):
+        """测试相同内容在原型间共享一份，删除最后一个引用的原型后释放"""
+        from app.services.blobs import blob_path
+        from app.services.manifest import hash_file
+        from app.services.trash import purge_trash
+        first = upload_prototype(client, auth_headers, {**AXURE_FILES, "start.html": "first"})
+        second = upload_prototype(client, auth_headers, {**AXURE_FILES, "start.html": "second"})
+        script = "resources/scripts/axure/axQuery.js"
+        assert (upload_dir / first / script).stat().st_ino == (upload_dir / second / script).stat().st_ino
+        assert client.get(f"/projects/{second}/{script}").text == AXURE_FILES[script]
+
+        admin_headers = {"Authorization": f"Bearer {create_access_token({'sub': str(sample_admin.id)})}"}
+        assert client.get("/api/projects/storage/blobs", headers=auth_headers).status_code == 403
+        stats = client.get("/api/projects/storage/blobs", headers=admin_headers).json()
+        assert stats["saved_bytes"] == sum(len(content) for path, content in AXURE_FILES.items() if path != "start.html")
+
+        blob = blob_path(str(upload_dir), hash_file(str(upload_dir / first / script)))
+        client.delete(f"/api/projects/{first}", headers=auth_headers)
+        purge_trash(str(upload_dir))
+        assert os.path.exists(blob)
+        client.delete(f"/api/projects/{second}", headers=auth_headers)
+        purge_trash(str(upload_dir))
+        assert not os.path.exists(blob)
+
+
+class TestStorageReaper:
+    """后台删除与残留目录清理测试"""
+
+    def test_delete_moves_to_trash(self, client, auth_headers, upload_dir):
+        """测试删除原型只把版本目录移入回收区，由后台清空"""
+        from app.services.trash import purge_trash, trash_items
+        object_id = upload_prototype(client, auth_headers)
+
+        assert client.delete(f"/api/projects/{object_id}", headers=auth_headers).status_code == 200
+        assert not os.path.lexists(upload_dir / object_id)
+        assert not (upload_dir / ".versions" / object_id).exists()
+        purge_trash(str(upload_dir))
+        assert trash_items(str(upload_dir)) == []
+
+    def test_reaper_removes_orphans(self, upload_dir, sample_project):
+        """测试默认只报告孤儿目录；确认后清理没有原型记录的目录和 _temp_extract 残留，较新的目录暂不清理"""
+        from app.services.trash import last_report, run_reaper
+        old = time.time() - 7200
+        orphan = upload_dir / "orphan"
+        (orphan / "data").mkdir(parents=True)
+        (orphan / "data" / "document.js").write_text("x" * 100)
+        temp_dir = upload_dir / sample_project.object_id / "_temp_extract"
+        temp_dir.mkdir(parents=True)
+        (upload_dir / ".versions" / "gone" / "1").mkdir(parents=True)
+        for path in [orphan, temp_dir, upload_dir / ".versions" / "gone"]:
+            os.utime(path, (old, old))
+        (upload_dir / "fresh").mkdir()
+        expected = sorted([".versions/gone", "orphan", f"{sample_project.object_id}/_temp_extract"])
+
+        report = run_reaper(str(upload_dir), lambda: {sample_project.object_id})
+        assert sorted(report["orphans"]) == expected
+        assert report["orphans_reaped"] is False
+        assert orphan.exists() and temp_dir.exists()
+
+        report = run_reaper(str(upload_dir), lambda: {sample_project.object_id}, reap_orphans=True)
+        assert sorted(report["orphans"]) == expected
+        assert report["orphans_reaped"] is True
+        assert report["bytes"] == 100
+        assert not orphan.exists() and not temp_dir.exists()
+        assert (upload_dir / "fresh").exists()
+        assert (upload_dir / sample_project.object_id).exists()
+        assert last_report(str(upload_dir))["orphans"] == report["orphans"]
+
+    def test_reaper_skips_empty_projects_table(self, upload_dir):
+        """测试 projects 表为空（空库、数据库配置错误）时不检查孤儿目录"""
+        from app.services.trash import run_reaper
+        old = time.time() - 7200
+        (upload_dir / "prototype" / "data").mkdir(parents=True)
+        os.utime(upload_dir / "prototype", (old, old))
+
+        report = run_reaper(str(upload_dir), lambda: set(), lambda: set(), reap_orphans=True)
+        assert report["orphans"] == []
+        assert report["orphans_skipped"] is True
+        assert (upload_dir / "prototype").exists()
+
+    def test_reaper_removes_staged_uploads(self, upload_dir, sample_project):
+        """测试清理没有未结束任务的上传暂存文件，进行中任务的文件和较新的文件保留"""
+        from app.services.trash import run_reaper
+        old = time.time() - 7200
+        staging = upload_dir / ".jobs"
+        staging.mkdir()
+        for name in ["interrupted", "running", "fresh"]:
+            (staging / name).write_bytes(b"x" * 10)
+        for name in ["interrupted", "running"]:
+            os.utime(staging / name, (old, old))
+
+        report = run_reaper(str(upload_dir), lambda: {sample_project.object_id}, lambda: {"running"})
+        assert report["staged"] == [".jobs/interrupted"]
+        assert sorted(os.listdir(staging)) == ["fresh", "running"]
+
+
+class FakeS3Error(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3Body:
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self):
+        return self.stream.read()
+
+    def iter_chunks(self, chunk_size):
+        while chunk := self.stream.read(chunk_size):
+            yield chunk
+
+    def close(self):
+        pass
+
+
+class FakeS3Client:
+    """内存中的 S3 客户端，实现 S3Storage 用到的接口"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_file(self, path, bucket, key):
+        with open(path, "rb") as f:
+            self.objects[key] = (f.read(), time.time())
+
+    def put_object(self, Bucket, Key, Body, IfNoneMatch=None):
+        if IfNoneMatch == "*" and Key in self.objects:
+            raise FakeS3Error("PreconditionFailed")
+        self.objects[Key] = (Body, time.time())
+
+    def get_object(self, Bucket, Key, Range=None):
+        if Key not in self.objects:
+            raise FakeS3Error("NoSuchKey")
+        data = self.objects[Key][0]
+        if Range:
+            start, end = Range[len("bytes="):].split("-")
+            data = data[int(start):int(end) + 1]
+        return {"Body": FakeS3Body(data)}
+
+    def head_object(self, Bucket, Key):
+        from datetime import datetime, timezone
+        if Key not in self.objects:
+            raise FakeS3Error("404")
+        data, mtime = self.objects[Key]
+        return {"ContentLength": len(data), "LastModified": datetime.fromtimestamp(mtime, tz=timezone.utc)}
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix, Delimiter=None):
+        keys = sorted(key for key in self.objects if key.startswith(Prefix))
+        if Delimiter is None:
+            yield {"Contents": [{"Key": key} for key in keys]}
+            return
+        prefixes = sorted({Prefix + key[len(Prefix):].split(Delimiter)[0] + Delimiter
+                           for key in keys if Delimiter in key[len(Prefix):]})
+        yield {"CommonPrefixes": [{"Prefix": prefix} for prefix in prefixes]}
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            self.objects.pop(item["Key"], None)
+
+
+class TestStorageBackend:
+    """存储后端测试（fs 与 S3 兼容对象存储）"""
+
+    @pytest.fixture(params=["fs", "s3"])
+    def backend(self, request, tmp_path, monkeypatch):
+        from app.core.config import settings
+        from app.services import storage
+        if request.param == "fs":
+            backend = storage.LocalStorage(str(tmp_path / "remote"))
+        else:
+            backend = storage.S3Storage("axhost", "prototypes", client=FakeS3Client())
+        monkeypatch.setattr(settings, "STORAGE_BACKEND", request.param)
+        monkeypatch.setattr(storage, "_backend", backend)
+        return backend
+
+    def test_backend_operations(self, backend):
+        """测试后端的读写、区间读取、列举和按前缀删除"""
+        backend.put_bytes("p/1/a.txt", b"0123456789")
+        backend.put_bytes("p/1/sub/b.txt", b"b")
+        backend.put_bytes("p/2/a.txt", b"x")
+        backend.put_bytes("p2/1/a.txt", b"y")
+
+        assert backend.get_bytes("p/1/a.txt") == b"0123456789"
+        assert b"".join(backend.iter_range("p/1/a.txt", 2, 5, chunk_size=2)) == b"23456"
+        assert backend.stat("p/1/a.txt").size == 10
+        assert backend.list("p/1") == ["p/1/a.txt", "p/1/sub/b.txt"]
+        assert backend.list_dirs("p") == ["1", "2"]
+        with pytest.raises(FileNotFoundError):
+            backend.get_bytes("p/3/a.txt")
+        with pytest.raises(FileNotFoundError):
+            backend.stat("p/3/a.txt")
+
+        assert backend.delete_prefix("p") == 3
+        assert backend.list("p") == []
+        assert backend.get_bytes("p2/1/a.txt") == b"y"
+
+        assert backend.put_bytes_if_absent("p/claim", b"1") is True
+        assert backend.put_bytes_if_absent("p/claim", b"2") is False
+        assert backend.get_bytes("p/claim") == b"1"
+
+    def test_incomplete_backend(self):
+        """测试缺少方法的后端在创建时即报错"""
+        from app.services.storage import LocalStorage, StorageBackend
+
+        class PartialStorage(StorageBackend):
+            def put_bytes(self, key, data):
+                pass
+
+        with pytest.raises(TypeError):
+            PartialStorage()
+        assert isinstance(LocalStorage("/tmp"), StorageBackend)
+
+    def test_concurrent_publish_versions(self, backend, tmp_path, monkeypatch):
+        """测试两个节点基于同一份版本列表同时发布时认领到不同的版本号"""
+        from app.services import storage
+        from app.services.manifest import build_manifest
+        monkeypatch.setattr(storage, "remote_versions", lambda backend, object_id: [])
+        versions = []
+        for content in (b"first", b"second"):
+            version_dir = tmp_path / content.decode()
+            version_dir.mkdir()
+            (version_dir / "index.html").write_bytes(content)
+            versions.append(storage.upload_version(backend, "p", str(version_dir), build_manifest(str(version_dir))))
+        assert versions == [1, 2]
+        assert backend.get_bytes("p/1/index.html") == b"first"
+        assert backend.get_bytes("p/2/index.html") == b"second"
+
+    def test_serve_update_and_rollback(self, client, auth_headers, upload_dir, backend):
+        """测试版本上传到后端后本机不保留，页面、区间和预压缩副本从后端读取，可回滚和删除"""
+        object_id = upload_prototype(client, auth_headers, {**AXURE_FILES, "start.html": "v1"})
+        assert not os.path.lexists(upload_dir / object_id)
+        assert backend.list(f"{object_id}/1")
+        assert client.get(f"/projects/{object_id}").text == "v1"
+
+        script = "resources/scripts/axure/axQuery.js"
+        response = client.get(f"/projects/{object_id}/{script}", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.text == AXURE_FILES[script]
+        response = client.get(f"/projects/{object_id}/{script}", headers={"Range": "bytes=0-3", "Accept-Encoding": "identity"})
+        assert response.status_code == 206
+        assert response.content == AXURE_FILES[script].encode()[:4]
+
+        response = client.post(
+            f"/api/projects/{object_id}/update-file",
+            files={"file": ("proto.zip", make_axure_zip({**AXURE_FILES, "start.html": "v2"}), "application/zip")},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        assert client.get(f"/projects/{object_id}").text == "v2"
+        body = client.get(f"/api/projects/{object_id}/versions", headers=auth_headers).json()
+        assert body["current"] == 2
+        assert [item["version"] for item in body["versions"]] == [2, 1]
+
+        assert client.post(f"/api/projects/{object_id}/versions/1/rollback", headers=auth_headers).status_code == 200
+        assert client.get(f"/projects/{object_id}").text == "v1"
+
+        assert client.delete(f"/api/projects/{object_id}", headers=auth_headers).status_code == 200
+        deadline = time.time() + 5
+        while backend.list(object_id) and time.time() < deadline:
+            time.sleep(0.05)
+        assert backend.list(object_id) == []
+
+    def test_sync_reuses_remote_files(self, client, auth_headers, upload_dir, backend):
+        """测试增量同步从后端取回未变化的文件"""
+        import hashlib
+        object_id = upload_prototype(client, auth_headers)
+        files = {**AXURE_FILES, "start.html": "<html>v2</html>"}
+        response = client.post(
+            f"/api/projects/{object_id}/sync",
+            json={"files": {path: hashlib.sha256(content.encode()).hexdigest() for path, content in files.items()}},
+            headers=auth_headers,
+        )
+        body = response.json()
+        assert body["missing"] == ["start.html"]
+
+        sync_url = f"/api/projects/{object_id}/sync/{body['sync_id']}"
+        client.put(f"{sync_url}/files/start.html", content=files["start.html"].encode(), headers=auth_headers)
+        response = client.post(f"{sync_url}/commit", headers=auth_headers)
+        assert response.json()["version"] == 2
+        assert client.get(f"/projects/{object_id}").text == "<html>v2</html>"
+        assert client.get(f"/projects/{object_id}/data/document.js").text == AXURE_FILES["data/document.js"]
+
+    def test_zip_storage_mode(self, client, auth_headers, upload_dir, backend, monkeypatch):
+        """测试 ZIP 存储模式的压缩包上传到后端，压缩成员按区间读取"""
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "STORAGE_MODE", "zip")
+        object_id = upload_prototype(client, auth_headers)
+        assert client.get(f"/projects/{object_id}").text == AXURE_FILES["start.html"]
+
+        script = "resources/scripts/axure/axQuery.js"
+        for encoding in ["gzip", "identity"]:
+            response = client.get(f"/projects/{object_id}/{script}", headers={"Accept-Encoding": encoding})
+            assert response.status_code == 200
+            assert response.text == AXURE_FILES[script]
+
+
+class TestStorageQuotas:
+    """存储用量与配额测试"""
+
+    def test_usage_recorded_from_manifest(self, client, auth_headers, upload_dir, db, sample_admin, monkeypatch):
+        """测试上传和更新时按清单记录用量，未统计的旧原型由后台任务补齐"""
+        from app.services import quotas
+        monkeypatch.setattr(quotas, "session_factory", TestingSessionLocal)
+        from app.services.manifest import load_manifest
+        from app.services.quotas import manifest_usage
+        object_id = upload_prototype(client, auth_headers)
+        body = client.get(f"/api/projects/{object_id}", headers=auth_headers).json()
+        assert body["file_count"] == len(AXURE_FILES)
+        assert body["storage_bytes"] == manifest_usage(load_manifest(str(upload_dir / object_id)))[1]
+        assert body["storage_bytes"] >= sum(len(content) for content in AXURE_FILES.values())
+
+        client.post(
+            f"/api/projects/{object_id}/update-file",
+            files={"file": ("proto.zip", make_axure_zip({"index.html": "x", "start.html": "y"}), "application/zip")},
+            headers=auth_headers,
+        )
+        items = client.get("/api/projects", headers=auth_headers).json()["items"]
+        assert (items[0]["file_count"], items[0]["storage_bytes"]) == (2, 2)
+
+        # 旧原型没有用量记录：查看用量只读取已记录的值，补齐由后台任务完成
+        legacy = Project(object_id="legacy", name="旧原型", author_id=sample_admin.id, is_public=True)
+        db.add(legacy)
+        db.commit()
+        (upload_dir / "legacy").mkdir()
+        (upload_dir / "legacy" / "start.html").write_text("legacy")
+        admin_headers = {"Authorization": f"Bearer {create_access_token({'sub': str(sample_admin.id)})}"}
+        assert client.get("/api/projects/storage/usage", headers=auth_headers).status_code == 403
+        body = client.get("/api/projects/storage/usage", headers=admin_headers).json()
+        assert (body["total_files"], body["uncounted"]) == (2, 1)
+        assert [item["object_id"] for item in body["projects"]] == [object_id, "legacy"]
+        assert not (upload_dir / "legacy" / ".axhost").exists()
+
+        assert client.post("/api/projects/storage/usage/backfill", headers=auth_headers).status_code == 403
+        assert client.post("/api/projects/storage/usage/backfill", headers=admin_headers).status_code == 202
+        deadline = time.time() + 5
+        while (quotas.backfill_running() or quotas.uncounted_projects(db)) and time.time() < deadline:
+            time.sleep(0.05)
+        db.expire_all()
+        body = client.get("/api/projects/storage/usage", headers=admin_headers).json()
+        assert (body["total_files"], body["uncounted"]) == (3, 0)
+        assert [item["object_id"] for item in body["projects"]] == ["legacy", object_id]
+        assert {item["author_name"]: item["storage_bytes"] for item in body["users"]} == {"管理员": 6, "测试用户": 2}
+
+    def test_project_quota(self, client, auth_headers, upload_dir, db, monkeypatch):
+        """测试超出单个原型配额时在解压前拒绝，更新被拒绝时当前版本保持不变"""
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "PROJECT_QUOTA_BYTES", 1024)
+        big = {**AXURE_FILES, "data/big.js": "x" * 4096}
+        upload_prototype(client, auth_headers, big, status_code=413)
+        assert db.query(Project).count() == 0
+        assert not (upload_dir / ".versions").exists() or not any((upload_dir / ".versions").iterdir())
+
+        object_id = upload_prototype(client, auth_headers, {"index.html": "a", "start.html": "b"})
+        response = client.post(
+            f"/api/projects/{object_id}/update-file",
+            files={"file": ("proto.zip", make_axure_zip(big), "application/zip")},
+            headers=auth_headers,
+        )
+        assert response.status_code == 413
+        assert client.get(f"/projects/{object_id}").text == "b"
+
+        # 增量同步上传的单个文件超出配额时在接收过程中拒绝
+        import hashlib
+        content = b"x" * 4096
+        sync = client.post(
+            f"/api/projects/{object_id}/sync",
+            json={"files": {"index.html": hashlib.sha256(b"a").hexdigest(), "start.html": hashlib.sha256(content).hexdigest()}},
+            headers=auth_headers,
+        ).json()
+        response = client.put(
+            f"/api/projects/{object_id}/sync/{sync['sync_id']}/files/start.html", content=content, headers=auth_headers
+        )
+        assert response.status_code == 413
+
+    def test_user_quota(self, client, auth_headers, upload_dir, monkeypatch):
+        """测试用户配额计入名下其他原型，分片上传在上传前按声明的大小拒绝"""
+        from app.core.config import settings
+        files = {"index.html": "a" * 600, "start.html": "b" * 600}
+        monkeypatch.setattr(settings, "PRECOMPRESS_ENABLED", False)
+        monkeypatch.setattr(settings, "USER_QUOTA_BYTES", 2000)
+        object_id = upload_prototype(client, auth_headers, files)
+        upload_prototype(client, auth_headers, files, status_code=413)
+
+        # 更新已有原型时其当前用量会被替换，不重复计算
+        response = client.post(
+            f"/api/projects/{object_id}/update-file",
+            files={"file": ("proto.zip", make_axure_zip(files), "application/zip")},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+
+        response = client.post("/api/projects/uploads", json={"filename": "proto.zip", "size": 5000}, headers=auth_headers)
+        assert response.status_code == 413
+
+
+class TestProjectListQueries:
+    """项目列表查询次数测试"""
+
+    def count_queries(self, client, db, url, headers):
+        # 清空会话，避免身份映射中已加载的对象掩盖懒加载
+        db.expunge_all()
+        statements = []
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            response = client.get(url, headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert response.status_code == 200
+        return response.json(), len(statements)
+
+    def test_constant_query_count(self, client, db, sample_user, auth_headers):
+        """测试列表和详情的查询次数不随条数增长（作者、标签预加载）"""
+        from app.schemas.schemas import ProjectCreate
+        authors = [sample_user]
+        for i in range(3):
+            author = User(name=f"作者{i}", employee_id=f"author{i}", password_hash="x", role="product_manager")
+            db.add(author)
+            db.commit()
+            authors.append(author)
+        for i in range(20):
+            ProjectService.create(
+                db,
+                ProjectCreate(name=f"原型{i}", is_public=True, tag_names=[f"标签{i % 4}", f"标签{i % 3 + 4}"]),
+                authors[i % len(authors)].id,
+            )
+
+        small, small_queries = self.count_queries(client, db, "/api/projects?per_page=2", auth_headers)
+        large, large_queries = self.count_queries(client, db, "/api/projects?per_page=20", auth_headers)
+        assert len(small["items"]) == 2 and len(large["items"]) == 20
+        assert small_queries == large_queries
+        assert all(len(item["tags"]) == 2 and item["author_name"] != "未知" for item in large["items"])
+
+        object_id = large["items"][0]["object_id"]
+        detail, detail_queries = self.count_queries(client, db, f"/api/projects/{object_id}", auth_headers)
+        assert len(detail["tags"]) == 2
+        assert detail_queries <= small_queries
+
+    def test_granted_projects_filter(self, client, db, sample_user, auth_headers):
+        """测试非管理员列表按授权记录过滤，重复验证密码不产生重复授权"""
+        from app.schemas.schemas import ProjectCreate
+        author = User(name="作者", employee_id="author", password_hash="x", role="product_manager")
+        db.add(author)
+        db.commit()
+        private = [
+            ProjectService.create(db, ProjectCreate(name=f"私有{i}", is_public=False, view_password="pw"), author.id)
+            for i in range(3)
+        ]
+        ProjectService.create(db, ProjectCreate(name="公开", is_public=True), author.id)
+
+        for _ in range(2):
+            response = client.post(f"/api/projects/{private[0].object_id}/verify", json={"password": "pw"}, headers=auth_headers)
+            assert response.status_code == 200
+        assert db.query(ProjectAccess).filter(ProjectAccess.user_id == sample_user.id).count() == 1
+
+        names = {item["name"] for item in client.get("/api/projects", headers=auth_headers).json()["items"]}
+        assert names == {"私有0", "公开"}
+        projects, total = ProjectService.list_accessible(db, sample_user)
+        assert total == 2
+
+
+class TestCursorPagination:
+    """游标分页测试"""
+
+    def walk(self, client, url, headers):
+        items, cursor = [], ""
+        while cursor is not None:
+            response = client.get(f"{url}&cursor={cursor}", headers=headers)
+            assert response.status_code == 200
+            data = response.json()
+            items.extend(data["items"])
+            cursor = data["next_cursor"]
+        return items
+
+    def test_cursor_codec(self, db):
+        """测试游标编解码（还原时间类型）及无效游标"""
+        from datetime import datetime
+        from app.services.pagination import InvalidCursor, decode_cursor, encode_cursor
+        columns = [Project.updated_at, Project.id]
+        now = datetime(2026, 5, 1, 12, 30, 15, 123456)
+        assert decode_cursor(encode_cursor([now, 42]), columns) == [now, 42]
+        for cursor in ["???", encode_cursor([1]), encode_cursor(["not-a-date", 1])]:
+            with pytest.raises(InvalidCursor):
+                decode_cursor(cursor, columns)
+
+    def test_project_cursor_pages(self, client, db, sample_user, auth_headers):
+        """测试按游标遍历项目列表无重复无遗漏，翻页期间的更新不影响后续页"""
+        from datetime import datetime, timedelta
+        from app.schemas.schemas import ProjectCreate
+        base = datetime(2026, 1, 1)
+        created = []
+        for i in range(7):
+            project = ProjectService.create(db, ProjectCreate(name=f"原型{i}", is_public=True), sample_user.id)
+            # 部分项目更新时间相同，依靠 id 区分先后
+            project.updated_at = base + timedelta(minutes=i // 2)
+            created.append(project)
+        db.commit()
+        expected = [p.object_id for p in sorted(created, key=lambda p: (p.updated_at, p.id), reverse=True)]
+
+        assert [item["object_id"] for item in self.walk(client, "/api/projects?per_page=3", auth_headers)] == expected
+        page = client.get("/api/projects?per_page=3&page=1", headers=auth_headers).json()
+        assert "next_cursor" not in page and [item["object_id"] for item in page["items"]] == expected[:3]
+
+        first = client.get("/api/projects?per_page=3&cursor=", headers=auth_headers).json()
+        assert first["total"] == 7 and [item["object_id"] for item in first["items"]] == expected[:3]
+        # 已看过的项目被更新后移到列表最前，不会在后续页中重复出现，后续页也不会漏掉项目
+        touched = db.query(Project).filter(Project.object_id == expected[0]).first()
+        touched.updated_at = base + timedelta(days=1)
+        db.commit()
+        cursor, rest = first["next_cursor"], []
+        while cursor:
+            data = client.get(f"/api/projects?per_page=3&cursor={cursor}", headers=auth_headers).json()
+            rest.extend(item["object_id"] for item in data["items"])
+            cursor = data["next_cursor"]
+        assert rest == expected[3:]
+
+        response = client.get("/api/projects?cursor=invalid", headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_user_cursor_pages(self, client, db, sample_admin):
+        """测试用户列表游标分页按 ID 升序遍历"""
+        for i in range(4):
+            db.add(User(name=f"用户{i}", employee_id=f"user{i}", password_hash="x", role="developer"))
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(sample_admin.id)})}"}
+
+        ids = [item["id"] for item in self.walk(client, "/api/users?per_page=2", headers)]
+        assert ids == sorted(ids) and len(ids) == 5
+        page = client.get("/api/users?per_page=2&page=2", headers=headers).json()
+        assert [item["id"] for item in page["items"]] == ids[2:4]
+
+
+class TestListCounts:
+    """项目列表计数方式测试"""
+
+    def fetch(self, client, url, headers):
+        statements = []
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement.lower())
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            response = client.get(url, headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert response.status_code == 200
+        return response.json(), sum("count(" in statement for statement in statements)
+
+    def test_cached_count(self, client, db, sample_user, auth_headers):
+        """测试缓存的总数命中时不再执行 COUNT，项目写操作提交后失效"""
+        from app.schemas.schemas import ProjectCreate
+        from app.services.counts import list_count_cache
+        list_count_cache.clear()
+        for i in range(3):
+            ProjectService.create(db, ProjectCreate(name=f"原型{i}", is_public=True), sample_user.id)
+
+        data, counts = self.fetch(client, "/api/projects?count=cached", auth_headers)
+        assert (data["total"], data["count_strategy"], counts) == (3, "exact", 1)
+        data, counts = self.fetch(client, "/api/projects?count=cached", auth_headers)
+        assert (data["total"], data["count_strategy"], counts) == (3, "cached", 0)
+        # 不同筛选条件分别缓存
+        data, _ = self.fetch(client, "/api/projects?count=cached&search=1", auth_headers)
+        assert (data["total"], data["count_strategy"]) == (1, "exact")
+
+        ProjectService.create(db, ProjectCreate(name="新原型", is_public=True), sample_user.id)
+        data, counts = self.fetch(client, "/api/projects?count=cached", auth_headers)
+        assert (data["total"], data["count_strategy"], counts) == (4, "exact", 1)
+
+        # 未提交（回滚）的写操作不使缓存失效
+        self.fetch(client, "/api/projects?count=cached", auth_headers)
+        db.add(Project(object_id=generate_object_id(), name="回滚", author_id=sample_user.id, is_public=True))
+        db.flush()
+        db.rollback()
+        data, _ = self.fetch(client, "/api/projects?count=cached", auth_headers)
+        assert (data["total"], data["count_strategy"]) == (4, "cached")
+
+    def test_cached_count_after_grants(self, client, db, sample_user, auth_headers):
+        """测试授权（INSERT ... ON CONFLICT）和撤销授权（批量 DELETE）后缓存的总数失效"""
+        from app.schemas.schemas import ProjectCreate
+        from app.services.counts import list_count_cache
+        list_count_cache.clear()
+        author = User(name="作者", employee_id="author", password_hash="x", role="product_manager")
+        db.add(author)
+        db.commit()
+        private = ProjectService.create(db, ProjectCreate(name="私有", is_public=False, view_password="pw"), author.id)
+
+        assert self.fetch(client, "/api/projects?count=cached", auth_headers)[0]["total"] == 0
+        assert self.fetch(client, "/api/projects?count=cached", auth_headers)[0]["count_strategy"] == "cached"
+        ProjectService.grant_access(db, private.id, sample_user.id)
+        data, _ = self.fetch(client, "/api/projects?count=cached", auth_headers)
+        assert (data["total"], data["count_strategy"]) == (1, "exact")
+
+        self.fetch(client, "/api/projects?count=cached", auth_headers)
+        ProjectService.revoke_access(db, private)
+        data, _ = self.fetch(client, "/api/projects?count=cached", auth_headers)
+        assert (data["total"], data["count_strategy"]) == (0, "exact")
+
+    def test_estimated_count(self, client, db, sample_user, auth_headers):
+        """测试估算方式：PostgreSQL 使用 EXPLAIN，其他数据库改为精确计数"""
+        from sqlalchemy import select
+        from sqlalchemy.dialects import postgresql
+        from app.services.counts import explain
+        sql = str(explain(select(Project.id).where(Project.name == "x")).compile(dialect=postgresql.dialect()))
+        assert sql.startswith("EXPLAIN (FORMAT JSON) SELECT projects.id")
+
+        data, _ = self.fetch(client, "/api/projects?count=estimated", auth_headers)
+        assert (data["total"], data["count_strategy"]) == (0, "exact")
+        assert client.get("/api/projects?count=guess", headers=auth_headers).status_code == 400
+
+
+class TestSearch:
+    """搜索测试（SQLite 使用 Python 实现的 similarity）"""
+
+    def test_trigram_similarity(self):
+        """测试相似度与 pg_trgm 一致"""
+        from app.services.search import trigrams, word_similarity
+        assert trigrams("Word") == {"  w", " wo", "wor", "ord", "rd "}
+        assert word_similarity("word", "two words") == 0.8
+        assert word_similarity("订单管理", "订单管理后台") == 0.8
+        assert word_similarity("word", None) == 0.0
+
+    def test_project_search(self, client, db, sample_user, auth_headers):
+        """测试项目按名称、备注的子串和模糊匹配搜索，按相关度排序"""
+        from app.schemas.schemas import ProjectCreate
+        for name, remark in [
+            ("用户中心", "包含订单流程"),
+            ("订单管理后台", None),
+            ("Orders", None),
+            ("折扣_100%", None),
+            ("折扣1000", None),
+        ]:
+            ProjectService.create(db, ProjectCreate(name=name, remark=remark, is_public=True), sample_user.id)
+
+        def names(keyword):
+            response = client.get(f"/api/projects?search={keyword}", headers=auth_headers)
+            assert response.status_code == 200
+            return [item["name"] for item in response.json()["items"]]
+
+        # 名称匹配排在备注匹配之前
+        assert names("订单") == ["订单管理后台", "用户中心"]
+        # 拼写错误按相似度匹配
+        assert names("ordr") == ["Orders"]
+        # LIKE 通配符按字面匹配
+        assert names("_100%25") == ["折扣_100%"]
+
+    def test_user_and_tag_search(self, client, db, sample_admin):
+        """测试用户（姓名 / 工号）和标签搜索"""
+        from app.services.services import TagService
+        db.add_all([
+            User(name="张三", employee_id="zhangsan", password_hash="x", role="developer"),
+            User(name="李四", employee_id="lisi", password_hash="x", role="developer"),
+            Tag(name="订单", color="#ffffff", creator_id=sample_admin.id),
+            Tag(name="会员", color="#ffffff", creator_id=sample_admin.id),
+        ])
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(sample_admin.id)})}"}
+
+        data = client.get("/api/users?search=zhangsn", headers=headers).json()
+        assert [item["name"] for item in data["items"]] == ["张三"]
+        data = client.get("/api/users?search=李", headers=headers).json()
+        assert [item["name"] for item in data["items"]] == ["李四"]
+        assert [tag.name for tag in TagService.list_all(db, search="订单")] == ["订单"]
+
+
+class TestProjectAccessGrants:
+    """授权记录测试"""
+
+    def test_grant_access_upsert(self, db, sample_project, sample_user):
+        """测试重复授权只更新访问时间"""
+        ProjectService.grant_access(db, sample_project.id, sample_user.id)
+        first = db.query(ProjectAccess).one().accessed_at
+        time.sleep(0.01)
+        ProjectService.grant_access(db, sample_project.id, sample_user.id)
+        db.expire_all()
+        rows = db.query(ProjectAccess).all()
+        assert len(rows) == 1
+        assert rows[0].accessed_at > first
+
+    def test_compact_duplicates(self, tmp_path):
+        """测试压缩脚本合并重复记录（保留最早的记录、最近的访问时间）后建立唯一索引"""
+        from sqlalchemy import text
+        from scripts.compact_project_access import create_unique_index, run
+        access_engine = create_engine(f"sqlite:///{tmp_path / 'access.db'}")
+        with access_engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE project_access (id INTEGER PRIMARY KEY, project_id INTEGER, user_id INTEGER, accessed_at TEXT)"
+            ))
+            conn.execute(text("INSERT INTO project_access (project_id, user_id, accessed_at) VALUES (:p, :u, :t)"), [
+                {"p": 1, "u": 1, "t": "2026-01-01"},
+                {"p": 1, "u": 1, "t": "2026-03-01"},
+                {"p": 1, "u": 1, "t": "2026-02-01"},
+                {"p": 2, "u": 1, "t": "2026-01-01"},
+                {"p": 1, "u": 2, "t": "2026-01-01"},
+                {"p": 1, "u": 2, "t": "2026-01-05"},
+            ])
+        assert create_unique_index(access_engine) is False
+
+        assert run(access_engine, batch_size=1, pause=0) == 3
+        with access_engine.connect() as conn:
+            rows = conn.execute(text("SELECT id, project_id, user_id, accessed_at FROM project_access ORDER BY id")).all()
+            assert [tuple(row) for row in rows] == [
+                (1, 1, 1, "2026-03-01"), (4, 2, 1, "2026-01-01"), (5, 1, 2, "2026-01-05"),
+            ]
+            with pytest.raises(Exception):
+                conn.execute(text("INSERT INTO project_access (project_id, user_id) VALUES (1, 1)"))
+        access_engine.dispose()
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+项目列表权限过滤基准测试
+
+构造一个非管理员用户，授权记录数从 10 增加到 100k，分别用旧写法（先取回全部授权的
+project_id 再拼成 IN 列表）和数据库内的半连接子查询（ProjectService.granted_to）执行一次列表查询（count + 第一页），统计耗时。
+
+使用方法:
+    python scripts/bench_access_filter.py
+    python scripts/bench_access_filter.py --grants 10,1000,100000 --database-url postgresql://...
+
+未指定 --database-url 时使用临时 SQLite 数据库；指定时会在该库中建表并写入测试数据，请使用空库。
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, or_
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.models import Project, ProjectAccess, User
+from app.services.services import ProjectService
+
+BATCH_SIZE = 10000
+
+
+def populate(db, projects: int, grants: int):
+    """写入 projects 个项目（十分之一公开），授权给测试用户其中 grants 个"""
+    db.execute(insert(User), [
+        {"id": 1, "name": "测试用户", "employee_id": "bench", "password_hash": "x", "role": "developer"},
+        {"id": 2, "name": "作者", "employee_id": "author", "password_hash": "x", "role": "product_manager"},
+    ])
+    for start in range(0, projects, BATCH_SIZE):
+        db.execute(insert(Project), [
+            {"id": i + 1, "object_id": f"bench-{i}", "name": f"原型{i}", "author_id": 2, "is_public": i % 10 == 0}
+            for i in range(start, min(start + BATCH_SIZE, projects))
+        ])
+    for start in range(0, grants, BATCH_SIZE):
+        db.execute(insert(ProjectAccess), [
+            {"project_id": i + 1, "user_id": 1}
+            for i in range(start, min(start + BATCH_SIZE, grants))
+        ])
+    db.commit()
+
+
+def in_list_filter(db, user_id: int):
+    access_ids = [row[0] for row in db.query(ProjectAccess.project_id).filter(ProjectAccess.user_id == user_id)]
+    return Project.id.in_(access_ids) if access_ids else False
+
+
+def semi_join_filter(db, user_id: int):
+    return ProjectService.granted_to(user_id)
+
+
+def list_page(db, make_filter, user_id: int = 1, per_page: int = 20):
+    query = db.query(Project).filter(or_(Project.is_public == True, make_filter(db, user_id)))
+    total = query.count()
+    query.order_by(Project.updated_at.desc()).limit(per_page).all()
+    return total
+
+
+def bench(db, make_filter, repeat: int):
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            list_page(db, make_filter)
+        except DBAPIError as e:
+            db.rollback()
+            return None, type(e.orig).__name__
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="项目列表权限过滤基准测试")
+    parser.add_argument("--grants", default="10,100,1000,10000,100000", help="授权记录数，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    grant_counts = [int(g) for g in args.grants.split(",")]
+    print(f"{'授权记录':>8} {'IN 列表 ms':>12} {'子查询 ms':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for grants in grant_counts:
+            url = args.database_url or f"sqlite:///{os.path.join(tmp, f'bench-{grants}.db')}"
+            engine = create_engine(url)
+            Base.metadata.drop_all(bind=engine)
+            Base.metadata.create_all(bind=engine)
+            db = sessionmaker(bind=engine)()
+            try:
+                populate(db, max(grant_counts), grants)
+                results = []
+                for make_filter in (in_list_filter, semi_join_filter):
+                    seconds, error = bench(db, make_filter, args.repeat)
+                    results.append(error or f"{seconds * 1000:.1f}")
+                print(f"{grants:>8} {results[0]:>12} {results[1]:>10}")
+            finally:
+                db.close()
+                Base.metadata.drop_all(bind=engine)
+                engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
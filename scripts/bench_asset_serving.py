@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+大文件静态资源发送基准测试
+
+对比三种发送方式在服务端的吞吐量和每请求 CPU 时间：
+- before:   Starlette FileResponse（改造前 serve_project_file 的发送方式）
+- chunked:  AssetFileResponse，pread 分块读取（uvicorn 等不支持零拷贝扩展的服务器）
+- sendfile: AssetFileResponse，ASGI zerocopysend 扩展（服务器调用 os.sendfile）
+
+直接调用 ASGI 应用并丢弃响应字节，只统计服务端开销，不含网络传输。
+
+使用方法:
+    python scripts/bench_asset_serving.py
+    python scripts/bench_asset_serving.py --sizes 1,16,64,200 --repeat 5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.responses import FileResponse
+
+from app.services.delivery import AssetFileResponse
+
+MB = 1024 * 1024
+
+
+def make_scope(zerocopy: bool):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [],
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "extensions": {},
+    }
+    if zerocopy:
+        scope["extensions"]["http.response.zerocopysend"] = {}
+    return scope
+
+
+async def run_once(response, zerocopy: bool, devnull: int) -> int:
+    done = asyncio.Event()
+    sent = 0
+
+    async def receive():
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            sent += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+        elif message["type"] == "http.response.zerocopysend":
+            # 模拟服务器：sendfile 到 /dev/null
+            fd = message["file"].fileno()
+            offset, count = message.get("offset", 0), message["count"]
+            while count > 0:
+                n = os.sendfile(devnull, fd, offset, count)
+                if n == 0:
+                    break
+                offset += n
+                count -= n
+                sent += n
+            done.set()
+
+    await response(make_scope(zerocopy), receive, send)
+    return sent
+
+
+def bench(mode: str, path: str, size: int, repeat: int, devnull: int):
+    wall, cpu = 0.0, 0.0
+    for _ in range(repeat):
+        if mode == "before":
+            response = FileResponse(path)
+        else:
+            response = AssetFileResponse(path, 0, size, headers={"content-length": str(size)})
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        sent = asyncio.run(run_once(response, mode == "sendfile", devnull))
+        wall += time.perf_counter() - wall_start
+        cpu += time.process_time() - cpu_start
+        assert sent == size, f"{mode}: 发送 {sent} 字节，期望 {size}"
+    return size * repeat / wall / MB, cpu / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大文件静态资源发送基准测试")
+    parser.add_argument("--sizes", default="1,16,64,200", help="文件大小（MB），逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    print(f"{'大小':>8} {'方式':>10} {'吞吐 MB/s':>12} {'CPU ms/请求':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in [int(s) for s in args.sizes.split(",")]:
+            path = os.path.join(tmp, f"{size_mb}mb.bin")
+            with open(path, "wb") as f:
+                for _ in range(size_mb):
+                    f.write(os.urandom(MB))
+            for mode in ("before", "chunked", "sendfile"):
+                throughput, cpu_ms = bench(mode, path, size_mb * MB, args.repeat, devnull)
+                print(f"{size_mb:>6}MB {mode:>10} {throughput:>12.1f} {cpu_ms:>12.2f}")
+            os.remove(path)
+    os.close(devnull)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+原型压缩包解压基准测试
+
+生成与 Axure 导出结构相近的压缩包（每个页面一个 html + data.js + 若干图片，外加公共资源），
+分别以不同线程数调用 extract_archive 解压，统计耗时和吞吐量。
+
+使用方法:
+    python scripts/bench_extraction.py
+    python scripts/bench_extraction.py --pages 2000 --workers 1,2,4,8 --repeat 3
+"""
+
+import argparse
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.archive import extract_archive
+
+
+def make_archive(pages: int, seed: int = 0) -> bytes:
+    """生成 Axure 结构的压缩包：每页约 5 个文件，文本可压缩、图片不可压缩"""
+    rng = random.Random(seed)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("proto/index.html", "<html>index</html>")
+        zf.writestr("proto/start.html", "<html>start</html>")
+        zf.writestr("proto/resources/scripts/axure/axQuery.js", "var axQuery = {};" * 20000)
+        zf.writestr("proto/resources/css/axure_rp_page.css", ".ax_default { margin: 0; }" * 5000)
+        for page in range(pages):
+            name = f"page_{page}"
+            zf.writestr(f"proto/{name}.html", f"<html><body id='{name}'>" + "<div class='ax'></div>" * 400 + "</body></html>")
+            zf.writestr(f"proto/files/{name}/data.js", f"$axure.loadCurrentPage({{'id': {page}}});" * 300)
+            zf.writestr(f"proto/files/{name}/styles.css", f"#u{page} {{ left: 0px; }}" * 300)
+            for image in range(2):
+                zf.writestr(
+                    f"proto/images/{name}/u{image}.png",
+                    rng.randbytes(rng.randint(2 * 1024, 24 * 1024)),
+                    zipfile.ZIP_STORED,
+                )
+    return buffer.getvalue()
+
+
+def bench(archive: bytes, workers: int, repeat: int, tmp: str) -> float:
+    elapsed = []
+    for _ in range(repeat):
+        target = tempfile.mkdtemp(dir=tmp)
+        start = time.perf_counter()
+        extract_archive(io.BytesIO(archive), target, workers=workers)
+        elapsed.append(time.perf_counter() - start)
+        shutil.rmtree(target)
+    return min(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="原型压缩包解压基准测试")
+    parser.add_argument("--pages", type=int, default=2000, help="页面数量（每页约 5 个文件）")
+    parser.add_argument("--workers", default="1,2,4,8", help="线程数，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dir", default=None, help="解压目标所在目录（默认系统临时目录）")
+    args = parser.parse_args()
+
+    archive = make_archive(args.pages)
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        members = len(zf.infolist())
+        total = sum(info.file_size for info in zf.infolist())
+    print(f"成员数 {members}，压缩包 {len(archive) / 1e6:.1f} MB，解压后 {total / 1e6:.1f} MB")
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        baseline = None
+        print(f"{'线程数':>6} {'耗时 s':>8} {'文件/秒':>10} {'加速比':>8}")
+        for workers in [int(w) for w in args.workers.split(",")]:
+            seconds = bench(archive, workers, args.repeat, tmp)
+            baseline = baseline or seconds
+            print(f"{workers:>6} {seconds:>8.2f} {members / seconds:>10.0f} {baseline / seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
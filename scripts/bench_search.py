@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+项目搜索基准测试
+
+写入 --projects 个项目（默认 100k，名称和备注由常见词随机组合），对若干关键词分别执行旧写法
+（名称 ILIKE '%关键词%'，按更新时间排序）和新写法（名称 / 备注子串 + 模糊匹配，按相关度排序），
+各取第一页 20 条，统计耗时。
+
+使用方法:
+    python scripts/bench_search.py --database-url postgresql://...
+    python scripts/bench_search.py --projects 10000
+
+指定 PostgreSQL 时会在该库中建表、安装 pg_trgm 并建立三元组索引，请使用空库（需要有 CREATE EXTENSION 权限）。
+未指定 --database-url 时使用临时 SQLite 数据库：没有索引，相似度由 Python 函数逐行计算，只用于验证脚本本身。
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.models import Project, User
+from app.services.search import search_filter, search_ordering
+
+BATCH_SIZE = 10000
+WORDS = [
+    "订单", "会员", "支付", "商品", "库存", "物流", "营销", "优惠券", "报表", "审批",
+    "客服", "消息", "设置", "首页", "搜索", "购物车", "结算", "退款", "积分", "签到",
+    "Dashboard", "Admin", "Portal", "Mobile", "CRM", "Checkout", "Inventory", "Analytics",
+]
+SUFFIXES = ["管理后台", "小程序", "App", "H5", "改版", "原型", "需求", "V2"]
+KEYWORDS = ["订单", "优惠券", "Checkout", "Inventry", "flow review"]
+TRIGRAM_INDEXES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_projects_name_trgm ON projects USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_projects_remark_trgm ON projects USING gin (remark gin_trgm_ops)",
+]
+
+
+def populate(db, projects: int):
+    rng = random.Random(0)
+    db.execute(insert(User), [
+        {"id": 1, "name": "作者", "employee_id": "author", "password_hash": "x", "role": "product_manager"},
+    ])
+    for start in range(0, projects, BATCH_SIZE):
+        db.execute(insert(Project), [
+            {
+                "id": i + 1,
+                "object_id": f"bench-{i}",
+                "name": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(SUFFIXES)} {i}",
+                "remark": rng.choice(["", f"{rng.choice(WORDS)}模块交互说明", f"{rng.choice(WORDS)} flow review"]),
+                "author_id": 1,
+                "is_public": True,
+            }
+            for i in range(start, min(start + BATCH_SIZE, projects))
+        ])
+    db.commit()
+    if db.get_bind().dialect.name == "postgresql":
+        for statement in TRIGRAM_INDEXES:
+            db.execute(text(statement))
+        db.execute(text("ANALYZE projects"))
+        db.commit()
+
+
+def old_search(db, keyword: str):
+    return (
+        db.query(Project)
+        .filter(Project.name.ilike(f"%{keyword}%"))
+        .order_by(Project.updated_at.desc())
+        .limit(20)
+        .all()
+    )
+
+
+def new_search(db, keyword: str):
+    columns = [Project.name, Project.remark]
+    return (
+        db.query(Project)
+        .filter(search_filter(db, columns, keyword))
+        .order_by(*search_ordering(db, columns, keyword), Project.updated_at.desc(), Project.id.desc())
+        .limit(20)
+        .all()
+    )
+
+
+def bench(db, search, keyword: str, repeat: int):
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = search(db, keyword)
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed), len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="项目搜索基准测试")
+    parser.add_argument("--projects", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench-search.db')}"
+        engine = create_engine(url)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        try:
+            populate(db, args.projects)
+            print(f"{engine.dialect.name}，{args.projects} 个项目")
+            print(f"{'关键词':<12} {'旧写法 ms':>10} {'结果':>4} {'新写法 ms':>10} {'结果':>4}")
+            for keyword in KEYWORDS:
+                old_seconds, old_rows = bench(db, old_search, keyword, args.repeat)
+                new_seconds, new_rows = bench(db, new_search, keyword, args.repeat)
+                print(f"{keyword:<12} {old_seconds * 1000:>10.1f} {old_rows:>4} {new_seconds * 1000:>10.1f} {new_rows:>4}")
+        finally:
+            db.close()
+            Base.metadata.drop_all(bind=engine)
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
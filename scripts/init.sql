@@ -21,12 +21,18 @@ CREATE TABLE IF NOT EXISTS projects (
     is_public BOOLEAN DEFAULT FALSE,
     remark TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    file_count INTEGER,
+    storage_bytes BIGINT
 );
 
 -- 如果表已存在，添加 remark 字段
 ALTER TABLE projects ADD COLUMN IF NOT EXISTS remark TEXT;
 
+-- 如果表已存在，添加存储用量字段
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS file_count INTEGER;
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS storage_bytes BIGINT;
+
 -- 创建访问记录表
 CREATE TABLE IF NOT EXISTS project_access (
     id SERIAL PRIMARY KEY,
@@ -63,16 +69,42 @@ CREATE TABLE IF NOT EXISTS user_common_tags (
     UNIQUE(user_id, tag_id)
 );
 
+-- 创建上传任务表（异步上传）
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    kind VARCHAR(20) NOT NULL CHECK (kind IN ('upload', 'update')),
+    object_id VARCHAR(36) NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'succeeded', 'failed')),
+    progress INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- 创建索引
 CREATE INDEX IF NOT EXISTS idx_projects_author ON projects(author_id);
 CREATE INDEX IF NOT EXISTS idx_projects_object_id ON projects(object_id);
+CREATE INDEX IF NOT EXISTS idx_projects_updated_id ON projects(updated_at, id);
 CREATE INDEX IF NOT EXISTS idx_project_access_user ON project_access(user_id);
 CREATE INDEX IF NOT EXISTS idx_project_access_project ON project_access(project_id);
+-- 已有重复授权记录的数据库请先运行 scripts/compact_project_access.py（合并重复记录并在线建立该索引）
+CREATE UNIQUE INDEX IF NOT EXISTS uq_project_access_user_project ON project_access(user_id, project_id);
 CREATE INDEX IF NOT EXISTS idx_tags_name ON tags(name);
 CREATE INDEX IF NOT EXISTS idx_tags_creator ON tags(creator_id);
 CREATE INDEX IF NOT EXISTS idx_project_tags_project ON project_tags(project_id);
 CREATE INDEX IF NOT EXISTS idx_project_tags_tag ON project_tags(tag_id);
 CREATE INDEX IF NOT EXISTS idx_user_common_tags_user ON user_common_tags(user_id);
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_object_id ON upload_jobs(object_id);
+
+-- 搜索使用的三元组索引（ILIKE '%关键词%' 子串匹配和 % 模糊匹配）
+-- 中文分词依赖数据库的 UTF-8 locale（官方 postgres 镜像默认 en_US.utf8）；无法安装扩展时设置 SEARCH_TRIGRAM=false
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_projects_name_trgm ON projects USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_projects_remark_trgm ON projects USING gin (remark gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_name_trgm ON users USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_employee_id_trgm ON users USING gin (employee_id gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_tags_name_trgm ON tags USING gin (name gin_trgm_ops);
 
 -- 插入默认管理员账户 (密码: admin123)
 -- 使用 SHA256+salt 格式: salt:hash